@@ -0,0 +1,43 @@
+"""
+python -m benchmark.bench_calculate_survival [N_ROWS ...]
+
+Compares CalculateSurvival row by row (as in Model.reprocess_table) with BatchCalculateSurvival
+"""
+import sys
+import time
+from typing import List
+from src.model_nycu import CalculateSurvival, BatchCalculateSurvival
+from .synthetic import synthetic_survival_df
+
+
+N_ROWS = [1_000, 10_000]
+
+
+class BenchCalculateSurvival:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\tper_row_seconds\tbatch_seconds\tspeedup', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        df = synthetic_survival_df(n_rows=n_rows)
+
+        start = time.perf_counter()
+        for attributes in df.to_dict('records'):
+            CalculateSurvival().main(attributes=attributes)
+        per_row_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        BatchCalculateSurvival().main(df=df)
+        batch_seconds = time.perf_counter() - start
+
+        print(f'{n_rows}\t{per_row_seconds:.2f}\t{batch_seconds:.3f}\t{per_row_seconds / batch_seconds:.0f}x', flush=True)
+
+
+if __name__ == '__main__':
+    BenchCalculateSurvival().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
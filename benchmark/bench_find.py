@@ -0,0 +1,61 @@
+"""
+python -m benchmark.bench_find [N_ROWS ...]
+
+Measures Model.find over a synthetic clinical data table:
+    the first search (which builds the index), searches from a start cell ("find next"),
+    a search without any match, and a search right after update_cell
+"""
+import io
+import sys
+import time
+import contextlib
+from typing import List
+from src.model import Model
+from src.schema import NycuOsccSchema
+from .synthetic import synthetic_clinical_df
+
+
+N_ROWS = [20_000]
+N_SEARCHES = 100
+
+
+class BenchFind:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\tfirst_ms\tfind_next_ms\tno_match_ms\tafter_edit_ms', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        model = Model(NycuOsccSchema)
+        model.dataframe = synthetic_clinical_df(n_rows=n_rows)
+
+        start = time.perf_counter()
+        model.find(text='sample', start=None)
+        first_ms = (time.perf_counter() - start) * 1000
+
+        found = None
+        start = time.perf_counter()
+        for _ in range(N_SEARCHES):
+            found = model.find(text='cancer', start=found)
+        find_next_ms = (time.perf_counter() - start) * 1000 / N_SEARCHES
+
+        start = time.perf_counter()
+        model.find(text='no such text', start=None)
+        no_match_ms = (time.perf_counter() - start) * 1000
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            model.update_cell(row=n_rows // 2, column='Medical Record ID', value='edited')
+        start = time.perf_counter()
+        model.find(text='edited', start=None)
+        after_edit_ms = (time.perf_counter() - start) * 1000
+
+        print(f'{n_rows}\t{first_ms:.0f}\t{find_next_ms:.2f}\t{no_match_ms:.1f}\t{after_edit_ms:.1f}', flush=True)
+
+
+if __name__ == '__main__':
+    BenchFind().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
@@ -0,0 +1,63 @@
+"""
+python -m benchmark.bench_import_table [N_ROWS ...]
+
+Imports a clinical data table of N_ROWS rows (half of the ids are new) into a table of N_ROWS rows,
+    and a sequencing table of N_ROWS rows in the same way
+"""
+import sys
+import time
+import shutil
+import tempfile
+import pandas as pd
+from typing import List
+from src.model import Model
+from src.schema import NycuOsccSchema
+from .synthetic import synthetic_clinical_df
+
+
+N_ROWS = [10_000, 50_000]
+
+
+class BenchImportTable:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\tclinical_seconds\tsequencing_seconds', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            existing = synthetic_clinical_df(n_rows=n_rows)
+            incoming = synthetic_clinical_df(n_rows=n_rows, seed=1)
+            incoming[NycuOsccSchema.SAMPLE_ID] = [f'SAMPLE-{i + n_rows // 2:06d}' for i in range(n_rows)]
+            incoming.to_csv(f'{tmpdir}/clinical_data.csv', index=False)
+
+            pd.DataFrame({
+                'ID': [f'SAMPLE-{i + n_rows:06d}' for i in range(n_rows)],
+                'Lab': 'LAB',
+                'Lab Sample ID': [f'LAB-{i:06d}' for i in range(n_rows)],
+            }).to_csv(f'{tmpdir}/sequencing.csv', index=False)
+
+            model = Model(NycuOsccSchema)
+            model.dataframe = existing
+
+            start = time.perf_counter()
+            model.import_clinical_data_table(file=f'{tmpdir}/clinical_data.csv')
+            clinical_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model.import_sequencing_table(file=f'{tmpdir}/sequencing.csv')
+            sequencing_seconds = time.perf_counter() - start
+
+            print(f'{n_rows}\t{clinical_seconds:.2f}\t{sequencing_seconds:.2f}', flush=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    BenchImportTable().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
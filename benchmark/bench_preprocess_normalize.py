@@ -0,0 +1,81 @@
+"""
+python -m benchmark.bench_preprocess_normalize [N_ROWS ...]
+
+Compares the peak memory (tracemalloc) of splitting a clinical table into patient and sample data frames,
+    by copying the whole table at every step (the previous PreprocessNormalize) and by PreprocessNormalize
+"""
+import sys
+import time
+import tracemalloc
+import pandas as pd
+from typing import List, Tuple, Callable
+from src.schema import NycuOsccSchema
+from src.cbio_constant import SAMPLE_ID, STUDY_ID, PATIENT_ID
+from src.cbio_compiled_schema import compile_schema
+from src.cbio_preprocess_normalize import PreprocessNormalize
+from .synthetic import synthetic_clinical_df
+
+
+N_ROWS = [10_000, 100_000]
+
+
+def preprocess_normalize_with_copies(clinical_data_df: pd.DataFrame, study_id: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    S = NycuOsccSchema
+    df = clinical_data_df.drop(columns=S.CBIO_DROP_COLUMNS)
+    df = df.rename(columns={df.columns[0]: SAMPLE_ID})
+    df[STUDY_ID] = study_id
+    df[PATIENT_ID] = df[SAMPLE_ID]
+    columns = df.columns.to_list()
+    df = df[columns[-2:] + columns[:-2]]
+
+    patient_df = df[[PATIENT_ID] + S.CBIO_PATIENT_LEVEL_COLUMNS].copy()
+    is_patient_level = compile_schema(S).lookup(columns=df.columns.to_list())['is_patient_level']
+    sample_df = df[df.columns[~is_patient_level.to_numpy()]].copy()
+    return patient_df, sample_df
+
+
+def preprocess_normalize(clinical_data_df: pd.DataFrame, study_id: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    return PreprocessNormalize(NycuOsccSchema).main(clinical_data_df=clinical_data_df, study_id=study_id)
+
+
+class BenchPreprocessNormalize:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\ttable_mb\twith_copies_peak_mb\tpeak_mb\twith_copies_seconds\tseconds', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        df = synthetic_clinical_df(n_rows=n_rows)
+        table_mb = df.memory_usage(index=True, deep=False).sum() / 1024 ** 2
+
+        expected, with_copies_peak_mb, with_copies_seconds = self.measure(preprocess_normalize_with_copies, df)
+        actual, peak_mb, seconds = self.measure(preprocess_normalize, df)
+
+        for a, b in zip(actual, expected):
+            pd.testing.assert_frame_equal(a, b)
+
+        print(f'{n_rows}\t{table_mb:.1f}\t{with_copies_peak_mb:.1f}\t{peak_mb:.1f}\t{with_copies_seconds:.3f}\t{seconds:.3f}', flush=True)
+
+    def measure(
+            self,
+            func: Callable[[pd.DataFrame, str], Tuple[pd.DataFrame, pd.DataFrame]],
+            df: pd.DataFrame) -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], float, float]:
+        """
+        Peak memory allocated on top of df, i.e. including the returned data frames
+        """
+        tracemalloc.start()
+        start = time.perf_counter()
+        ret = func(df, 'hnsc_nycu_2024')
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return ret, peak / 1024 ** 2, seconds
+
+
+if __name__ == '__main__':
+    BenchPreprocessNormalize().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
@@ -0,0 +1,70 @@
+"""
+python -m benchmark.bench_read_maf [N_VARIANTS ...]
+
+Compares the wall time and in-memory size of a single large MAF parsed
+    untyped (every column object), typed with the C engine, and typed with the pyarrow engine
+"""
+import sys
+import time
+import shutil
+import tempfile
+import pandas as pd
+from typing import List, Callable
+from src.cbio_write_mutation_data import ReadAndProcessMaf
+from .synthetic import synthetic_maf_df, write_maf
+
+
+N_VARIANTS = [100_000, 1_000_000]
+
+
+def read_untyped(maf: str) -> pd.DataFrame:
+    return pd.read_csv(maf, sep='\t', skiprows=1, usecols=ReadAndProcessMaf.COLUMNS)
+
+
+def read_typed_c(maf: str) -> pd.DataFrame:
+    return ReadAndProcessMaf().main(maf=maf, engine='c')
+
+
+def read_typed_pyarrow(maf: str) -> pd.DataFrame:
+    return ReadAndProcessMaf().main(maf=maf, engine='pyarrow')
+
+
+class BenchReadMaf:
+
+    n_variants_list: List[int]
+
+    def main(self, n_variants_list: List[int]):
+        self.n_variants_list = n_variants_list
+        print('n_variants\treader\tseconds\tmemory_mb', flush=True)
+        for n_variants in self.n_variants_list:
+            self.bench(n_variants=n_variants)
+
+    def bench(self, n_variants: int):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            maf = f'{tmpdir}/SAMPLE.maf'
+            write_maf(df=synthetic_maf_df(n_variants=n_variants), file=maf)
+
+            readers = [('untyped', read_untyped), ('typed_c', read_typed_c)]
+            try:
+                import pyarrow
+                readers.append(('typed_pyarrow', read_typed_pyarrow))
+            except ImportError:
+                print('pyarrow is not installed, skip the pyarrow engine', flush=True)
+
+            for name, reader in readers:
+                self.bench_reader(n_variants=n_variants, maf=maf, name=name, reader=reader)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def bench_reader(self, n_variants: int, maf: str, name: str, reader: Callable[[str], pd.DataFrame]):
+        start = time.perf_counter()
+        df = reader(maf)
+        seconds = time.perf_counter() - start
+        memory_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f'{n_variants}\t{name}\t{seconds:.2f}\t{memory_mb:.1f}', flush=True)
+
+
+if __name__ == '__main__':
+    BenchReadMaf().main(
+        n_variants_list=[int(n) for n in sys.argv[1:]] or N_VARIANTS)
@@ -0,0 +1,67 @@
+"""
+python -m benchmark.bench_remove_empty_columns [N_ROWS ...]
+
+Compares dropping empty columns one by one (the previous RemoveEmptyColumns) with RemoveEmptyColumns
+    on a wide patient table of 500 columns, half of which are empty
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+from typing import List
+from src.schema import NycuOsccSchema
+from src.cbio_write_clinical_data import RemoveEmptyColumns
+
+
+N_ROWS = [1_000, 10_000]
+N_COLUMNS = 500
+
+
+def remove_empty_columns_one_by_one(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for column in df.columns:
+        if all(pd.isna(df[column])):
+            df.drop(columns=column, inplace=True)
+    return df
+
+
+def wide_patient_df(n_rows: int, n_columns: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    data = {'Patient ID': [f'PATIENT-{i:06d}' for i in range(n_rows)]}
+    for c in range(1, n_columns):
+        if c % 2 == 0:
+            data[f'Column {c}'] = np.full(n_rows, np.nan, dtype=object)
+        else:
+            data[f'Column {c}'] = rng.choice(np.array([np.nan, 'A', 'B'], dtype=object), size=n_rows)
+    return pd.DataFrame(data)
+
+
+class BenchRemoveEmptyColumns:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\tn_columns\tone_by_one_seconds\tbatch_seconds\tspeedup', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        df = wide_patient_df(n_rows=n_rows, n_columns=N_COLUMNS)
+
+        start = time.perf_counter()
+        expected = remove_empty_columns_one_by_one(df)
+        one_by_one_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = RemoveEmptyColumns(NycuOsccSchema).main(df)
+        batch_seconds = time.perf_counter() - start
+
+        assert actual.columns.equals(expected.columns)
+
+        print(f'{n_rows}\t{N_COLUMNS}\t{one_by_one_seconds:.2f}\t{batch_seconds:.3f}\t{one_by_one_seconds / batch_seconds:.0f}x', flush=True)
+
+
+if __name__ == '__main__':
+    BenchRemoveEmptyColumns().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
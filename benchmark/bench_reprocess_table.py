@@ -0,0 +1,52 @@
+"""
+python -m benchmark.bench_reprocess_table [N_ROWS ...]
+
+Measures Model.reprocess_table (columnar) over synthetic clinical data tables,
+    and the previous row-by-row path on the first PER_ROW_ROWS rows for comparison
+"""
+import io
+import sys
+import time
+import contextlib
+from typing import List
+from src.model import Model, ProcessSampleAttributes
+from src.schema import NycuOsccSchema
+from .synthetic import synthetic_clinical_df
+
+
+N_ROWS = [1_000, 10_000, 50_000]
+PER_ROW_ROWS = 200
+
+
+class BenchReprocessTable:
+
+    n_rows_list: List[int]
+
+    def main(self, n_rows_list: List[int]):
+        self.n_rows_list = n_rows_list
+        print('n_rows\tcolumnar_seconds\tper_row_seconds (extrapolated)', flush=True)
+        for n_rows in self.n_rows_list:
+            self.bench(n_rows=n_rows)
+
+    def bench(self, n_rows: int):
+        model = Model(NycuOsccSchema)
+        model.dataframe = synthetic_clinical_df(n_rows=n_rows)
+
+        with contextlib.redirect_stdout(io.StringIO()):  # silence per-row warnings of invalid values
+            start = time.perf_counter()
+            model.reprocess_table()
+            columnar_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            new = model.dataframe.copy()
+            for row in range(min(n_rows, PER_ROW_ROWS)):
+                attributes = model.get_sample(row=row)
+                new.loc[row] = ProcessSampleAttributes(NycuOsccSchema).main(attributes=attributes)
+            per_row_seconds = (time.perf_counter() - start) * n_rows / min(n_rows, PER_ROW_ROWS)
+
+        print(f'{n_rows}\t{columnar_seconds:.2f}\t{per_row_seconds:.1f}', flush=True)
+
+
+if __name__ == '__main__':
+    BenchReprocessTable().main(
+        n_rows_list=[int(n) for n in sys.argv[1:]] or N_ROWS)
@@ -0,0 +1,57 @@
+"""
+python -m benchmark.bench_write_mutation_data [N_SAMPLES ...]
+
+Measures the wall time of WriteMutationData over synthetic MAF directories,
+    the time per sample should stay flat as the number of samples grows (linear scaling)
+"""
+import sys
+import time
+import shutil
+import tempfile
+from typing import List
+from src.cbio_write_mutation_data import WriteMutationData
+from .synthetic import write_maf_dir, sample_df_of
+
+
+N_SAMPLES = [1_000, 5_000, 20_000]
+N_VARIANTS_PER_SAMPLE = 20
+STUDY_INFO_DICT = {
+    'cancer_study_identifier': 'synthetic_study',
+    'description': 'Synthetic study for benchmarking',
+}
+
+
+class BenchWriteMutationData:
+
+    n_samples_list: List[int]
+
+    def main(self, n_samples_list: List[int]):
+        self.n_samples_list = n_samples_list
+        print('n_samples\tseconds\tms_per_sample', flush=True)
+        for n_samples in self.n_samples_list:
+            self.bench(n_samples=n_samples)
+
+    def bench(self, n_samples: int):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            sample_ids = write_maf_dir(
+                maf_dir=f'{tmpdir}/maf_dir',
+                n_samples=n_samples,
+                n_variants_per_sample=N_VARIANTS_PER_SAMPLE)
+
+            start = time.perf_counter()
+            WriteMutationData().main(
+                maf_dir=f'{tmpdir}/maf_dir',
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=sample_df_of(sample_ids),
+                outdir=tmpdir)
+            seconds = time.perf_counter() - start
+
+            print(f'{n_samples}\t{seconds:.2f}\t{seconds / n_samples * 1000:.3f}', flush=True)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    BenchWriteMutationData().main(
+        n_samples_list=[int(n) for n in sys.argv[1:]] or N_SAMPLES)
@@ -0,0 +1,185 @@
+"""
+Synthetic inputs for the benchmark scripts
+"""
+import os
+import numpy as np
+import pandas as pd
+from typing import List
+from src.cbio_write_mutation_data import ReadAndProcessMaf
+
+
+VARIANT_CLASSIFICATIONS = [
+    'Missense_Mutation',
+    'Nonsense_Mutation',
+    'Silent',
+    'Frame_Shift_Del',
+    'Splice_Site',
+]
+CHROMOSOMES = [f'chr{i}' for i in range(1, 23)] + ['chrX', 'chrY']
+
+
+def synthetic_maf_df(n_variants: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    start = rng.integers(1, 200_000_000, size=n_variants)
+    data = {c: '' for c in ReadAndProcessMaf.COLUMNS}
+    data.update({
+        'Hugo_Symbol': [f'GENE{i}' for i in rng.integers(0, 20_000, size=n_variants)],
+        'Entrez_Gene_Id': rng.integers(1, 100_000, size=n_variants),
+        'Center': 'NYCU',
+        'NCBI_Build': 'GRCh38',
+        'Chromosome': rng.choice(CHROMOSOMES, size=n_variants),
+        'Start_Position': start,
+        'End_Position': start,
+        'Strand': '+',
+        'Variant_Classification': rng.choice(VARIANT_CLASSIFICATIONS, size=n_variants),
+        'Variant_Type': 'SNP',
+        'Reference_Allele': rng.choice(list('ACGT'), size=n_variants),
+        'Tumor_Seq_Allele1': rng.choice(list('ACGT'), size=n_variants),
+        'Tumor_Seq_Allele2': rng.choice(list('ACGT'), size=n_variants),
+        'Tumor_Sample_Barcode': 'TUMOR',
+        'Matched_Norm_Sample_Barcode': 'NORMAL',
+        'HGVSp_Short': [f'p.X{i}Y' for i in rng.integers(1, 1_000, size=n_variants)],
+        't_alt_count': rng.integers(0, 100, size=n_variants),
+        't_ref_count': rng.integers(0, 100, size=n_variants),
+        'n_alt_count': rng.integers(0, 100, size=n_variants),
+        'n_ref_count': rng.integers(0, 100, size=n_variants),
+    })
+    return pd.DataFrame(data)[ReadAndProcessMaf.COLUMNS]
+
+
+def write_maf(df: pd.DataFrame, file: str):
+    with open(file, 'w') as fh:
+        fh.write('#version 2.4\n')
+        df.to_csv(fh, sep='\t', index=False, lineterminator='\n')
+
+
+def write_maf_dir(
+        maf_dir: str,
+        n_samples: int,
+        n_variants_per_sample: int) -> List[str]:
+    """
+    Writes {sample_id}.maf for each synthetic sample and returns the sample ids
+    All samples share the same variants to keep the generation time negligible
+    """
+    os.makedirs(maf_dir, exist_ok=True)
+
+    df = synthetic_maf_df(n_variants=n_variants_per_sample)
+    text = '#version 2.4\n' + df.to_csv(sep='\t', index=False, lineterminator='\n')
+
+    sample_ids = [f'SAMPLE-{i:06d}' for i in range(n_samples)]
+    for sample_id in sample_ids:
+        with open(f'{maf_dir}/{sample_id}.maf', 'w') as fh:
+            fh.write(text)
+
+    return sample_ids
+
+
+def sample_df_of(sample_ids: List[str]) -> pd.DataFrame:
+    return pd.DataFrame({
+        'Study ID': 'synthetic_study',
+        'Patient ID': sample_ids,
+        'Sample ID': sample_ids,
+    })
+
+
+def synthetic_survival_df(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Survival dates of NycuOsccSchema as str (the same as Model.get_sample), with empty fields and negative durations
+    """
+    rng = np.random.default_rng(seed)
+
+    def dates(offset_days: np.ndarray, empty_fraction: float) -> List[str]:
+        base = pd.Timestamp('2010-01-01')
+        ret = [(base + pd.Timedelta(days=int(d))).strftime('%Y-%m-%d') for d in offset_days]
+        return ['' if e else d for d, e in zip(ret, rng.random(n_rows) < empty_fraction)]
+
+    t0 = rng.integers(0, 3650, size=n_rows)
+    expire = dates(t0 + rng.integers(-100, 2000, size=n_rows), empty_fraction=0.7)
+    return pd.DataFrame({
+        'Surgical Excision Date': dates(t0, empty_fraction=0.2),
+        'Initial Treatment Completion Date': dates(t0 + 30, empty_fraction=0.5),
+        'Last Follow-up Date': dates(t0 + rng.integers(-100, 3000, size=n_rows), empty_fraction=0.05),
+        'Recur Date after Initial Treatment': dates(t0 + rng.integers(-100, 1500, size=n_rows), empty_fraction=0.8),
+        'Expire Date': expire,
+        'Cause of Death': [
+            '' if e == '' else c for e, c in zip(expire, rng.choice(['Cancer', 'Other Disease', 'Uncertain'], size=n_rows))
+        ],
+    })
+
+
+def synthetic_lymph_node_df(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Lymph node records of NycuOsccSchema as 'm/n' str (the same as Model.get_sample), mostly without the summed levels
+    """
+    from src.schema import NycuOsccSchema as S
+
+    rng = np.random.default_rng(seed)
+
+    def fractions(empty_fraction: float) -> List[str]:
+        n = rng.integers(0, 60, size=n_rows)
+        m = (n * rng.random(n_rows)).astype(int)
+        return ['' if e else f'{a}/{b}' for a, b, e in zip(m, n, rng.random(n_rows) < empty_fraction)]
+
+    return pd.DataFrame({
+        S.LYMPH_NODE_LEVEL_I: fractions(empty_fraction=0.9),
+        S.LYMPH_NODE_LEVEL_IA: fractions(empty_fraction=0.3),
+        S.LYMPH_NODE_LEVEL_IB: fractions(empty_fraction=0.3),
+        S.LYMPH_NODE_LEVEL_II: fractions(empty_fraction=0.9),
+        S.LYMPH_NODE_LEVEL_IIA: fractions(empty_fraction=0.3),
+        S.LYMPH_NODE_LEVEL_IIB: fractions(empty_fraction=0.3),
+        S.TOTAL_LYMPH_NODE: fractions(empty_fraction=0.9),
+        S.LYMPH_NODE_RIGHT: fractions(empty_fraction=0.2),
+        S.LYMPH_NODE_LEFT: fractions(empty_fraction=0.2),
+    })
+
+
+def synthetic_clinical_df(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    A NycuOsccSchema clinical data table as imported from a file (object columns, NaN for empty cells)
+    """
+    from src.schema import NycuOsccSchema as S
+
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(0, 3650, size=n_rows)
+
+    def dates(shift_low: int, shift_high: int, empty_fraction: float) -> np.ndarray:
+        days = offsets + rng.integers(shift_low, shift_high, size=n_rows)
+        ret = (pd.Timestamp('2010-01-01') + pd.to_timedelta(days, unit='D')).strftime('%Y-%m-%d').to_numpy(dtype=object)
+        ret[rng.random(n_rows) < empty_fraction] = np.nan
+        return ret
+
+    def choice(values: list) -> np.ndarray:
+        return rng.choice(np.array(values, dtype=object), size=n_rows)
+
+    data = {}
+    for column in S.DISPLAY_COLUMNS:
+        attr = S.COLUMN_ATTRIBUTES[column]
+        if attr['type'] == 'date':
+            data[column] = dates(0, 100, empty_fraction=0.3)
+        elif attr['type'] == 'float':
+            data[column] = choice([np.nan, '0.0', '1.5', '12.0', '40.25'])
+        elif attr['type'] == 'bool':
+            data[column] = choice([np.nan, 'True', 'False'])
+        elif 'options' in attr:
+            data[column] = choice([np.nan] + [str(o) for o in attr['options'] if o != ''])
+        else:
+            data[column] = choice([np.nan, 'A', 'B'])
+
+    data[S.SAMPLE_ID] = [f'SAMPLE-{i:06d}' for i in range(n_rows)]
+    data[S.BIRTH_DATE] = dates(-30000, -15000, empty_fraction=0.1)
+    data[S.SURGICAL_EXCISION_DATE] = dates(0, 30, empty_fraction=0.2)
+    data[S.LAST_FOLLOW_UP_DATE] = dates(-100, 3000, empty_fraction=0.05)
+    data[S.RECUR_DATE_AFTER_INITIAL_TREATMENT] = dates(-100, 1500, empty_fraction=0.8)
+    data[S.EXPIRE_DATE] = dates(-100, 2000, empty_fraction=0.7)
+    data[S.CAUSE_OF_DEATH] = np.where(
+        pd.isna(data[S.EXPIRE_DATE]), np.nan, choice(['Cancer', 'Other Disease', 'Uncertain']))
+    data[S.PATHOLOGICAL_TNM] = choice([np.nan, 'T1N0M0', 'T2N1M0', 'T4aN2bM0', 'T4bN3bM0', 'T2N0M1', 'TisN0M0', 'T3NxMx'])
+    for column in [
+        S.LYMPH_NODE_LEVEL_IA, S.LYMPH_NODE_LEVEL_IB, S.LYMPH_NODE_LEVEL_IIA, S.LYMPH_NODE_LEVEL_IIB,
+        S.LYMPH_NODE_RIGHT, S.LYMPH_NODE_LEFT,
+    ]:
+        data[column] = choice([np.nan, '0/1', '1/3', '0/12'])
+    for column in [S.LYMPH_NODE_LEVEL_I, S.LYMPH_NODE_LEVEL_II, S.TOTAL_LYMPH_NODE]:
+        data[column] = choice([np.nan, np.nan, np.nan, '2/10'])
+
+    return pd.DataFrame(data, columns=S.DISPLAY_COLUMNS).astype(object)
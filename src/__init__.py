@@ -1,8 +1,4 @@
 import sys
-from PyQt5.QtWidgets import QApplication
-from .view import View
-from .model import Model
-from .controller import Controller
 from .schema import DATA_SCHEMA_DICT
 
 
@@ -14,6 +10,9 @@ class Main:
     schema_name: str
 
     def main(self, schema_name: str):
+        # PyQt5 is imported only when the GUI starts, so that the headless src.cli runs without it
+        from PyQt5.QtWidgets import QApplication
+
         self.schema_name = schema_name
         app = QApplication(sys.argv)
         self.print_starting_message()
@@ -38,6 +37,10 @@ Yu-Cheng Lin, DDS, MS, PhD (ylin@nycu.edu.tw)'''
             print(e, flush=True)
 
     def run_app(self):
+        from .view import View
+        from .model import Model
+        from .controller import Controller
+
         model = Model(schema=DATA_SCHEMA_DICT[self.schema_name])
         view = View(model=model)
         Controller(model=model, view=view)
@@ -0,0 +1,87 @@
+import pandas as pd
+from functools import lru_cache
+from typing import List, Type
+from .schema import Schema
+
+
+class CompiledSchema:
+    """
+    Column metadata of a schema for cBioPortal, one row per column, so that the writers look up arrays
+        instead of walking COLUMN_ATTRIBUTES and formatting column names for every export
+
+    Columns not in the schema (e.g. 'Study ID') are compiled on every lookup, with the default type 'str',
+        into a local table, so that the table shared by compile_schema() is read-only and safe across threads
+    """
+
+    RENAME_COLUMN_DICT = {
+        'DISEASE_FREE_MONTHS': 'DF_MONTHS',
+        'DISEASE_FREE_STATUS': 'DF_STATUS',
+        'DISEASE_SPECIFIC_SURVIVAL_MONTHS': 'DSS_MONTHS',
+        'DISEASE_SPECIFIC_SURVIVAL_STATUS': 'DSS_STATUS',
+        'OVERALL_SURVIVAL_MONTHS': 'OS_MONTHS',
+        'OVERALL_SURVIVAL_STATUS': 'OS_STATUS',
+        'PROGRESSION_FREE_SURVIVAL_MONTHS': 'PFS_MONTHS',
+        'PROGRESSION_FREE_SURVIVAL_STATUS': 'PFS_STATUS',
+    }
+
+    schema: Type[Schema]
+    table: pd.DataFrame
+
+    def __init__(self, schema: Type[Schema]):
+        self.schema = schema
+        self.table = self.compile_columns(columns=list(schema.COLUMN_ATTRIBUTES.keys()))
+
+    def lookup(self, columns: List[str]) -> pd.DataFrame:
+        """
+        Returns the rows of columns in the given order, with the columns:
+            'datatype': 'BOOLEAN', 'NUMBER' or 'STRING'
+            'cbio_column': column name in the cBioPortal data file, e.g. 'Overall Survival (Months)' -> 'OS_MONTHS'
+            'is_bool', 'is_number': bool masks of the datatype
+            'is_patient_level': bool mask of the columns in the patient data file
+        """
+        missing = [c for c in dict.fromkeys(columns) if c not in self.table.index]
+        if len(missing) == 0:
+            return self.table.loc[columns]
+        table = pd.concat([self.table, self.compile_columns(columns=missing)])
+        return table.loc[columns]
+
+    def compile_columns(self, columns: List[str]) -> pd.DataFrame:
+        patient_level_columns = set(self.schema.CBIO_PATIENT_LEVEL_COLUMNS)
+        rows = []
+        for c in columns:
+            datatype = get_cbio_datatype(self.schema.COLUMN_ATTRIBUTES.get(c, {}).get('type', 'str'))  # default is 'str'
+            rows.append({
+                'datatype': datatype,
+                'cbio_column': self.get_cbio_column(c),
+                'is_bool': datatype == 'BOOLEAN',
+                'is_number': datatype == 'NUMBER',
+                'is_patient_level': c in patient_level_columns,
+            })
+        return pd.DataFrame(
+            rows,
+            index=pd.Index(columns, dtype=object),
+            columns=['datatype', 'cbio_column', 'is_bool', 'is_number', 'is_patient_level'])
+
+    def get_cbio_column(self, c: str) -> str:
+        for x in [' ', '-', ',', '/']:
+            c = c.upper().replace(x, '_')
+        for x in ['(', ')']:
+            c = c.replace(x, '')
+        return self.RENAME_COLUMN_DICT.get(c, c)
+
+
+def get_cbio_datatype(ty: str) -> str:
+    if ty == 'bool':
+        return 'BOOLEAN'
+    elif ty == 'int' or ty == 'float':
+        return 'NUMBER'
+    else:
+        return 'STRING'  # default
+
+
+@lru_cache(maxsize=None)
+def compile_schema(schema: Type[Schema]) -> CompiledSchema:
+    """
+    Built once per Schema class
+    """
+    return CompiledSchema(schema)
@@ -0,0 +1,173 @@
+"""
+Incremental export of a cBioPortal study
+A manifest of the inputs is kept in the output directory,
+    so that the next export only re-processes the inputs that have changed
+"""
+import os
+import json
+import hashlib
+import pandas as pd
+from typing import Dict, List, Optional, Any
+from .schema import BaseModel
+
+
+MANIFEST_FNAME = '.cbio_ingest_manifest.json'
+MANIFEST_VERSION = 3
+
+
+def sha256_file(file: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(file, 'rb') as fh:
+        for block in iter(lambda: fh.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(file: str, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    The content hash is only re-computed when the size or mtime has changed since the previous fingerprint
+    """
+    stat = os.stat(file)
+    if previous is not None \
+            and previous['size'] == stat.st_size \
+            and previous['mtime_ns'] == stat.st_mtime_ns:
+        sha256 = previous['sha256']
+    else:
+        sha256 = sha256_file(file)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha256}
+
+
+def load_manifest(outdir: str) -> Optional[Dict[str, Any]]:
+    file = f'{outdir}/{MANIFEST_FNAME}'
+    if not os.path.exists(file):
+        return None
+    with open(file) as fh:
+        manifest = json.load(fh)
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(manifest: Dict[str, Any], outdir: str):
+    file = f'{outdir}/{MANIFEST_FNAME}'
+    with open(f'{file}.tmp', 'w') as fh:
+        json.dump(manifest, fh, indent=1)
+    os.replace(f'{file}.tmp', file)  # never leave a half-written manifest behind
+
+
+def remove_manifest(outdir: str):
+    file = f'{outdir}/{MANIFEST_FNAME}'
+    if os.path.exists(file):
+        os.remove(file)
+
+
+class BuildManifest(BaseModel):
+
+    clinical_data_df: pd.DataFrame
+    sample_ids: List[str]
+    maf_dir: str
+    study_info_dict: Dict[str, str]
+    tags_dict: Optional[Dict[str, str]]
+    previous: Optional[Dict[str, Any]]
+
+    manifest: Dict[str, Any]
+
+    def main(
+            self,
+            clinical_data_df: pd.DataFrame,
+            sample_ids: List[str],
+            maf_dir: str,
+            study_info_dict: Dict[str, str],
+            tags_dict: Optional[Dict[str, str]],
+            previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+
+        self.clinical_data_df = clinical_data_df
+        self.sample_ids = sample_ids
+        self.maf_dir = maf_dir
+        self.study_info_dict = study_info_dict
+        self.tags_dict = tags_dict
+        self.previous = previous
+
+        self.manifest = {
+            'version': MANIFEST_VERSION,
+            'schema': self.schema.NAME,
+            'study_info': json.dumps([self.study_info_dict, self.tags_dict], sort_keys=True),
+            'sample_ids': self.sample_ids,
+        }
+        self.add_clinical_data()
+        self.add_mafs()
+
+        return self.manifest
+
+    def add_clinical_data(self):
+        df = self.clinical_data_df
+        row_hashes = pd.util.hash_pandas_object(df, index=False)  # one uint64 per row, vectorized
+        self.manifest['clinical_columns'] = [str(c) for c in df.columns]
+        self.manifest['clinical_rows'] = [
+            [str(id_), str(h)] for id_, h in zip(df.iloc[:, 0], row_hashes)
+        ]
+
+    def add_mafs(self):
+        previous_mafs = {} if self.previous is None else self.previous['mafs']
+        self.manifest['mafs'] = {
+            id_: file_fingerprint(
+                file=f'{self.maf_dir}/{id_}.maf',
+                previous=previous_mafs.get(id_)
+            ) for id_ in self.sample_ids
+        }
+
+
+class CompareManifests:
+    """
+    Decides which parts of the study folder need to be regenerated
+    Everything is regenerated when there is no previous manifest, or the study info or schema has changed
+    """
+
+    previous: Optional[Dict[str, Any]]
+    current: Dict[str, Any]
+
+    full: bool
+    clinical_data_changed: bool
+    case_lists_changed: bool
+    unchanged_maf_row_counts: Dict[str, int]
+
+    def main(
+            self,
+            previous: Optional[Dict[str, Any]],
+            current: Dict[str, Any]):
+
+        self.previous = previous
+        self.current = current
+
+        self.set_full()
+        self.set_clinical_data_changed()
+        self.set_case_lists_changed()
+        self.set_unchanged_maf_row_counts()
+
+    def set_full(self):
+        self.full = self.previous is None \
+            or self.previous['schema'] != self.current['schema'] \
+            or self.previous['study_info'] != self.current['study_info']
+
+    def set_clinical_data_changed(self):
+        self.clinical_data_changed = self.full \
+            or self.previous['clinical_columns'] != self.current['clinical_columns'] \
+            or self.previous['clinical_rows'] != self.current['clinical_rows']
+
+    def set_case_lists_changed(self):
+        self.case_lists_changed = self.full \
+            or self.previous['sample_ids'] != self.current['sample_ids']
+
+    def set_unchanged_maf_row_counts(self):
+        """
+        Samples whose MAF files have not changed, and their numbers of rows in the previous mutation data file
+        """
+        if self.full:
+            self.unchanged_maf_row_counts = {}
+            return
+        previous_mafs = self.previous['mafs']
+        previous_row_counts = self.previous['mutation_row_counts']
+        self.unchanged_maf_row_counts = {
+            id_: previous_row_counts[str(id_)] for id_, fingerprint in self.current['mafs'].items()
+            if previous_mafs.get(id_, {}).get('sha256') == fingerprint['sha256'] and str(id_) in previous_row_counts
+        }
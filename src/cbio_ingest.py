@@ -6,12 +6,13 @@ Most of the classes dynamically depend on the `self.schema` object, which contai
 import json
 import os.path
 import pandas as pd
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Any, Callable
 from .schema import BaseModel
 from .cbio_constant import STUDY_IDENTIFIER_KEY, SAMPLE_ID
-from .cbio_write_clinical_data import WriteClinicalData
+from .cbio_write_clinical_data import WriteClinicalData, WritePatientData, WriteSampleData
 from .cbio_write_mutation_data import WriteMutationData
 from .cbio_preprocess_normalize import PreprocessNormalize
+from .cbio_incremental import BuildManifest, CompareManifests, load_manifest, save_manifest, remove_manifest
 
 
 class cBioIngest(BaseModel):
@@ -21,9 +22,16 @@ class cBioIngest(BaseModel):
     study_info_dict: Dict[str, str]
     tags_dict: Optional[Dict[str, str]]
     outdir: str
+    workers: int
+    incremental: bool
+    maf_cache_dir: Optional[str]
+    progress: Optional[Callable[[int, int], None]]
 
     patient_df: pd.DataFrame
     sample_df: pd.DataFrame
+    manifest: Optional[Dict[str, Any]]
+    changes: Optional[CompareManifests]
+    mutation_row_counts: Dict[str, int]
 
     def main(
             self,
@@ -31,19 +39,39 @@ class cBioIngest(BaseModel):
             maf_dir: str,
             study_info_dict: Dict[str, str],
             tags_dict: Optional[Dict[str, str]],
-            outdir: str):
-
+            outdir: str,
+            workers: int = 1,
+            incremental: bool = False,
+            maf_cache_dir: Optional[str] = None,
+            progress: Optional[Callable[[int, int], None]] = None):
+        """
+        incremental:
+            Only re-process the MAF files and clinical data that have changed since the last incremental export,
+            according to the manifest kept in outdir
+
+        maf_cache_dir:
+            Directory of the on-disk cache of parsed MAF files, None for no cache
+
+        progress:
+            Called as progress(done, total) after every MAF file, None for no reporting
+        """
         self.clinical_data_df = clinical_data_df
         self.maf_dir = maf_dir
         self.study_info_dict = study_info_dict
         self.tags_dict = tags_dict
         self.outdir = outdir
+        self.workers = workers
+        self.incremental = incremental
+        self.maf_cache_dir = maf_cache_dir
+        self.progress = progress
 
         self.write_study_info()
         self.preprocess_normalize()
+        self.compare_with_manifest()
         self.write_clinical_data()
         self.write_mutation_data()
         self.create_case_lists()
+        self.update_manifest()
 
     def write_study_info(self):
         WriteStudyInfo().main(
@@ -57,7 +85,34 @@ class cBioIngest(BaseModel):
             study_id=self.study_info_dict[STUDY_IDENTIFIER_KEY]
         )
 
+    def compare_with_manifest(self):
+        if not self.incremental:
+            remove_manifest(outdir=self.outdir)  # a full export makes the manifest of the previous inputs stale
+            self.manifest, self.changes = None, None
+            return
+
+        previous = load_manifest(outdir=self.outdir)
+        if previous is not None:
+            for file in previous['output_files']:
+                if not os.path.exists(f'{self.outdir}/{file}'):
+                    previous = None  # the study folder is incomplete, export everything
+                    break
+        remove_manifest(outdir=self.outdir)  # an interrupted export must not leave the previous manifest for the next one
+
+        self.manifest = BuildManifest(self.schema).main(
+            clinical_data_df=self.clinical_data_df,
+            sample_ids=self.sample_df[SAMPLE_ID].tolist(),
+            maf_dir=self.maf_dir,
+            study_info_dict=self.study_info_dict,
+            tags_dict=self.tags_dict,
+            previous=previous)
+        self.changes = CompareManifests()
+        self.changes.main(previous=previous, current=self.manifest)
+
     def write_clinical_data(self):
+        if self.changes is not None and not self.changes.clinical_data_changed:
+            print('Clinical data unchanged, skipping writing clinical data files', flush=True)
+            return
         WriteClinicalData(self.schema).main(
             study_info_dict=self.study_info_dict,
             patient_df=self.patient_df,
@@ -65,18 +120,51 @@ class cBioIngest(BaseModel):
             outdir=self.outdir)
 
     def write_mutation_data(self):
-        WriteMutationData().main(
+        reuse_row_counts = {} if self.changes is None else self.changes.unchanged_maf_row_counts
+        writer = WriteMutationData()
+        writer.main(
             maf_dir=self.maf_dir,
             study_info_dict=self.study_info_dict,
             sample_df=self.sample_df,
-            outdir=self.outdir)
+            outdir=self.outdir,
+            workers=self.workers,
+            reuse_row_counts=reuse_row_counts,
+            maf_cache_dir=self.maf_cache_dir,
+            progress=self.progress)
+        self.mutation_row_counts = writer.row_counts
 
     def create_case_lists(self):
+        if self.changes is not None and not self.changes.case_lists_changed:
+            print('Samples unchanged, skipping writing case lists', flush=True)
+            return
         CreateCaseLists().main(
             study_info_dict=self.study_info_dict,
             sample_df=self.sample_df,
             outdir=self.outdir)
 
+    def update_manifest(self):
+        if self.manifest is None:
+            return
+        self.manifest['output_files'] = [
+            file for file in self.get_output_files() if os.path.exists(f'{self.outdir}/{file}')
+        ]  # e.g. no patient data file for empty patient data
+        self.manifest['mutation_row_counts'] = self.mutation_row_counts
+        save_manifest(manifest=self.manifest, outdir=self.outdir)  # only after every file is written
+
+    def get_output_files(self) -> List[str]:
+        return [
+            WriteStudyInfo.META_STUDY_TXT_FILENAME,
+            WriteStudyInfo.TAGS_JSON_FILENAME,
+            WritePatientData.META_FNAME,
+            WritePatientData.DATA_FNAME,
+            WriteSampleData.META_FNAME,
+            WriteSampleData.DATA_FNAME,
+            WriteMutationData.META_FNAME,
+            WriteMutationData.DATA_FNAME,
+            f'{CreateCaseLists.CASE_DIRNAME}/{CreateCaseLists.ALL_TXT}',
+            f'{CreateCaseLists.CASE_DIRNAME}/{CreateCaseLists.SEQUENCED_TXT}',
+        ]
+
 
 class WriteStudyInfo:
 
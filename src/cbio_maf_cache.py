@@ -0,0 +1,130 @@
+"""
+On-disk cache of parsed MAF files
+Each entry is a columnar copy of a parsed MAF (Feather if pyarrow is installed, otherwise pickle),
+    keyed by the path, size, mtime and content hash of the source MAF
+"""
+import os
+import json
+import hashlib
+import pandas as pd
+from typing import Optional, Dict, Any, List, Tuple
+from .cbio_incremental import file_fingerprint
+
+
+try:
+    import pyarrow  # optional, enables the Feather format
+    ENTRY_EXT = '.feather'
+except ImportError:
+    ENTRY_EXT = '.pkl'  # pickle keeps the pandas column blocks, also much faster to load than re-parsing text
+
+
+class MafCache:
+
+    DEFAULT_MAX_BYTES = 10 * 1024 ** 3  # 10 GB
+    FINGERPRINT_EXT = '.json'
+    ENTRY_VERSION = 3  # bump when the parsed data frame changes (e.g. dtypes), so that old entries are never used
+
+    cache_dir: str
+    max_bytes: int
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, maf: str) -> Optional[pd.DataFrame]:
+        entry = self.__entry_of(maf=maf)
+        if not os.path.exists(entry):
+            return None
+
+        os.utime(entry)  # mark as recently used for LRU eviction
+        if ENTRY_EXT == '.feather':
+            return pd.read_feather(entry)
+        else:
+            return pd.read_pickle(entry)
+
+    def put(self, maf: str, df: pd.DataFrame):
+        """
+        The cache is best-effort, failing to write an entry should never fail the export
+        """
+        entry = self.__entry_of(maf=maf)
+        tmp = f'{entry}.{os.getpid()}.tmp'
+        try:
+            if ENTRY_EXT == '.feather':
+                df.to_feather(tmp)
+            else:
+                df.to_pickle(tmp)
+            os.replace(tmp, entry)  # atomic, concurrent readers never see a half-written entry
+        except Exception as e:
+            print(f'WARNING! Failed to cache "{maf}": {e!r}', flush=True)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the total size is within max_bytes
+        Lists the whole cache directory, so it should be called once after a batch of puts, not after every put
+        """
+        entries = self.__list_entries()
+        total = sum(size for _, _, size in entries)
+        for file, _, size in sorted(entries, key=lambda x: x[1]):  # oldest first
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:  # removed by another process
+                pass
+            total -= size
+
+    def __entry_of(self, maf: str) -> str:
+        path_digest = self.__path_digest(maf=maf)
+        fingerprint = self.__fingerprint(maf=maf, path_digest=path_digest)
+        return self.__entry_path(maf=maf, path_digest=path_digest, fingerprint=fingerprint)
+
+    def __entry_path(self, maf: str, path_digest: str, fingerprint: Dict[str, Any]) -> str:
+        key = f'{self.ENTRY_VERSION}|{os.path.abspath(maf)}|{fingerprint["size"]}|{fingerprint["mtime_ns"]}|{fingerprint["sha256"]}'
+        key_digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return f'{self.cache_dir}/{path_digest}-{key_digest}{ENTRY_EXT}'
+
+    def __path_digest(self, maf: str) -> str:
+        return hashlib.sha256(os.path.abspath(maf).encode()).hexdigest()[:16]
+
+    def __fingerprint(self, maf: str, path_digest: str) -> Dict[str, Any]:
+        """
+        The last fingerprint of each path is kept, so that the content hash is only
+            re-computed when the size or mtime of the MAF has changed,
+            and the entry of the previous version of the MAF can be removed right away
+        """
+        file = f'{self.cache_dir}/{path_digest}{self.FINGERPRINT_EXT}'
+
+        previous = None
+        if os.path.exists(file):
+            with open(file) as fh:
+                previous = json.load(fh)
+
+        fingerprint = file_fingerprint(file=maf, previous=previous)
+
+        if fingerprint != previous:
+            with open(f'{file}.{os.getpid()}.tmp', 'w') as fh:
+                json.dump(fingerprint, fh)
+            os.replace(f'{file}.{os.getpid()}.tmp', file)
+
+            if previous is not None:
+                stale = self.__entry_path(maf=maf, path_digest=path_digest, fingerprint=previous)
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+        return fingerprint
+
+    def __list_entries(self) -> List[Tuple[str, float, int]]:
+        ret = []
+        for fname in os.listdir(self.cache_dir):
+            if not fname.endswith(ENTRY_EXT):
+                continue
+            file = f'{self.cache_dir}/{fname}'
+            try:
+                stat = os.stat(file)
+            except FileNotFoundError:  # removed by another process
+                continue
+            ret.append((file, stat.st_mtime, stat.st_size))
+        return ret
@@ -1,14 +1,21 @@
 import numpy as np
 import pandas as pd
-from typing import Tuple, Union
+from typing import Tuple, Union, List, Dict, Optional
 from .schema import BaseModel
 from .cbio_constant import SAMPLE_ID, STUDY_ID, PATIENT_ID
+from .cbio_compiled_schema import compile_schema
+from .date_parser import parse_date
 
 
 class PreprocessNormalize(BaseModel):
+    """
+    The clinical data table is never copied as a whole, the identifiable columns are only left out of the columns
+        selected by NormalizePatientSampleData, where each of the patient and sample data frames is built once
+    """
 
     df: pd.DataFrame
     study_id: str
+    columns: List[str]
 
     patient_df: pd.DataFrame
     sample_df: pd.DataFrame
@@ -24,12 +31,14 @@ class PreprocessNormalize(BaseModel):
         return self.patient_df, self.sample_df
 
     def drop_identifiable_information(self):
-        self.df = self.df.drop(columns=self.schema.CBIO_DROP_COLUMNS)
+        # KeyError for missing columns, the same as self.df.drop(columns=...)
+        self.columns = self.df.columns.drop(self.schema.CBIO_DROP_COLUMNS).to_list()
 
     def normalize_patient_sample_data(self):
         self.patient_df, self.sample_df = NormalizePatientSampleData(self.schema).main(
             df=self.df,
-            study_id=self.study_id)
+            study_id=self.study_id,
+            columns=self.columns)
 
 
 def delta_t(
@@ -37,12 +46,12 @@ def delta_t(
         end: Union[pd.Timestamp, str, type(np.NAN)]) -> pd.Timedelta:
 
     if type(start) is str:
-        start = pd.to_datetime(start)
+        start = parse_date(start)
     elif pd.isna(start):
         start = pd.NaT
 
     if type(end) is str:
-        end = pd.to_datetime(end)
+        end = parse_date(end)
     elif pd.isna(end):
         end = pd.NaT
 
@@ -50,16 +59,32 @@ def delta_t(
 
 
 class NormalizePatientSampleData(BaseModel):
+    """
+    Renaming, adding and reordering columns only work on the column names, which refer to the columns of df,
+        so that the patient and sample data frames are the only copies of the data
+    """
 
     df: pd.DataFrame
     study_id: str
 
+    columns: List[str]  # normalized column names in order
+    sources: Dict[str, pd.Series]  # normalized column name -> column of df (or the added column)
+
     patient_df: pd.DataFrame
     sample_df: pd.DataFrame
 
-    def main(self, df: pd.DataFrame, study_id: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    def main(
+            self,
+            df: pd.DataFrame,
+            study_id: str,
+            columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        columns:
+            Columns of df to be normalized, None for all columns
+        """
         self.df = df
         self.study_id = study_id
+        self.columns = self.df.columns.to_list() if columns is None else list(columns)
 
         self.rename_and_add_columns()
         self.extract_patient_data()
@@ -68,22 +93,32 @@ class NormalizePatientSampleData(BaseModel):
         return self.patient_df, self.sample_df
 
     def rename_and_add_columns(self):
-        self.df = self.df.rename(columns={self.df.columns[0]: SAMPLE_ID})  # cBioPortal requires it to be 'Sample ID'
-
-        self.df[STUDY_ID] = self.study_id
-        self.df[PATIENT_ID] = self.df[SAMPLE_ID]
-
-        columns = self.df.columns.to_list()
-        reordered = columns[-2:] + columns[:-2]  # move the last two columns 'Study ID' and 'Patient ID' to the front
-        self.df = self.df[reordered]
+        first = self.columns[0]
+        self.sources = {}
+        for i, c in enumerate(self.columns):
+            if c == first:
+                self.columns[i] = SAMPLE_ID  # cBioPortal requires it to be 'Sample ID'
+            self.sources[self.columns[i]] = self.df[c]
+
+        for c, source in [
+            (STUDY_ID, pd.Series(self.study_id, index=self.df.index, dtype=object)),
+            (PATIENT_ID, self.sources[SAMPLE_ID]),
+        ]:
+            if c not in self.sources:
+                self.columns.append(c)
+            self.sources[c] = source
+
+        self.columns = self.columns[-2:] + self.columns[:-2]  # move the last two columns 'Study ID' and 'Patient ID' to the front
 
     def extract_patient_data(self):
         columns = [PATIENT_ID] + self.schema.CBIO_PATIENT_LEVEL_COLUMNS
-        df = self.df[columns].copy()
-        self.patient_df = df
+        self.patient_df = self.build_df(columns=columns)
 
     def extract_sample_data(self):
-        columns = [
-            c for c in self.df.columns if c not in self.schema.CBIO_PATIENT_LEVEL_COLUMNS
-        ]
-        self.sample_df = self.df[columns].copy()
+        is_patient_level = compile_schema(self.schema).lookup(columns=self.columns)['is_patient_level']
+        columns = [c for c, p in zip(self.columns, is_patient_level) if not p]
+        self.sample_df = self.build_df(columns=columns)
+
+    def build_df(self, columns: List[str]) -> pd.DataFrame:
+        # KeyError for missing columns, the same as selecting columns of a data frame
+        return pd.DataFrame({c: self.sources[c] for c in columns}, index=self.df.index, columns=columns)
@@ -1,7 +1,11 @@
+import os
+import numpy as np
 import pandas as pd
-from typing import Dict, List
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Iterator, TextIO
 from .schema import BaseModel
 from .cbio_constant import STUDY_IDENTIFIER_KEY, PATIENT_ID
+from .cbio_compiled_schema import compile_schema
 
 
 class WriteClinicalData(BaseModel):
@@ -28,7 +32,10 @@ class WriteClinicalData(BaseModel):
         self.write_sample_data()
 
     def remove_empty_columns_from_patient_df(self):
-        self.patient_df = RemoveEmptyColumns(self.schema).main(self.patient_df)
+        remover = RemoveEmptyColumns(self.schema)
+        self.patient_df = remover.main(self.patient_df)
+        if len(remover.removed_columns) > 0:
+            print(f'Remove {len(remover.removed_columns)} empty columns for cBioPortal: {remover.removed_columns}', flush=True)
 
     def write_patient_data(self):
         # only the "Patient ID" column was left
@@ -51,89 +58,109 @@ class WriteClinicalData(BaseModel):
 
 
 class RemoveEmptyColumns(BaseModel):
+    """
+    Columns of all NaN are found in one reduction and dropped at once,
+        the names of the removed columns are in self.removed_columns
+    """
 
     df: pd.DataFrame
+    removed_columns: List[str]
 
     def main(self, df: pd.DataFrame) -> pd.DataFrame:
-        self.df = df.copy()
-        for column in self.df.columns:
-            if all(pd.isna(self.df[column])):
-                print(f'Remove empty column for cBioPortal: "{column}"', flush=True)
-                self.df.drop(columns=column, inplace=True)
+        is_empty = df.isna().all(axis=0).to_numpy()
+        self.removed_columns = df.columns[is_empty].to_list()
+        self.df = df.drop(columns=self.removed_columns)  # a new data frame, not a slice of df, so that it can be assigned into
         return self.df
 
 
 class BaseWriter(BaseModel):
+    """
+    Every file is written through one buffered handle to a temporary file,
+        which is renamed to the destination only after it is complete
+    """
 
+    META_FNAME: str
     DATA_FNAME: str
+    DATATYPE: str
 
     df: pd.DataFrame
     study_info_dict: Dict[str, str]
     outdir: str
 
-    def write_data_file_1st_2nd_lines(self):
-        line = '#' + '\t'.join(self.df.columns) + '\n'
-        with open(f'{self.outdir}/{self.DATA_FNAME}', 'w', encoding='UTF-8') as fh:
-            for _ in range(2):
-                fh.write(line)
-
-    def write_data_file_3rd_line(self):
-        datatypes = GetDataTypes(self.schema).main(
-            columns=self.df.columns.to_list()
-        )
-
-        line = '#' + '\t'.join(datatypes) + '\n'
-        with open(f'{self.outdir}/{self.DATA_FNAME}', 'a') as fh:
-            fh.write(line)
-
-    def write_data_file_4th_line(self):
-        items = ['1' for _ in self.df.columns]
-        line = '#' + '\t'.join(items) + '\n'
-        with open(f'{self.outdir}/{self.DATA_FNAME}', 'a') as fh:
-            fh.write(line)
-
-
-class WritePatientData(BaseWriter):
-
-    META_FNAME = 'meta_clinical_patient.txt'
-    DATA_FNAME = 'data_clinical_patient.txt'
-
     def main(
             self,
-            patient_df: pd.DataFrame,
+            df: pd.DataFrame,
             study_info_dict: Dict[str, str],
             outdir: str):
 
-        self.df = patient_df
+        self.df = df
         self.study_info_dict = study_info_dict
         self.outdir = outdir
 
         self.write_meta_file()
-        self.write_data_file_1st_2nd_lines()
-        self.write_data_file_3rd_line()
-        self.write_data_file_4th_line()
         self.write_data_file()
 
     def write_meta_file(self):
         text = f'''\
 cancer_study_identifier: {self.study_info_dict[STUDY_IDENTIFIER_KEY]}
 genetic_alteration_type: CLINICAL
-datatype: PATIENT_ATTRIBUTES
+datatype: {self.DATATYPE}
 data_filename: {self.DATA_FNAME}'''
 
-        with open(f'{self.outdir}/{self.META_FNAME}', 'w') as fh:
+        with open_atomic(f'{self.outdir}/{self.META_FNAME}', newline=None) as fh:
             fh.write(text)
 
     def write_data_file(self):
+        with open_atomic(f'{self.outdir}/{self.DATA_FNAME}') as fh:
+            self.write_data_file_1st_2nd_lines(fh)
+            self.write_data_file_3rd_line(fh)
+            self.write_data_file_4th_line(fh)
+            self.write_data_file_rows(fh)
+
+    def write_data_file_1st_2nd_lines(self, fh: TextIO):
+        line = '#' + '\t'.join(self.df.columns) + os.linesep
+        for _ in range(2):
+            fh.write(line)
+
+    def write_data_file_3rd_line(self, fh: TextIO):
+        datatypes = GetDataTypes(self.schema).main(
+            columns=self.df.columns.to_list()
+        )
+
+        line = '#' + '\t'.join(datatypes) + os.linesep
+        fh.write(line)
+
+    def write_data_file_4th_line(self, fh: TextIO):
+        items = ['1' for _ in self.df.columns]
+        line = '#' + '\t'.join(items) + os.linesep
+        fh.write(line)
+
+    def write_data_file_rows(self, fh: TextIO):
         self.df = FillInMissingBooleanValues(self.schema).main(self.df)
         self.df = FormatClinicalData(self.schema).main(self.df)
-        self.df.to_csv(f'{self.outdir}/{self.DATA_FNAME}', mode='a', sep='\t', index=False)
+        self.df.to_csv(fh, sep='\t', index=False, lineterminator=os.linesep)
+
+
+class WritePatientData(BaseWriter):
+
+    META_FNAME = 'meta_clinical_patient.txt'
+    DATA_FNAME = 'data_clinical_patient.txt'
+    DATATYPE = 'PATIENT_ATTRIBUTES'
+
+    def main(
+            self,
+            patient_df: pd.DataFrame,
+            study_info_dict: Dict[str, str],
+            outdir: str):
+
+        super().main(df=patient_df, study_info_dict=study_info_dict, outdir=outdir)
 
 
 class WriteSampleData(BaseWriter):
 
     META_FNAME = 'meta_clinical_sample.txt'
     DATA_FNAME = 'data_clinical_sample.txt'
+    DATATYPE = 'SAMPLE_ATTRIBUTES'
 
     def main(
             self,
@@ -141,127 +168,90 @@ class WriteSampleData(BaseWriter):
             study_info_dict: Dict[str, str],
             outdir: str):
 
-        self.df = sample_df
-        self.study_info_dict = study_info_dict
-        self.outdir = outdir
+        super().main(df=sample_df, study_info_dict=study_info_dict, outdir=outdir)
 
-        self.write_meta_file()
-        self.write_data_file_1st_2nd_lines()
-        self.write_data_file_3rd_line()
-        self.write_data_file_4th_line()
-        self.write_data_file()
 
-    def write_meta_file(self):
-        text = f'''\
-cancer_study_identifier: {self.study_info_dict[STUDY_IDENTIFIER_KEY]}
-genetic_alteration_type: CLINICAL
-datatype: SAMPLE_ATTRIBUTES
-data_filename: {self.DATA_FNAME}'''
+@contextmanager
+def open_atomic(
+        file: str,
+        newline: Optional[str] = '',
+        buffering: int = 1024 ** 2) -> Iterator[TextIO]:
+    """
+    Opens a temporary file next to the destination file for writing in UTF-8,
+        the destination is replaced only when the block exits without exception,
+        so that readers never see a half-written file, and the previous file is kept on failure
 
-        with open(f'{self.outdir}/{self.META_FNAME}', 'w') as fh:
-            fh.write(text)
-
-    def write_data_file(self):
-        self.df = FillInMissingBooleanValues(self.schema).main(self.df)
-        self.df = FormatClinicalData(self.schema).main(self.df)
-        self.df.to_csv(f'{self.outdir}/{self.DATA_FNAME}', mode='a', sep='\t', index=False)
+    newline:
+        '' writes line terminators as they are (e.g. os.linesep), None translates '\n' to os.linesep
+    """
+    tmp = f'{file}.tmp'
+    try:
+        with open(tmp, 'w', encoding='UTF-8', newline=newline, buffering=buffering) as fh:
+            yield fh
+        os.replace(tmp, file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
 
 
 class FillInMissingBooleanValues(BaseModel):
 
     df: pd.DataFrame
 
-    datatypes: List[str]
+    is_bool: np.ndarray
 
     def main(self, df: pd.DataFrame) -> pd.DataFrame:
         self.df = df
 
-        self.set_datatypes()
+        self.set_is_bool()
         self.fillna()
 
         return self.df
 
-    def set_datatypes(self):
-        self.datatypes = GetDataTypes(self.schema).main(columns=self.df.columns.to_list())
+    def set_is_bool(self):
+        self.is_bool = compile_schema(self.schema).lookup(columns=self.df.columns.to_list())['is_bool'].to_numpy()
 
     def fillna(self):
-        for dtype, column in zip(self.datatypes, self.df.columns):
-            if dtype == 'BOOLEAN':
-                self.df[column] = self.df[column].fillna(value=False)
+        for i in np.flatnonzero(self.is_bool):
+            column = self.df.columns[i]
+            self.df[column] = self.df[column].fillna(value=False)
 
 
 class GetDataTypes(BaseModel):
 
-    columns: List[str]
-
-    datatypes: List[str]
-
     def main(self, columns: List[str]) -> List[str]:
-        self.columns = columns
-
-        self.datatypes = []
-        for c in self.columns:
-            ty = self.schema.COLUMN_ATTRIBUTES.get(c, {}).get('type', 'str')  # default is 'str'
-
-            if ty == 'bool':
-                dtype = 'BOOLEAN'
-            elif ty == 'int' or ty == 'float':
-                dtype = 'NUMBER'
-            else:
-                dtype = 'STRING'  # default
-
-            self.datatypes.append(dtype)
-
-        return self.datatypes
+        return compile_schema(self.schema).lookup(columns=columns)['datatype'].tolist()
 
 
 class FormatClinicalData(BaseModel):
 
-    RENAME_COLUMN_DICT = {
-        'DISEASE_FREE_MONTHS': 'DF_MONTHS',
-        'DISEASE_FREE_STATUS': 'DF_STATUS',
-        'DISEASE_SPECIFIC_SURVIVAL_MONTHS': 'DSS_MONTHS',
-        'DISEASE_SPECIFIC_SURVIVAL_STATUS': 'DSS_STATUS',
-        'OVERALL_SURVIVAL_MONTHS': 'OS_MONTHS',
-        'OVERALL_SURVIVAL_STATUS': 'OS_STATUS',
-        'PROGRESSION_FREE_SURVIVAL_MONTHS': 'PFS_MONTHS',
-        'PROGRESSION_FREE_SURVIVAL_STATUS': 'PFS_STATUS',
-    }
-
     df: pd.DataFrame
 
+    compiled: pd.DataFrame
+
     def main(self, df: pd.DataFrame) -> pd.DataFrame:
         self.df = df
 
+        self.set_compiled()
         self.replace_boolean_with_str()
         self.format_columns()
-        self.rename_columns()
 
         return self.df
 
+    def set_compiled(self):
+        self.compiled = compile_schema(self.schema).lookup(columns=self.df.columns.to_list())
+
     def replace_boolean_with_str(self):
         # cBioPortal boolean values need to be written as 'TRUE' and 'FALSE'
-        for c in self.df.columns:
-            datatype = self.schema.COLUMN_ATTRIBUTES.get(c, {}).get('type', 'str')  # default is 'str'
-            # need to check datatype is bool, otherwise what can happen is:
-            #   1.0 --> 'TRUE'
-            #   0.0 --> 'FALSE'
-            if datatype == 'bool':
-                # need to convert to str first,
-                # to make sure True and False are converted to 'TRUE' and 'FALSE'
-                self.df[c] = self.df[c].astype(str).replace({'True': 'TRUE', 'False': 'FALSE'})
+        # need to check datatype is bool, otherwise what can happen is:
+        #   1.0 --> 'TRUE'
+        #   0.0 --> 'FALSE'
+        for i in np.flatnonzero(self.compiled['is_bool'].to_numpy()):
+            c = self.df.columns[i]
+            # need to convert to str first,
+            # to make sure True and False are converted to 'TRUE' and 'FALSE'
+            self.df[c] = self.df[c].astype(str).replace({'True': 'TRUE', 'False': 'FALSE'})
 
     def format_columns(self):
-
-        def formated(c: str) -> str:
-            for x in [' ', '-', ',', '/']:
-                c = c.upper().replace(x, '_')
-            for x in ['(', ')']:
-                c = c.replace(x, '')
-            return c
-
-        rename_dict = {c: formated(c) for c in self.df.columns}
-        self.df = self.df.rename(columns=rename_dict)
-
-    def rename_columns(self):
-        self.df = self.df.rename(columns=self.RENAME_COLUMN_DICT)
+        # e.g. 'Overall Survival (Months)' -> 'OS_MONTHS'
+        self.df = self.df.set_axis(self.compiled['cbio_column'].to_list(), axis=1)
@@ -1,7 +1,10 @@
 import os.path
 import pandas as pd
-from typing import Dict, List
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Iterator, Tuple, Callable
 from .cbio_constant import STUDY_IDENTIFIER_KEY
+from .cbio_maf_cache import MafCache
 
 
 class WriteMutationData:
@@ -13,27 +16,89 @@ class WriteMutationData:
     study_info_dict: Dict[str, str]
     sample_df: pd.DataFrame
     outdir: str
+    chunksize: Optional[int]
+    max_rss_mb: Optional[float]
+    workers: int
+    reuse_row_counts: Dict[str, int]
+    maf_cache: Optional[MafCache]
+    maf_engine: str
+    progress: Optional[Callable[[int, int], None]]
 
+    sample_ids: List[str]
     mafs: List[str]
+    reused_dfs: Dict[str, pd.DataFrame]
+    parsed_dfs: Dict[str, pd.DataFrame]
     df: pd.DataFrame
+    row_counts: Dict[str, int]
+    peak_rss_mb: Optional[float]
 
     def main(
             self,
             maf_dir: str,
             study_info_dict: Dict[str, str],
             sample_df: pd.DataFrame,
-            outdir: str):
+            outdir: str,
+            chunksize: Optional[int] = None,
+            max_rss_mb: Optional[float] = None,
+            workers: int = 1,
+            reuse_row_counts: Optional[Dict[str, int]] = None,
+            maf_cache_dir: Optional[str] = None,
+            maf_engine: str = 'c',
+            progress: Optional[Callable[[int, int], None]] = None):
+        """
+        chunksize:
+            None to hold all variants of the study in memory before writing,
+            otherwise the number of MAF rows read at a time and appended to the data file (streaming mode)
 
+        max_rss_mb:
+            Ceiling of the current resident set size (MB) of the process, checked after every MAF (or chunk),
+            None for no ceiling, the peak seen during the export is reported if chunksize or max_rss_mb is set
+
+        workers:
+            Number of processes to parse MAF files in parallel, the output is still in the order of sample_df
+
+        reuse_row_counts:
+            Samples whose MAF files have not changed since the existing data file was written (incremental export),
+            and their numbers of rows written in it (self.row_counts of that export),
+            their rows are taken from the existing data file instead of parsing the MAF files again,
+            unless the number of rows found there is different, e.g. the data file was edited or partially written
+
+        maf_cache_dir:
+            Directory of the on-disk cache of parsed MAF files, None for no cache
+
+        maf_engine:
+            'c' or 'pyarrow', the parser engine of MAF files, streaming mode always uses 'c'
+
+        progress:
+            Called as progress(done, total) after every MAF file, None for no reporting,
+            an exception raised by it (e.g. cancellation) stops the export
+        """
         self.maf_dir = maf_dir
         self.study_info_dict = study_info_dict
         self.sample_df = sample_df
         self.outdir = outdir
+        self.chunksize = chunksize
+        self.max_rss_mb = max_rss_mb
+        self.workers = workers
+        self.reuse_row_counts = {} if reuse_row_counts is None else reuse_row_counts
+        self.maf_cache = None if maf_cache_dir is None else MafCache(cache_dir=maf_cache_dir)
+        self.maf_engine = maf_engine
+        self.progress = progress
 
+        assert self.workers >= 1, f'Number of workers should be at least 1, got {self.workers}'
+        assert self.chunksize is None or self.workers == 1, 'Streaming mode (chunksize) runs in a single process, workers should be 1'
+        assert self.chunksize is None or len(self.reuse_row_counts) == 0, 'Streaming mode (chunksize) does not reuse existing rows'
+
+        self.row_counts = {}
+        self.peak_rss_mb = None
         self.write_meta_file()
         self.set_mafs()
-        self.read_first_maf()
-        self.read_the_rest_mafs()
-        self.write_data_file()
+        if self.chunksize is None:
+            self.read_mafs()
+            self.write_data_file()
+        else:
+            self.stream_data_file()
+        self.report_peak_rss()
 
     def write_meta_file(self):
         text = f'''\
@@ -51,19 +116,171 @@ data_filename: {self.DATA_FNAME}'''
 
     def set_mafs(self):
         sample_id_column = self.sample_df.columns[2]  # First 3 columns: 'Study ID', 'Patient ID', 'Sample ID'
-        self.mafs = [f'{self.maf_dir}/{id_}.maf' for id_ in self.sample_df[sample_id_column]]
+        self.sample_ids = self.sample_df[sample_id_column].tolist()
+        self.mafs = [f'{self.maf_dir}/{id_}.maf' for id_ in self.sample_ids]
+
+    def read_mafs(self):
+        self.read_reused_rows()
+        self.parse_mafs()
+        self.concat_in_sample_order()
+
+    def read_reused_rows(self):
+        self.reused_dfs = {}
+        if len(self.reuse_row_counts) == 0:
+            return
+
+        # Read as str and keep empty cells as '', so that reused rows are written back unchanged
+        df = pd.read_csv(
+            f'{self.outdir}/{self.DATA_FNAME}',
+            sep='\t',
+            dtype=str,
+            keep_default_na=False)
 
-    def read_first_maf(self):
-        self.df = ReadAndProcessMaf().main(maf=self.mafs[0])
+        # Barcodes are read as str, so sample ids are compared as str
+        reuse = {str(id_): n for id_, n in self.reuse_row_counts.items()}
+        groups = {}
+        for id_, group in df.groupby('Tumor_Sample_Barcode', sort=False):
+            if id_ in reuse:
+                groups[id_] = group
 
-    def read_the_rest_mafs(self):
-        for maf in self.mafs[1:]:
-            df = ReadAndProcessMaf().main(maf=maf)
-            self.df = pd.concat([self.df, df], ignore_index=True)
+        for id_, n in reuse.items():
+            group = groups.get(id_, df.iloc[0:0])  # a sample without any variant
+            if len(group) == n:
+                self.reused_dfs[id_] = group
+            else:
+                print(f'WARNING! {len(group)} rows of "{id_}" in the existing data file, expected {n}, re-reading its MAF file', flush=True)
+
+    def parse_mafs(self):
+        mafs = [
+            maf for id_, maf in zip(self.sample_ids, self.mafs) if str(id_) not in self.reused_dfs
+        ]
+        self.report_progress(done=len(self.mafs) - len(mafs))  # reused rows are done already
+        func = partial(read_and_process_maf, maf_cache=self.maf_cache, engine=self.maf_engine)
+        if self.workers == 1:
+            results = map(func, mafs)
+            self.collect_results(mafs=mafs, results=results)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(func, mafs)  # yields in the order of mafs
+                try:
+                    self.collect_results(mafs=mafs, results=results)
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)  # do not wait for the MAF files not yet started
+                    raise
+
+        if self.maf_cache is not None:
+            self.maf_cache.evict()
+
+    def collect_results(
+            self,
+            mafs: List[str],
+            results: Iterator[Tuple[Optional[pd.DataFrame], Optional[str]]]):
+
+        self.parsed_dfs = {}
+        failed = []
+        done = len(self.mafs) - len(mafs)
+        for maf, (df, error) in zip(mafs, results):
+            if error is None:
+                self.parsed_dfs[maf] = df
+            else:
+                failed.append(f'{os.path.basename(maf)}: {error}')
+            self.check_peak_rss()
+            done += 1
+            self.report_progress(done=done)
+
+        msg = '\n'.join(failed)
+        assert len(failed) == 0, f'Failed to read {len(failed)} of {len(mafs)} MAF files:\n{msg}'
+
+    def concat_in_sample_order(self):
+        # Collect all per-sample data frames and concatenate only once,
+        #   concatenating one by one copies the growing data frame every time, i.e. O(n^2)
+        dfs = []
+        for id_, maf in zip(self.sample_ids, self.mafs):
+            if str(id_) in self.reused_dfs:
+                dfs.append(self.reused_dfs[str(id_)])
+            else:
+                dfs.append(self.parsed_dfs[maf])
+            self.row_counts[str(id_)] = len(dfs[-1])
+        self.df = pd.concat(dfs, ignore_index=True)
 
     def write_data_file(self):
         self.df.to_csv(f'{self.outdir}/{self.DATA_FNAME}', sep='\t', index=False)
 
+    def stream_data_file(self):
+        # newline='' so that to_csv writes the same line terminator (os.linesep) as writing to a path
+        with open(f'{self.outdir}/{self.DATA_FNAME}', 'w', encoding='utf-8', newline='') as fh:
+            header = True
+            self.report_progress(done=0)
+            for i, (id_, maf) in enumerate(zip(self.sample_ids, self.mafs)):
+                self.row_counts[str(id_)] = 0
+                for df in ReadAndProcessMaf().iter_chunks(maf=maf, chunksize=self.chunksize):
+                    df.to_csv(fh, sep='\t', index=False, header=header)
+                    header = False
+                    self.row_counts[str(id_)] += len(df)
+                    self.check_peak_rss()
+                self.report_progress(done=i + 1)
+
+            if header:  # no chunk at all, still write the header line
+                pd.DataFrame(columns=ReadAndProcessMaf.COLUMNS).to_csv(fh, sep='\t', index=False)
+
+    def report_progress(self, done: int):
+        if self.progress is not None:
+            self.progress(done, len(self.mafs))
+
+    def is_rss_monitored(self) -> bool:
+        return self.chunksize is not None or self.max_rss_mb is not None
+
+    def check_peak_rss(self):
+        if not self.is_rss_monitored():
+            return
+        rss = get_rss_mb()
+        if rss is None:
+            return
+        self.peak_rss_mb = rss if self.peak_rss_mb is None else max(self.peak_rss_mb, rss)
+        if self.max_rss_mb is not None and rss > self.max_rss_mb:
+            raise MemoryError(f'RSS {rss:.1f} MB exceeded the ceiling of {self.max_rss_mb:.1f} MB')
+
+    def report_peak_rss(self):
+        if not self.is_rss_monitored():
+            return
+        self.check_peak_rss()
+        if self.peak_rss_mb is not None:
+            print(f'Peak RSS while writing mutation data: {self.peak_rss_mb:.1f} MB', flush=True)
+
+
+def read_and_process_maf(
+        maf: str,
+        maf_cache: Optional[MafCache] = None,
+        engine: str = 'c') -> Tuple[Optional[pd.DataFrame], Optional[str]]:
+    """
+    Module-level function so that it can be pickled to worker processes
+    Returns the error instead of raising it, so that every failed MAF file can be reported
+    """
+    try:
+        return ReadAndProcessMaf().main(maf=maf, maf_cache=maf_cache, engine=engine), None
+    except Exception as e:
+        return None, repr(e)
+
+
+def get_rss_mb() -> Optional[float]:
+    """
+    Current resident set size of the process in MB, None if it cannot be measured
+
+    Unlike the peak of getrusage(), it does not include memory used and freed before,
+        e.g. by a previous import or export in the same long-lived process
+    """
+    try:
+        with open('/proc/self/statm') as fh:  # Linux
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import psutil  # optional, e.g. on macOS and Windows
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 1024 ** 2
+
 
 class ReadAndProcessMaf:
     """
@@ -119,18 +336,120 @@ class ReadAndProcessMaf:
         'HGVSp_Short',
     ]
 
+    # Low-cardinality columns are categorical, positions and counts are nullable integers,
+    #   the rest are left for pandas to infer
+    CATEGORICAL_COLUMNS = [
+        'Center',
+        'NCBI_Build',
+        'Chromosome',
+        'Strand',
+        'Variant_Classification',
+        'Variant_Type',
+        'dbSNP_Val_Status',
+        'Matched_Norm_Sample_Barcode',
+        'Verification_Status',
+        'Validation_Status',
+        'Mutation_Status',
+        'Sequencing_Phase',
+        'Sequence_Source',
+        'Validation_Method',
+        'Sequencer',
+    ]
+    INTEGER_COLUMNS = [
+        'Entrez_Gene_Id',
+        'Start_Position',
+        'End_Position',
+        't_alt_count',
+        't_ref_count',
+        'n_alt_count',
+        'n_ref_count',
+    ]
+    CATEGORICAL_DTYPES = {c: 'category' for c in CATEGORICAL_COLUMNS}
+    ENGINES = ['c', 'pyarrow']
+
     maf: str
+    maf_cache: Optional[MafCache]
+    engine: str
     df: pd.DataFrame
 
-    def main(self, maf: str) -> pd.DataFrame:
+    def main(
+            self,
+            maf: str,
+            maf_cache: Optional[MafCache] = None,
+            engine: str = 'c') -> pd.DataFrame:
+        """
+        engine:
+            'c' or 'pyarrow' (multi-threaded, requires pyarrow)
+        """
         self.maf = maf
+        self.maf_cache = maf_cache
+        self.engine = engine
+        assert self.engine in self.ENGINES, f'MAF engine should be one of {self.ENGINES}, got "{self.engine}"'
         print(f'Processing {self.maf}', flush=True)
         self.read_maf()
         self.set_tumor_sample_id()
         return self.df
 
+    def iter_chunks(self, maf: str, chunksize: int) -> Iterator[pd.DataFrame]:
+        self.maf = maf
+        print(f'Processing {self.maf}', flush=True)
+        with pd.read_csv(
+                self.maf,
+                sep='\t',
+                skiprows=1,
+                usecols=self.COLUMNS,
+                dtype=self.CATEGORICAL_DTYPES,
+                chunksize=chunksize) as reader:
+            for self.df in reader:
+                self.cast_integer_columns()
+                self.set_tumor_sample_id()
+                yield self.df
+
     def read_maf(self):
-        self.df = pd.read_csv(self.maf, sep='\t', skiprows=1, usecols=self.COLUMNS)
+        if self.maf_cache is not None:
+            df = self.maf_cache.get(maf=self.maf)
+            if df is not None:
+                self.df = df
+                return
+
+        if self.engine == 'pyarrow':
+            self.read_maf_with_pyarrow()
+        else:
+            self.df = pd.read_csv(
+                self.maf,
+                sep='\t',
+                skiprows=1,
+                usecols=self.COLUMNS,
+                dtype=self.CATEGORICAL_DTYPES)
+            self.cast_integer_columns()
+
+        if self.maf_cache is not None:
+            self.maf_cache.put(maf=self.maf, df=self.df)
+
+    def read_maf_with_pyarrow(self):
+        # The pyarrow engine fails to find the header after skiprows, header=1 skips the version line as well
+        self.df = pd.read_csv(
+            self.maf,
+            sep='\t',
+            header=1,
+            usecols=self.COLUMNS,
+            dtype=self.CATEGORICAL_DTYPES,
+            engine='pyarrow')
+
+        self.cast_integer_columns()
+
+        for c in self.CATEGORICAL_COLUMNS:
+            # pyarrow infers float64 categories for all-empty columns, the C engine gives object
+            if self.df[c].cat.categories.dtype != object:
+                self.df[c] = self.df[c].cat.set_categories(self.df[c].cat.categories.astype(object))
+
+    def cast_integer_columns(self):
+        # Parsing as int64/float64 and casting afterwards is ~3x faster than dtype='Int64' in read_csv
+        for c in self.INTEGER_COLUMNS:
+            try:
+                self.df[c] = self.df[c].astype('Int64')
+            except (ValueError, TypeError):
+                pass  # non-integer values (e.g. '.', 'Unknown', 1.5) are kept as they are read, i.e. written unchanged
 
     def set_tumor_sample_id(self):
         # The name of the maf file should be the sample id
@@ -0,0 +1,247 @@
+"""
+Headless entry point, runs the same import -> reprocess -> export pipeline as the GUI for many studies
+
+    python -m src.cli --manifest studies.json --jobs 4
+
+The manifest is a JSON file of studies, relative paths are relative to the manifest file:
+
+    {
+        "studies": [
+            {
+                "schema": "NYCU OSCC",
+                "clinical_data_table": "nycu/clinical_data_table.csv",
+                "maf_dir": "nycu/maf",
+                "outdir": "out/hnsc_nycu_2024",
+                "study_info": {
+                    "type_of_cancer": "hnsc",
+                    "cancer_study_identifier": "hnsc_nycu_2024",
+                    "name": "Head and Neck Squamous Cell Carcinomas (NYCU, 2024)",
+                    "description": "Whole exome sequencing of OSCC tumor/normal pairs",
+                    "groups": "PUBLIC",
+                    "reference_genome": "hg38"
+                },
+                "tags": {"source_data": "NYCU"},
+                "workers": 1,
+                "incremental": false,
+                "maf_cache_dir": null
+            }
+        ]
+    }
+
+"schema" is a key of DATA_SCHEMA_DICT, "tags", "workers", "incremental" and "maf_cache_dir" are optional
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+from .model import Model
+from .schema import DATA_SCHEMA_DICT
+from .cbio_constant import STUDY_IDENTIFIER_KEY
+
+
+PROG = 'python -m src.cli'
+DESCRIPTION = 'Export cBioPortal studies listed in a manifest, without the GUI'
+REQUIRED = [
+    {
+        'keys': ['-m', '--manifest'],
+        'properties': {
+            'type': str,
+            'required': True,
+            'help': 'path to the JSON manifest of studies',
+        }
+    },
+]
+OPTIONAL = [
+    {
+        'keys': ['-j', '--jobs'],
+        'properties': {
+            'type': int,
+            'required': False,
+            'default': 1,
+            'help': 'number of studies exported in parallel processes (default: %(default)s)',
+        }
+    },
+    {
+        'keys': ['-h', '--help'],
+        'properties': {
+            'action': 'help',
+            'help': 'show this help message',
+        }
+    },
+]
+
+
+class EntryPoint:
+
+    parser: argparse.ArgumentParser
+
+    def main(self, argv: Optional[List[str]] = None) -> int:
+        self.set_parser()
+        self.add_required_arguments()
+        self.add_optional_arguments()
+        return self.run(argv=argv)
+
+    def set_parser(self):
+        self.parser = argparse.ArgumentParser(
+            prog=PROG,
+            description=DESCRIPTION,
+            add_help=False,
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    def add_required_arguments(self):
+        group = self.parser.add_argument_group('required arguments')
+        for item in REQUIRED:
+            group.add_argument(*item['keys'], **item['properties'])
+
+    def add_optional_arguments(self):
+        group = self.parser.add_argument_group('optional arguments')
+        for item in OPTIONAL:
+            group.add_argument(*item['keys'], **item['properties'])
+
+    def run(self, argv: Optional[List[str]]) -> int:
+        args = self.parser.parse_args(argv)
+        results = BatchExport().main(manifest=args.manifest, jobs=args.jobs)
+        failed = [r for r in results if r['error'] is not None]
+        return 1 if len(failed) > 0 else 0
+
+
+class BatchExport:
+
+    manifest: str
+    jobs: int
+
+    studies: List[Dict[str, Any]]
+    results: List[Dict[str, Any]]
+    wall_seconds: float
+
+    def main(self, manifest: str, jobs: int = 1) -> List[Dict[str, Any]]:
+        """
+        Returns one result per study in the order of the manifest, see ExportStudy.main()
+        A failed study does not stop the others, its error is in the result
+        """
+        self.manifest = manifest
+        self.jobs = jobs
+
+        assert self.jobs >= 1, f'Number of jobs should be at least 1, got {self.jobs}'
+
+        self.read_manifest()
+        self.export_studies()
+        self.print_summary()
+
+        return self.results
+
+    def read_manifest(self):
+        with open(self.manifest) as fh:
+            studies = json.load(fh)['studies']
+
+        basedir = os.path.dirname(os.path.abspath(self.manifest))
+        self.studies = []
+        for study in studies:
+            study = study.copy()
+            schema = study.get('schema')
+            assert schema in DATA_SCHEMA_DICT, f'Invalid schema "{schema}", should be one of {list(DATA_SCHEMA_DICT.keys())}'
+            for key in ['clinical_data_table', 'maf_dir', 'outdir', 'maf_cache_dir']:
+                if study.get(key) is not None:
+                    study[key] = os.path.join(basedir, study[key])
+            self.studies.append(study)
+
+    def export_studies(self):
+        start = time.perf_counter()
+        if self.jobs == 1:
+            self.results = [export_study(study) for study in self.studies]
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                self.results = list(executor.map(export_study, self.studies))  # in the order of studies
+        self.wall_seconds = time.perf_counter() - start
+
+    def print_summary(self):
+        lines = [f'{"Study":<32}{"Status":<8}{"Samples":>10}{"MAF MB":>10}{"Seconds":>10}{"Samples/s":>12}{"MAF MB/s":>10}']
+        for i, r in enumerate(self.results):
+            status = 'OK' if r['error'] is None else 'FAILED'
+            samples_per_sec = r['samples'] / r['seconds'] if r['seconds'] > 0 else 0.
+            mb_per_sec = r['maf_mb'] / r['seconds'] if r['seconds'] > 0 else 0.
+            lines.append(
+                f'{self.get_study_label(i):<32}{status:<8}{r["samples"]:>10}{r["maf_mb"]:>10.1f}'
+                f'{r["seconds"]:>10.2f}{samples_per_sec:>12.1f}{mb_per_sec:>10.1f}')
+
+        total = sum(r['seconds'] for r in self.results)
+        lines.append(f'{len(self.results)} studies in {self.wall_seconds:.2f} seconds with {self.jobs} jobs ({total:.2f} seconds of all studies added up)')
+
+        for i, r in enumerate(self.results):
+            if r['error'] is not None:
+                lines.append(f'{self.get_study_label(i)}: {r["error"]}')
+
+        print('\n'.join(lines), flush=True)
+
+    def get_study_label(self, i: int) -> str:
+        """
+        A study that failed before its study id or outdir is known is labeled by its index in the manifest
+        """
+        study = self.results[i]['study']
+        return f'studies[{i}]' if study is None else str(study)
+
+
+class ExportStudy:
+
+    study: Dict[str, Any]
+    model: Model
+
+    def main(self, study: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns {'study': str, 'samples': int, 'maf_mb': float, 'seconds': float, 'error': Optional[str]}
+        """
+        self.study = study
+
+        start = time.perf_counter()
+        self.model = Model(schema=DATA_SCHEMA_DICT[self.study['schema']])
+        self.model.import_clinical_data_table(file=self.study['clinical_data_table'])
+        self.model.reprocess_table()
+        self.model.export_cbioportal_study(
+            maf_dir=self.study['maf_dir'],
+            study_info_dict=self.study['study_info'],
+            tags_dict=self.study.get('tags'),
+            outdir=self.study['outdir'],
+            workers=self.study.get('workers', 1),
+            incremental=self.study.get('incremental', False),
+            maf_cache_dir=self.study.get('maf_cache_dir'))
+        seconds = time.perf_counter() - start
+
+        return {
+            'study': self.study['study_info'][STUDY_IDENTIFIER_KEY],
+            'samples': len(self.model.dataframe),
+            'maf_mb': get_maf_mb(maf_dir=self.study['maf_dir']),
+            'seconds': seconds,
+            'error': None,
+        }
+
+
+def export_study(study: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Module-level function so that it can be pickled to worker processes
+    Returns the error instead of raising it, so that every failed study can be reported
+    """
+    start = time.perf_counter()
+    try:
+        return ExportStudy().main(study=study)
+    except Exception as e:
+        return {
+            'study': (study.get('study_info') or {}).get(STUDY_IDENTIFIER_KEY, study.get('outdir')),
+            'samples': 0,
+            'maf_mb': 0.,
+            'seconds': time.perf_counter() - start,
+            'error': repr(e),
+        }
+
+
+def get_maf_mb(maf_dir: str) -> float:
+    if not os.path.isdir(maf_dir):
+        return 0.
+    total = sum(e.stat().st_size for e in os.scandir(maf_dir) if e.name.endswith('.maf'))
+    return total / 1024 ** 2
+
+
+if __name__ == '__main__':
+    sys.exit(EntryPoint().main())
@@ -1,6 +1,7 @@
 import shutil
-from typing import Dict, Optional
-from .view import View
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from typing import Dict, Optional, Callable, Any
+from .view import View, WorkProgressDialog
 from .model import Model
 from .cbio_constant import STUDY_IDENTIFIER_KEY
 
@@ -67,32 +68,139 @@ class Action:
         self.view = controller.view
 
 
-class ActionImportClinicalDataTable(Action):
+class Cancelled(Exception):
+    pass
+
+
+class WorkerSignals(QObject):
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    """
+    Runs func(progress=...) in a thread of the global QThreadPool
+
+    Signals are emitted from the worker thread and delivered in the GUI thread (queued connection),
+        cancel() makes the next progress report raise Cancelled inside func
+    """
+
+    func: Callable[..., Any]
+    signals: WorkerSignals
+    cancelled: bool
+
+    def __init__(self, func: Callable[..., Any]):
+        super().__init__()
+        self.setAutoDelete(False)  # kept by the action until the signals are delivered
+        self.func = func
+        self.signals = WorkerSignals()
+        self.cancelled = False
+
+    def run(self):
+        try:
+            result = self.func(progress=self.report_progress)
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+    def report_progress(self, done: int, total: int):
+        if self.cancelled:
+            raise Cancelled('Cancelled by user')
+        self.signals.progress.emit(done, total)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class BackgroundAction(Action):
+    """
+    Runs the long part of an action in a worker thread, so that the GUI keeps responding,
+        a modal progress dialog blocks other actions from changing the model in the meantime,
+        and only one background action runs at a time
+    """
+
+    running: Optional['BackgroundAction'] = None  # shared by all background actions
+
+    worker: Optional[Worker] = None
+    dialog: Optional[WorkProgressDialog] = None
+
+    def run_in_background(
+            self,
+            label: str,
+            func: Callable[..., Any],
+            on_finished: Callable[[Any], None],
+            on_failed: Optional[Callable[[Exception], None]] = None,
+            cancellable: bool = True):
+        """
+        func:
+            Called in the worker thread as func(progress=...), where progress(done, total) may raise Cancelled
+
+        on_finished, on_failed:
+            Called in the GUI thread with the return value or the exception of func,
+            exceptions are shown by message_box_error if on_failed is None
+        """
+        if BackgroundAction.running is not None:
+            self.view.message_box_info(msg='Another task is still running')
+            return
+
+        dialog = self.view.progress_dialog(label=label, cancellable=cancellable)
+        worker = Worker(func=func)
+        worker.signals.progress.connect(lambda done, total: self.__set_progress(dialog, done, total))
+        worker.signals.finished.connect(lambda result: self.__done(dialog, on_finished, result))
+        worker.signals.failed.connect(lambda e: self.__done(dialog, self.__on_failed if on_failed is None else on_failed, e))
+        if cancellable:
+            dialog.canceled.connect(worker.cancel)
+
+        BackgroundAction.running = self
+        self.dialog, self.worker = dialog, worker
+        QThreadPool.globalInstance().start(worker)
+
+    def __set_progress(self, dialog: WorkProgressDialog, done: int, total: int):
+        dialog.setMaximum(total)
+        dialog.setValue(done)
+
+    def __done(self, dialog: WorkProgressDialog, callback: Callable[[Any], None], arg: Any):
+        dialog.finish()
+        self.dialog, self.worker = None, None
+        BackgroundAction.running = None
+        callback(arg)
+
+    def __on_failed(self, e: Exception):
+        if isinstance(e, Cancelled):
+            self.view.message_box_info(msg='Cancelled')
+        else:
+            self.view.message_box_error(msg=repr(e))
+
+
+class ActionImportClinicalDataTable(BackgroundAction):
 
     def __call__(self):
         file = self.view.file_dialog_open_table()
         if file == '':
             return
 
-        try:
-            self.model.import_clinical_data_table(file=file)
-            self.view.refresh_table()
-        except Exception as e:
-            self.view.message_box_error(msg=repr(e))
+        self.run_in_background(
+            label='Importing clinical data table...',
+            func=lambda progress: self.model.import_clinical_data_table(file=file),
+            on_finished=lambda _: self.view.refresh_table(),
+            cancellable=False)
 
 
-class ActionImportSequencingTable(Action):
+class ActionImportSequencingTable(BackgroundAction):
 
     def __call__(self):
         file = self.view.file_dialog_open_table()
         if file == '':
             return
 
-        try:
-            self.model.import_sequencing_table(file=file)
-            self.view.refresh_table()
-        except Exception as e:
-            self.view.message_box_error(msg=repr(e))
+        self.run_in_background(
+            label='Importing sequencing table...',
+            func=lambda progress: self.model.import_sequencing_table(file=file),
+            on_finished=lambda _: self.view.refresh_table(),
+            cancellable=False)
 
 
 class ActionSaveClinicalDataTable(Action):
@@ -212,7 +320,7 @@ class ActionEditSample(Action):
                 break
             try:
                 self.model.update_sample(row=row, attributes=attributes)
-                self.view.refresh_table()
+                self.view.refresh_row(row=row)
                 success = True
             except Exception as e:
                 self.view.message_box_error(msg=repr(e))
@@ -240,13 +348,13 @@ class ActionEditCell(Action):
                 return
 
             self.model.update_cell(row=row, column=column, value=new_value)
-            self.view.refresh_table()
+            self.view.refresh_row(row=row)
 
         except Exception as e:
             self.view.message_box_error(msg=repr(e))
 
 
-class ActionExportCbioportalStudy(Action):
+class ActionExportCbioportalStudy(BackgroundAction):
 
     maf_dir: Optional[str]
     outdir: Optional[str]
@@ -301,26 +409,32 @@ class ActionExportCbioportalStudy(Action):
             self.tags_dict = {'source_data': s}
 
     def export_cbioportal_study(self):
-        try:
-            self.model.export_cbioportal_study(
+        self.run_in_background(
+            label='Exporting cBioPortal study...',
+            func=lambda progress: self.model.export_cbioportal_study(
                 maf_dir=self.maf_dir,
                 study_info_dict=self.study_info_dict,
                 tags_dict=self.tags_dict,
-                outdir=self.outdir)
-            self.view.message_box_info(msg='Export cBioPortal study complete')
-        except Exception as e:
-            shutil.rmtree(self.outdir)
+                outdir=self.outdir,
+                progress=progress),
+            on_finished=lambda _: self.view.message_box_info(msg='Export cBioPortal study complete'),
+            on_failed=self.on_export_failed)
+
+    def on_export_failed(self, e: Exception):
+        shutil.rmtree(self.outdir)  # including a study cancelled half way
+        if isinstance(e, Cancelled):
+            self.view.message_box_info(msg='Export cBioPortal study cancelled')
+        else:
             self.view.message_box_error(msg=repr(e))
 
 
-class ActionReprocessTable(Action):
+class ActionReprocessTable(BackgroundAction):
 
     def __call__(self):
-        try:
-            self.model.reprocess_table()
-            self.view.refresh_table()
-        except Exception as e:
-            self.view.message_box_error(msg=repr(e))
+        self.run_in_background(
+            label='Reprocessing table...',
+            func=lambda progress: self.model.reprocess_table(progress=progress),
+            on_finished=lambda _: self.view.refresh_table())
 
 
 class ActionUndo(Action):
@@ -0,0 +1,58 @@
+"""
+One date parser for every str date of the clinical data table (delta_t, CastDatatypes, format_date_list, and
+    the scalar fallbacks of the batch paths), so that all of them parse the same str into the same date
+
+Clinical tables repeat the same dates over and over, so parsed dates are memoized in a bounded LRU cache
+"""
+import re
+import pandas as pd
+from functools import lru_cache
+from typing import Dict, Any
+
+
+ISO_DATE_PATTERN = r'[0-9]{4}-[0-9]{2}-[0-9]{2}'
+CACHE_SIZE = 65536
+
+_ISO_DATE = re.compile(ISO_DATE_PATTERN)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(value: str) -> pd.Timestamp:
+    """
+    Same as pd.to_datetime(value) for a str, including the errors raised, which are not cached
+
+    'YYYY-MM-DD' is built from its numbers, which is much faster than the format inference of pd.to_datetime(),
+        anything invalid for it (e.g. '2020-02-30', out of the nanosecond range) falls back to get the same error
+    """
+    if _ISO_DATE.fullmatch(value):
+        try:
+            return pd.Timestamp(int(value[0:4]), int(value[5:7]), int(value[8:10])).as_unit('ns')
+        except (ValueError, OverflowError):
+            pass
+    return pd.to_datetime(value)
+
+
+def format_date(value: str) -> str:
+    """
+    pd.to_datetime(value).strftime('%Y-%m-%d')
+    """
+    return parse_date(value).strftime('%Y-%m-%d')
+
+
+def date_cache_info() -> Dict[str, Any]:
+    """
+    Counters of the cache of parse_date(), a failed parse counts as a miss
+    """
+    info = parse_date.cache_info()
+    total = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / total if total > 0 else 0.,
+        'size': info.currsize,
+        'max_size': info.maxsize,
+    }
+
+
+def clear_date_cache():
+    parse_date.cache_clear()
@@ -1,51 +1,101 @@
 import os
+import sys
+import numpy as np
 import pandas as pd
-from typing import List, Optional, Dict, Any, Union, Tuple, Type
+from typing import List, Optional, Dict, Any, Union, Tuple, Type, Set, Callable
 from .cbio_ingest import cBioIngest
-from .model_nycu import CalculateNycuOscc
+from .model_nycu import CalculateNycuOscc, BatchCalculateNycuOscc, str_series, get_is_str, get_derivation_plan
 from .schema import BaseModel, Schema, NycuOsccSchema
+from .date_parser import format_date, ISO_DATE_PATTERN
 
 
 class Model(BaseModel):
 
     MAX_UNDO = 100
+    MAX_UNDO_BYTES = 512 * 1024 ** 2  # 512 MB
 
     dataframe: pd.DataFrame
     clinical_data_file: Optional[str]
-    saved_dataframe_id: Optional[int]
+    version: int  # identifies the state of self.dataframe, which may be modified in place
+    saved_version: int
 
-    undo_cache: List[pd.DataFrame]
-    redo_cache: List[pd.DataFrame]
+    undo_cache: List[Union['UndoSnapshot', 'UndoRowPatch']]
+    redo_cache: List[Union['UndoSnapshot', 'UndoRowPatch']]
+    last_version: int
+
+    search_index: 'SearchIndex'
 
     def __init__(self, schema: Type[Schema]):
         super().__init__(schema=schema)
         self.dataframe = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS)
         self.clinical_data_file = None
-        self.saved_dataframe_id = id(self.dataframe)  # initial state is saved
+        self.version = 0
+        self.saved_version = self.version  # initial state is saved
         self.undo_cache = []
         self.redo_cache = []
+        self.last_version = self.version
+        self.search_index = SearchIndex()
 
     def undo(self):
         if len(self.undo_cache) == 0:
             return
-        self.redo_cache.append(self.dataframe)
-        self.dataframe = self.undo_cache.pop()
+        self.redo_cache.append(self.__restore(self.undo_cache.pop()))
 
     def redo(self):
         if len(self.redo_cache) == 0:
             return
-        self.undo_cache.append(self.dataframe)
-        self.dataframe = self.redo_cache.pop()
+        self.undo_cache.append(self.__restore(self.redo_cache.pop()))
+
+    def __restore(self, entry: Union['UndoSnapshot', 'UndoRowPatch']) -> Union['UndoSnapshot', 'UndoRowPatch']:
+        """
+        Restores the state of the entry, returns the entry to get back to the current state
+        """
+        if type(entry) is UndoSnapshot:
+            ret = UndoSnapshot(dataframe=self.dataframe, version=self.version, new=entry.dataframe)
+            self.dataframe = entry.dataframe
+        else:
+            ret = UndoRowPatch(row=entry.row, values=self.get_row_values(row=entry.row, columns=list(entry.values.keys())), version=self.version)
+            for column, val in entry.values.items():
+                self.dataframe.at[entry.row, column] = val
+            self.search_index.row_changed(dataframe=self.dataframe, row=entry.row)
+        self.version = entry.version
+        return ret
+
+    def __add_to_undo_cache(self, new: pd.DataFrame):
+        """
+        Should be called right before self.dataframe is replaced by the new data frame
+        The new data frame is always a new object, so the old one can be kept as it is
+        """
+        self.__push_undo_entry(UndoSnapshot(dataframe=self.dataframe, version=self.version, new=new))
+
+    def __add_row_patch_to_undo_cache(self, row: int, columns: Optional[List[str]] = None):
+        """
+        Should be called right before the row of self.dataframe is modified in place,
+            only the values of the row (or of the columns to be modified) are kept instead of a copy of the whole data frame
+        """
+        values = self.get_row_values(row=row, columns=self.dataframe.columns.to_list() if columns is None else columns)
+        self.__push_undo_entry(UndoRowPatch(row=row, values=values, version=self.version))
+
+    def get_row_values(self, row: int, columns: List[str]) -> Dict[str, Any]:
+        """
+        Cell values as they are, Series.to_dict() would turn pd.NA into None
+        """
+        return {c: self.dataframe.at[row, c] for c in columns}
+
+    def __push_undo_entry(self, entry: Union['UndoSnapshot', 'UndoRowPatch']):
+        self.undo_cache.append(entry)
+
+        total = sum(e.nbytes for e in self.undo_cache)
+        while len(self.undo_cache) > self.MAX_UNDO or (total > self.MAX_UNDO_BYTES and len(self.undo_cache) > 1):
+            total -= self.undo_cache.pop(0).nbytes  # drop the oldest, always keep the latest entry
 
-    def __add_to_undo_cache(self):
-        self.undo_cache.append(self.dataframe)
-        if len(self.undo_cache) > self.MAX_UNDO:
-            self.undo_cache.pop(0)
         self.redo_cache = []  # clear redo cache
+        self.last_version += 1
+        self.version = self.last_version  # the state about to be changed is a new version
 
     def reset_dataframe(self):
         new = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS)
-        self.__add_to_undo_cache()  # add to undo cache after successful reset
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful reset
         self.dataframe = new
 
     def import_clinical_data_table(self, file: str):
@@ -56,7 +106,7 @@ class Model(BaseModel):
         # When the whole column is NaN, it becomes float64, convert it back to object
         new = new.astype(object)
 
-        self.__add_to_undo_cache()  # add to undo cache after successful import
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful import
         self.dataframe = new
 
     def import_sequencing_table(self, file: str):
@@ -64,7 +114,7 @@ class Model(BaseModel):
             clinical_data_df=self.dataframe,
             file=file)
 
-        self.__add_to_undo_cache()  # add to undo cache after successful import
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful import
         self.dataframe = new
 
     def save_clinical_data_table(self, file: str):
@@ -73,7 +123,7 @@ class Model(BaseModel):
         else:
             self.dataframe.to_csv(file, encoding='utf-8-sig', index=False)
         self.clinical_data_file = file
-        self.saved_dataframe_id = id(self.dataframe)
+        self.saved_version = self.version
 
     def get_dataframe(self) -> pd.DataFrame:
         return self.dataframe.copy()
@@ -89,7 +139,7 @@ class Model(BaseModel):
         ).reset_index(
             drop=True
         )
-        self.__add_to_undo_cache()  # add to undo cache after successful sort
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful sort
         self.dataframe = new
 
     def drop(
@@ -102,7 +152,7 @@ class Model(BaseModel):
         ).reset_index(
             drop=True
         )
-        self.__add_to_undo_cache()  # add to undo cache after successful drop
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful drop
         self.dataframe = new
 
     def get_sample(self, row: int) -> Dict[str, str]:
@@ -142,27 +192,21 @@ class Model(BaseModel):
         """
         attributes = ProcessSampleAttributes(self.schema).main(attributes=attributes)
 
-        new = self.dataframe.copy()
-        new.loc[row] = attributes
-
-        self.__add_to_undo_cache()  # add to undo cache after successful update
-        self.dataframe = new
+        self.__add_row_patch_to_undo_cache(row=row)  # add to undo cache after successful update
+        self.dataframe.loc[row] = attributes
+        self.search_index.row_changed(dataframe=self.dataframe, row=row)
 
     def update_cell(self, row: int, column: str, value: str):
         """
         Everyting comes in model should be string
         Data type conversion is done in the model
         """
-        series = self.dataframe.loc[row].fillna('')  # NaN should be ''
-        attributes = series.to_dict()
-        attributes[column] = value  # update the field with new value
-        attributes = ProcessSampleAttributes(self.schema).main(attributes=attributes)
-
-        new = self.dataframe.copy()
-        new.loc[row] = attributes
+        values = ProcessCellEdit(self.schema).main(dataframe=self.dataframe, row=row, column=column, value=value)
 
-        self.__add_to_undo_cache()  # add to undo cache after successful update
-        self.dataframe = new
+        self.__add_row_patch_to_undo_cache(row=row, columns=list(values.keys()))  # add to undo cache after successful update
+        for key, val in values.items():
+            self.dataframe.at[row, key] = val
+        self.search_index.row_changed(dataframe=self.dataframe, row=row)
 
     def append_sample(self, attributes: Dict[str, str]):
         """
@@ -174,18 +218,12 @@ class Model(BaseModel):
         new = append(self.dataframe, pd.Series(attributes))
         new = new[self.schema.DISPLAY_COLUMNS]  # make sure the columns are displayed in correct order
 
-        self.__add_to_undo_cache()  # add to undo cache after successful append
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful append
         self.dataframe = new
 
-    def reprocess_table(self):
-        new = self.dataframe.copy()
-
-        for row in range(len(new)):
-            attributes = self.get_sample(row=row)  # get from the current self.dataframe
-            attributes = ProcessSampleAttributes(self.schema).main(attributes=attributes)
-            new.loc[row] = attributes
-
-        self.__add_to_undo_cache()  # add to undo cache after successful reprocess
+    def reprocess_table(self, progress: Optional[Callable[[int, int], None]] = None):
+        new = ReprocessTable(self.schema).main(df=self.dataframe, progress=progress)
+        self.__add_to_undo_cache(new=new)  # add to undo cache after successful reprocess
         self.dataframe = new
 
     def find(
@@ -200,31 +238,208 @@ class Model(BaseModel):
             start_irow = start[0]
             start_icol = self.dataframe.columns.to_list().index(start[1])
 
-        nrows, ncols = self.dataframe.shape
+        found = self.search_index.main(dataframe=self.dataframe).find(
+            text=text,
+            start_irow=start_irow,
+            start_icol=start_icol)
 
-        for r in range(nrows):
-            for c in range(ncols):
-                if r <= start_irow and c <= start_icol:
-                    continue
-                if text.lower() in str(self.dataframe.iloc[r, c]).lower():
-                    return r, self.dataframe.columns[c]
+        if found is not None:
+            r, c = found
+            return r, self.dataframe.columns[c]
 
     def export_cbioportal_study(
             self,
             maf_dir: str,
             study_info_dict: Dict[str, str],
             tags_dict: Dict[str, str],
-            outdir: str):
+            outdir: str,
+            workers: int = 1,
+            incremental: bool = False,
+            maf_cache_dir: Optional[str] = None,
+            progress: Optional[Callable[[int, int], None]] = None):
 
         ExportCbioportalStudy(self.schema).main(
             clinical_data_df=self.dataframe,
             maf_dir=maf_dir,
             study_info_dict=study_info_dict,
             tags_dict=tags_dict,
-            outdir=outdir)
+            outdir=outdir,
+            workers=workers,
+            incremental=incremental,
+            maf_cache_dir=maf_cache_dir,
+            progress=progress)
 
     def is_file_saved(self) -> bool:
-        return id(self.dataframe) == self.saved_dataframe_id
+        return self.version == self.saved_version
+
+
+class SearchIndex:
+    """
+    Lowercased str() of all cells, each column is concatenated into one buffer separated by SEP,
+        so that finding text in a column is a single str.find() in C instead of a Python loop over cells
+
+    The index is bound to a data frame object:
+        a new data frame (e.g. sort, import, undo of a snapshot) rebuilds the whole index,
+        in-place changes of a row (e.g. update_cell) only refresh that row,
+        changes of any other data frame are ignored, since it is rebuilt anyway once it is bound
+    """
+
+    SEP = '\x00'  # never in the search text, so that a match never spans two cells
+
+    dataframe: Optional[pd.DataFrame]
+    changed_rows: Set[Any]
+    cells: List[List[str]]  # [column][row]
+    buffers: List[str]  # [column]
+    offsets: List[np.ndarray]  # [column][row], where each cell starts in the buffer
+
+    def __init__(self):
+        self.dataframe = None
+        self.changed_rows = set()
+
+    def main(self, dataframe: pd.DataFrame) -> 'SearchIndex':
+        if dataframe is not self.dataframe:
+            self.build(dataframe=dataframe)
+        elif len(self.changed_rows) > 0:
+            self.refresh_changed_rows()
+        return self
+
+    def row_changed(self, dataframe: pd.DataFrame, row: Any):
+        if dataframe is self.dataframe:
+            self.changed_rows.add(row)
+
+    def build(self, dataframe: pd.DataFrame):
+        self.dataframe = dataframe
+        self.changed_rows = set()
+        self.cells, self.buffers, self.offsets = [], [], []
+        for c in range(dataframe.shape[1]):
+            cells = [str(v).lower() for v in dataframe.iloc[:, c].tolist()]
+            self.cells.append(cells)
+            self.buffers.append('')
+            self.offsets.append(np.array([], dtype=np.int64))
+            self.build_buffer(c=c)
+
+    def build_buffer(self, c: int):
+        cells = self.cells[c]
+        self.buffers[c] = self.SEP.join(cells)
+        lengths = np.fromiter((len(x) + len(self.SEP) for x in cells), dtype=np.int64, count=len(cells))
+        self.offsets[c] = np.cumsum(lengths) - lengths
+
+    def refresh_changed_rows(self):
+        index = self.dataframe.index
+        irows = [index.get_loc(row) for row in self.changed_rows if row in index]
+        self.changed_rows = set()
+        for c in range(self.dataframe.shape[1]):
+            for r in irows:
+                cell = str(self.dataframe.iat[r, c]).lower()
+                if cell != self.cells[c][r]:
+                    self.splice(c=c, r=r, cell=cell)
+
+    def splice(self, c: int, r: int, cell: str):
+        """
+        Replaces one cell in the buffer, which is a memory copy in C, much faster than joining all cells again
+        """
+        start = self.offsets[c][r]
+        old = self.cells[c][r]
+        self.buffers[c] = self.buffers[c][:start] + cell + self.buffers[c][start + len(old):]
+        self.offsets[c][r + 1:] += len(cell) - len(old)
+        self.cells[c][r] = cell
+
+    def find(
+            self,
+            text: str,
+            start_irow: int,
+            start_icol: int) -> Optional[Tuple[int, int]]:
+        """
+        Same order as scanning row by row, skipping cells with (r <= start_irow and c <= start_icol)
+        """
+        text = text.lower()
+        if self.SEP in text:
+            return None
+
+        best = None  # (irow, icol)
+        for c, (buffer, offsets) in enumerate(zip(self.buffers, self.offsets)):
+            first_irow = start_irow + 1 if c <= start_icol else 0
+            if first_irow >= len(offsets):
+                continue
+
+            # Only rows before the best so far can be better (rows tie -> the smaller column, i.e. the earlier one)
+            last_irow = len(offsets) if best is None else best[0]
+            if first_irow >= last_irow:
+                continue
+            end = len(buffer) if last_irow == len(offsets) else offsets[last_irow]
+
+            pos = buffer.find(text, offsets[first_irow], end)
+            if pos == -1:
+                continue
+
+            irow = int(np.searchsorted(offsets, pos, side='right')) - 1
+            best = (irow, c)
+
+        return best
+
+
+class UndoSnapshot:
+    """
+    A whole data frame, which is replaced by the new data frame
+
+    A new data frame made from the old one (e.g. sort, drop) shares the same str objects,
+        while an import or reprocess makes new ones, so the extra memory of a snapshot is
+        the pointers of all cells plus the objects that are not held by the new data frame
+    """
+
+    dataframe: pd.DataFrame
+    version: int
+    nbytes: int
+
+    def __init__(self, dataframe: pd.DataFrame, version: int, new: pd.DataFrame):
+        self.dataframe = dataframe
+        self.version = version
+        self.nbytes = int(dataframe.memory_usage(index=True, deep=False).sum()) \
+            + get_objects_nbytes(dataframe=dataframe, excluded=new)
+
+
+class UndoRowPatch:
+    """
+    Values of a row (or some cells of it) to be put back, for changes of a single row made in place
+    """
+
+    row: int
+    values: Dict[str, Any]
+    version: int
+    nbytes: int
+
+    def __init__(self, row: int, values: Dict[str, Any], version: int):
+        self.row = row
+        self.values = values
+        self.version = version
+        self.nbytes = sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values.values())
+
+
+def get_objects_nbytes(dataframe: pd.DataFrame, excluded: pd.DataFrame) -> int:
+    """
+    Sizes of the distinct objects (e.g. str) in the object columns of dataframe that are not in excluded,
+        objects are compared by identity, so equal str objects made separately are counted
+    """
+    values = get_object_values(dataframe)
+    ids = get_object_ids(values)
+
+    excluded_ids = np.unique(get_object_ids(get_object_values(excluded)))  # sorted
+    if len(excluded_ids) > 0:
+        pos = np.searchsorted(excluded_ids, ids).clip(max=len(excluded_ids) - 1)
+        is_new = excluded_ids[pos] != ids
+        values, ids = values[is_new], ids[is_new]
+
+    _, first = np.unique(ids, return_index=True)  # each object only once
+    return sum(map(sys.getsizeof, values[first]))
+
+
+def get_object_values(df: pd.DataFrame) -> np.ndarray:
+    arrays = [df.iloc[:, c].to_numpy() for c in range(df.shape[1]) if df.dtypes.iloc[c] == object]
+    return np.concatenate(arrays) if len(arrays) > 0 else np.array([], dtype=object)
+
+
+def get_object_ids(values: np.ndarray) -> np.ndarray:
+    return np.fromiter(map(id, values), dtype=np.uint64, count=len(values))
 
 
 class ImportClinicalDataTable(BaseModel):
@@ -246,13 +461,8 @@ class ImportClinicalDataTable(BaseModel):
 
         id_column = self.clinical_data_df.columns[0]
 
-        for i, row in df.iterrows():
-
-            already_exists = row[id_column] in self.clinical_data_df[id_column].values
-            if already_exists:
-                continue
-
-            self.clinical_data_df = append(self.clinical_data_df, row)
+        is_new = is_new_id(ids=df[id_column], existing_ids=self.clinical_data_df[id_column])
+        self.clinical_data_df = append_rows(self.clinical_data_df, df[is_new])
 
         return self.clinical_data_df
 
@@ -288,20 +498,23 @@ class ImportSequencingTable(BaseModel):
         )
 
     def append_new_rows(self):
-        for i, row in self.seq_df.iterrows():
-
-            sequencing_id = row['ID']
-            already_exists = sequencing_id in self.clinical_data_df[self.SAMPLE_ID].values
-            if already_exists:
-                continue
+        is_new = is_new_id(ids=self.seq_df['ID'], existing_ids=self.clinical_data_df[self.SAMPLE_ID])
+        new_rows = pd.DataFrame({
+            self.SAMPLE_ID: self.seq_df.loc[is_new, 'ID'],
+            self.LAB_ID: self.seq_df.loc[is_new, 'Lab'],
+            self.LAB_SAMPLE_ID: self.seq_df.loc[is_new, 'Lab Sample ID'],
+        })
+        self.clinical_data_df = append_rows(self.clinical_data_df, new_rows)
 
-            new_row = {
-                self.SAMPLE_ID: sequencing_id,
-                self.LAB_ID: row['Lab'],
-                self.LAB_SAMPLE_ID: row['Lab Sample ID'],
-            }
 
-            self.clinical_data_df = append(self.clinical_data_df, new_row)
+def is_new_id(ids: pd.Series, existing_ids: pd.Series) -> pd.Series:
+    """
+    Same as checking each id one by one against the existing ids and the ids accepted before it:
+        the first occurrence of an id wins, and NaN is never equal to anything so NaN ids are always new
+    """
+    is_na = ids.isna()
+    existing = existing_ids[existing_ids.notna()]
+    return is_na | ~(ids.isin(existing) | ids.duplicated(keep='first'))
 
 
 def append(
@@ -311,10 +524,22 @@ def append(
     if type(s) is dict:
         s = pd.Series(s)
 
+    return append_rows(df, pd.DataFrame([s]))
+
+
+def append_rows(
+        df: pd.DataFrame,
+        rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Appends all rows in one concat, appending one by one copies the growing data frame every time, i.e. O(n^2)
+    """
+    if len(rows) == 0:
+        return df
+
     if df.empty:
-        return pd.DataFrame([s])  # no need to concat, just return the Series as a DataFrame
+        return rows.reset_index(drop=True)  # no need to concat, just return the new rows
 
-    return pd.concat([df, pd.DataFrame([s])], ignore_index=True)
+    return pd.concat([df, rows], ignore_index=True)
 
 
 class ReadTable(BaseModel):
@@ -366,6 +591,10 @@ class ExportCbioportalStudy(BaseModel):
     study_info_dict: Dict[str, str]
     tags_dict: Dict[str, str]
     outdir: str
+    workers: int
+    incremental: bool
+    maf_cache_dir: Optional[str]
+    progress: Optional[Callable[[int, int], None]]
 
     def main(
             self,
@@ -373,13 +602,21 @@ class ExportCbioportalStudy(BaseModel):
             maf_dir: str,
             study_info_dict: Dict[str, str],
             tags_dict: Dict[str, str],
-            outdir: str):
+            outdir: str,
+            workers: int = 1,
+            incremental: bool = False,
+            maf_cache_dir: Optional[str] = None,
+            progress: Optional[Callable[[int, int], None]] = None):
 
         self.clinical_data_df = clinical_data_df
         self.maf_dir = maf_dir
         self.study_info_dict = study_info_dict
         self.tags_dict = tags_dict
         self.outdir = outdir
+        self.workers = workers
+        self.incremental = incremental
+        self.maf_cache_dir = maf_cache_dir
+        self.progress = progress
 
         self.make_outdir()
         self.run_cbio_ingest()
@@ -393,18 +630,107 @@ class ExportCbioportalStudy(BaseModel):
             maf_dir=self.maf_dir,
             study_info_dict=self.study_info_dict,
             tags_dict=self.tags_dict,
-            outdir=self.outdir)
+            outdir=self.outdir,
+            workers=self.workers,
+            incremental=self.incremental,
+            maf_cache_dir=self.maf_cache_dir,
+            progress=self.progress)
 
 
 class ProcessSampleAttributes(BaseModel):
 
-    def main(self, attributes: Dict[str, str]) -> Dict[str, Any]:
+    def main(
+            self,
+            attributes: Dict[str, str],
+            changed_keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        changed_keys:
+            Only run the calculations affected by these keys, None for all calculations
+        """
         if self.schema is NycuOsccSchema:
-            attributes = CalculateNycuOscc().main(attributes=attributes)
+            attributes = CalculateNycuOscc().main(attributes=attributes, changed_keys=changed_keys)
         attributes = CastDatatypes(self.schema).main(attributes=attributes)
         return attributes
 
 
+class ProcessCellEdit(BaseModel):
+    """
+    Same as ProcessSampleAttributes on the row with the edited cell, but only the edited cell
+        and the cells calculated from it (see DerivationPlan) are read, processed and returned,
+        so an edit takes the same time no matter how large the table is
+    """
+
+    dataframe: pd.DataFrame
+    row: int
+    column: str
+
+    def main(
+            self,
+            dataframe: pd.DataFrame,
+            row: int,
+            column: str,
+            value: str) -> Dict[str, Any]:
+        """
+        Returns the new values of the cells to be updated in the row, in the order of columns
+        """
+        self.dataframe = dataframe
+        self.row = row
+        self.column = column
+
+        if self.schema is NycuOsccSchema:
+            plan = get_derivation_plan()
+            read_keys = plan.get_input_keys(changed_keys=[column])
+            write_keys = plan.get_affected_keys(changed_keys=[column])
+        else:
+            read_keys, write_keys = set(), set()
+
+        keys = [c for c in self.dataframe.columns if c in read_keys or c in write_keys]
+        attributes = {k: self.get_value(k) for k in keys}  # the same as Model.get_sample()
+        attributes[column] = value  # update the field with new value
+
+        if self.schema is NycuOsccSchema:
+            attributes = CalculateNycuOscc().main(attributes=attributes, changed_keys=[column])
+
+        ret = {k: attributes[k] for k in self.dataframe.columns if k == column or k in write_keys}
+        return CastDatatypes(self.schema).main(attributes=ret)
+
+    def get_value(self, key: str) -> str:
+        val = self.dataframe.at[self.row, key]
+        return '' if pd.isna(val) else str(val)
+
+
+class ReprocessTable(BaseModel):
+    """
+    Same as ProcessSampleAttributes on every row (i.e. get_sample -> process -> put back),
+        but one column at a time, all columns of the returned data frame are object
+    """
+
+    df: pd.DataFrame
+
+    def main(
+            self,
+            df: pd.DataFrame,
+            progress: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        """
+        progress:
+            Called as progress(done, total) after every column is cast, None for no reporting
+        """
+        self.df = df
+
+        self.stringify()
+        if self.schema is NycuOsccSchema:
+            self.df = BatchCalculateNycuOscc().main(df=self.df)
+        self.df = BatchCastDatatypes(self.schema).main(df=self.df, progress=progress)
+
+        return self.df[df.columns]  # drop new columns of calculations, the same as df.loc[row] = attributes
+
+    def stringify(self):
+        # Everything going into ProcessSampleAttributes is str, the same as get_sample()
+        self.df = pd.DataFrame(
+            {c: str_series(self.df[c]) for c in self.df.columns},
+            index=self.df.index)
+
+
 class CastDatatypes(BaseModel):
 
     def main(self, attributes: Dict[str, Any]) -> Dict[str, Any]:
@@ -412,23 +738,191 @@ class CastDatatypes(BaseModel):
         ret: Dict[str, Any] = attributes.copy()
 
         for key, val in ret.items():
+            ret[key] = self.cast(key=key, val=val)
+
+        return ret
+
+    def cast(self, key: str, val: Any) -> Any:
+        if val == '':
+            return pd.NA
+        elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'int':
+            return int(val)
+        elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'float':
+            return float(val)
+        elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'date':
+            return format_date(val)  # format it as str
+        elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'date_list':
+            return format_date_list(val)
+        elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'bool':
+            return True if val.upper() == 'TRUE' else False
+        else:  # assume other types are all str
+            return val
+
+
+class BatchCastDatatypes(BaseModel):
+    """
+    Same as CastDatatypes on every row, but cast one group of columns of the same type at a time,
+        where each unique value of a column is cast only once, most of them in vectorized calls
+
+    Values that fail to cast do not stop the casting, every failed cell is collected in self.errors
+        as (row, column, value, error), and reported all together at the end
+    """
+
+    CAST_TYPES = ['int', 'float', 'date', 'date_list', 'bool']
+    MAX_ERRORS_SHOWN = 20
 
-            if val == '':
-                ret[key] = pd.NA
-            elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'int':
-                ret[key] = int(val)
-            elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'float':
-                ret[key] = float(val)
-            elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'date':
-                ret[key] = pd.to_datetime(val).strftime('%Y-%m-%d')  # format it as str
-            elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'date_list':
-                ret[key] = format_date_list(val)
-            elif self.schema.COLUMN_ATTRIBUTES[key]['type'] == 'bool':
-                ret[key] = True if val.upper() == 'TRUE' else False
-            # assume other types are all str
+    df: pd.DataFrame
+    errors: List[Tuple[int, str, Any, str]]
+
+    def main(
+            self,
+            df: pd.DataFrame,
+            progress: Optional[Callable[[int, int], None]] = None) -> pd.DataFrame:
+        self.df = df.copy()
+        self.errors = []
+
+        done = 0
+        for type_, keys in self.group_columns_by_type().items():
+            for key in keys:
+                self.df[key] = self.cast_column(key=key, type_=type_)
+                done += 1
+                if progress is not None:
+                    progress(done, len(self.df.columns))
+
+        self.assert_no_errors()
+        return self.df
 
+    def group_columns_by_type(self) -> Dict[str, List[str]]:
+        ret = {}
+        for key in self.df.columns:
+            type_ = self.schema.COLUMN_ATTRIBUTES[key]['type']
+            ret.setdefault(type_, []).append(key)
         return ret
 
+    def cast_column(self, key: str, type_: str) -> pd.Series:
+        if type_ not in self.CAST_TYPES:  # str, only '' -> NA
+            series = self.df[key].astype(object)
+            return series.where(series != '', pd.NA)
+
+        codes, uniques = pd.factorize(self.df[key], use_na_sentinel=False)
+        s = pd.Series(np.asarray(uniques, dtype=object), dtype=object)
+
+        casted = np.empty(len(s), dtype=object)
+        errors = np.full(len(s), None, dtype=object)
+
+        is_empty = (s == '').to_numpy(dtype=bool)
+        casted[is_empty] = pd.NA
+        todo = ~is_empty
+
+        if type_ in ['int', 'float']:
+            # numpy casts object arrays by calling int() or float() on each value in C,
+            #   the values are the same as the scalar cast, tolist() gives Python int or float
+            dtype = np.int64 if type_ == 'int' else np.float64
+            try:
+                casted[todo] = s[todo].to_numpy().astype(dtype).tolist()
+                todo[:] = False
+            except (ValueError, TypeError, OverflowError):
+                pass  # cast one by one below, to collect the error of each value
+        else:
+            is_str = get_is_str(s) & ~is_empty
+            if type_ == 'bool':
+                casted[is_str] = (s[is_str].str.upper() == 'TRUE').tolist()
+            elif type_ == 'date':
+                casted[is_str], errors[is_str] = format_dates(s[is_str])
+            elif type_ == 'date_list':
+                casted[is_str], errors[is_str] = format_date_lists(s[is_str])
+            todo &= ~is_str
+
+        caster = CastDatatypes(self.schema)
+        for i in np.flatnonzero(todo):
+            try:
+                casted[i] = caster.cast(key=key, val=s[i])
+            except Exception as e:
+                errors[i] = repr(e)
+
+        self.collect_errors(key=key, codes=codes, uniques=s, errors=errors)
+
+        return pd.Series(casted[codes], index=self.df.index, dtype=object)
+
+    def collect_errors(
+            self,
+            key: str,
+            codes: np.ndarray,
+            uniques: pd.Series,
+            errors: np.ndarray):
+
+        failed = np.not_equal(errors, None)
+        if not failed.any():
+            return
+        for row in np.flatnonzero(failed[codes]):
+            i = codes[row]
+            self.errors.append((int(row), key, uniques[i], errors[i]))
+
+    def assert_no_errors(self):
+        if len(self.errors) == 0:
+            return
+        self.errors.sort(key=lambda e: (e[0], self.df.columns.get_loc(e[1])))  # in the order of the table
+        lines = [
+            f'Row {row + 1}, "{key}": {value!r} {error}'  # 1-based rows, as shown in the table
+            for row, key, value, error in self.errors[:self.MAX_ERRORS_SHOWN]
+        ]
+        if len(self.errors) > self.MAX_ERRORS_SHOWN:
+            lines.append(f'... and {len(self.errors) - self.MAX_ERRORS_SHOWN} more')
+        msg = '\n'.join(lines)
+        assert False, f'Failed to cast {len(self.errors)} cells:\n{msg}'
+
+
+def format_dates(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as format_date(val) on every str value,
+        'YYYY-MM-DD' is parsed in one vectorized call, the result is the same as the scalar format_date()
+
+    Returns the formatted values and the errors (None for no error), both object arrays in the order of values
+    """
+    casted = np.empty(len(values), dtype=object)
+    errors = np.full(len(values), None, dtype=object)
+
+    is_iso = values.str.fullmatch(ISO_DATE_PATTERN).fillna(False).to_numpy(dtype=bool)
+    parsed = pd.to_datetime(values[is_iso], format='%Y-%m-%d', errors='coerce')
+    is_iso[is_iso] = parsed.notna().to_numpy()  # invalid dates, e.g. '2020-13-01', fall back to get the error
+    casted[is_iso] = parsed.dropna().dt.strftime('%Y-%m-%d')
+
+    for i in np.flatnonzero(~is_iso):
+        try:
+            casted[i] = format_date(values.iloc[i])
+        except Exception as e:
+            errors[i] = repr(e)
+
+    return casted, errors
+
+
+def format_date_lists(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Same as format_date_list on every str value, but each unique date is parsed only once by format_dates
+
+    Returns the formatted values and the errors (None for no error), both object arrays in the order of values
+    """
+    sep = ';'
+    values = values.reset_index(drop=True)
+
+    parts = values.str.split(sep).explode().str.strip()  # index is the position in values
+    parts = parts[parts != '']
+
+    codes, uniques = pd.factorize(parts)
+    dates, date_errors = format_dates(pd.Series(uniques, dtype=object))
+    dates = pd.Series(dates[codes], index=parts.index, dtype=object).fillna('')  # failed dates are reported below
+    part_errors = pd.Series(date_errors[codes], index=parts.index, dtype=object).dropna()
+
+    joined = dates.groupby(level=0, sort=False).agg(f' {sep} '.join)
+    casted = joined.reindex(range(len(values)), fill_value='').to_numpy(dtype=object)  # no date at all -> ''
+
+    errors = np.full(len(values), None, dtype=object)
+    first_errors = part_errors.groupby(level=0, sort=False).first()
+    errors[first_errors.index.to_numpy()] = first_errors.to_numpy()
+    casted[first_errors.index.to_numpy()] = None
+
+    return casted, errors
+
 
 def format_date_list(val: str) -> str:
     """
@@ -439,5 +933,5 @@ def format_date_list(val: str) -> str:
     for x in val.split(sep):
         xx = x.strip()
         if not xx == '':
-            dates.append(pd.to_datetime(xx).strftime('%Y-%m-%d'))
+            dates.append(format_date(xx))
     return f' {sep} '.join(dates)
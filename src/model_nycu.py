@@ -2,10 +2,13 @@
 This module is statically coupled with NycuOsccSchema
 Thus there is no need to dynamically pass in the self.schema object
 """
+import re
 import numpy as np
 import pandas as pd
-from typing import Dict, Any, Union, List, Tuple, Type
+from functools import lru_cache
+from typing import Dict, Any, Union, List, Tuple, Type, Set, FrozenSet, Iterable, Optional
 from .schema import NycuOsccSchema
+from .date_parser import parse_date, ISO_DATE_PATTERN
 
 
 S = NycuOsccSchema
@@ -13,25 +16,134 @@ S = NycuOsccSchema
 
 class CalculateNycuOscc:
 
-    def main(self, attributes: Dict[str, str]) -> Dict[str, Any]:
+    def main(
+            self,
+            attributes: Dict[str, str],
+            changed_keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        changed_keys:
+            Only run the calculations affected by these keys, None for all calculations
+        """
+        return get_derivation_plan().main(attributes=attributes, changed_keys=changed_keys)
 
-        attributes = CalculateDiagnosisAge().main(attributes)
-        attributes = CalculateSurvival().main(attributes)
-        attributes = CalculateICD().main(attributes)
-        attributes = CalculateLymphNodes().main(attributes)
-        attributes = CalculateStage().main(attributes)
-        attributes = CalculateTherapy().main(attributes)
 
+class DerivationPlan:
+    """
+    Dependency graph of calculations, built once from their INPUT_KEYS and OUTPUT_KEYS
+
+    A calculation is affected by a changed key if it reads or writes the key (a written key is recalculated),
+        and its output keys are then changed keys of the calculations after it
+    """
+
+    calculates: List[Type['Calculate']]
+    key_sets: List[Set[str]]  # keys read or written by each calculation
+
+    def __init__(self, calculates: List[Type['Calculate']]):
+        self.calculates = calculates
+        self.key_sets = [set(c.INPUT_KEYS) | set(c.OUTPUT_KEYS) for c in calculates]
+        self.get_calculates = lru_cache(maxsize=None)(self.__get_calculates)
+
+    def main(
+            self,
+            attributes: Dict[str, Any],
+            changed_keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Runs the affected calculations in order on one copy of attributes, None changed_keys for all calculations
+        """
+        if changed_keys is None:
+            calculates = self.calculates
+        else:
+            calculates = self.get_calculates(frozenset(changed_keys))
+
+        attributes = attributes.copy()
+        for calculate in calculates:
+            calculate().update(attributes=attributes)
         return attributes
 
+    def get_affected_keys(self, changed_keys: Iterable[str]) -> Set[str]:
+        """
+        All keys that may be written by the calculations affected by changed_keys
+        """
+        ret = set()
+        for calculate in self.get_calculates(frozenset(changed_keys)):
+            ret.update(calculate.OUTPUT_KEYS)
+        return ret
+
+    def get_input_keys(self, changed_keys: Iterable[str]) -> Set[str]:
+        """
+        All keys that may be read by the calculations affected by changed_keys
+        """
+        ret = set()
+        for calculate in self.get_calculates(frozenset(changed_keys)):
+            ret.update(calculate.INPUT_KEYS)
+        return ret
+
+    def __get_calculates(self, changed_keys: FrozenSet[str]) -> Tuple[Type['Calculate'], ...]:
+        changed = set(changed_keys)
+        ret = []
+        for calculate, keys in zip(self.calculates, self.key_sets):
+            if changed.isdisjoint(keys):
+                continue
+            ret.append(calculate)
+            changed.update(calculate.OUTPUT_KEYS)
+        return tuple(ret)
+
+
+@lru_cache(maxsize=None)
+def get_derivation_plan() -> DerivationPlan:
+    """
+    Built once, in the order of calculations of NYCU OSCC
+    """
+    return DerivationPlan(calculates=[
+        CalculateDiagnosisAge,
+        CalculateSurvival,
+        CalculateICD,
+        CalculateLymphNodes,
+        CalculateStage,
+        CalculateTherapy,
+    ])
+
+
+class BatchCalculateNycuOscc:
+    """
+    Same as CalculateNycuOscc but for all rows of a data frame at once
+    """
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+
+        df = BatchCalculateDiagnosisAge().main(df)
+        df = BatchCalculateSurvival().main(df)
+        df = BatchCalculate(CalculateICD).main(df)
+        df = BatchCalculateLymphNodes().main(df)
+        df = self.calculate_stage(df)
+        df = BatchCalculateTherapy().main(df)
+
+        return df
+
+    def calculate_stage(self, df: pd.DataFrame) -> pd.DataFrame:
+        stager = BatchCalculateStage()
+        df = stager.main(df)
+        if len(stager.invalid_rows) > 0:
+            values = sorted(set(tnm for _, tnm in stager.invalid_rows))
+            print(f'WARNING! Invalid "{S.PATHOLOGICAL_TNM}" in {len(stager.invalid_rows)} rows for finding AJCC stage: {values}', flush=True)
+        return df
+
 
 class Calculate:
 
     REQUIRED_KEYS: List[str]
+    INPUT_KEYS: List[str]  # all keys read by calculate(), used by BatchCalculate to find unique inputs
+    OUTPUT_KEYS: List[str]  # all keys that calculate() may write
     attributes: Dict[str, Any]
 
     def main(self, attributes: Dict[str, Any]) -> Dict[str, Any]:
-        self.attributes = attributes.copy()
+        return self.update(attributes=attributes.copy())
+
+    def update(self, attributes: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Same as main() but calculates in place, i.e. the given attributes are modified and returned
+        """
+        self.attributes = attributes
 
         if not self.has_required_keys():
             return self.attributes
@@ -56,6 +168,10 @@ class CalculateDiagnosisAge(Calculate):
         S.BIRTH_DATE,
         S.CLINICAL_DIAGNOSIS_DATE,
     ]
+    INPUT_KEYS = REQUIRED_KEYS
+    OUTPUT_KEYS = [
+        S.CLINICAL_DIAGNOSIS_AGE,
+    ]
 
     def calculate(self):
         self.attributes[S.CLINICAL_DIAGNOSIS_AGE] = delta_t(
@@ -63,6 +179,26 @@ class CalculateDiagnosisAge(Calculate):
             end=self.attributes[S.CLINICAL_DIAGNOSIS_DATE]) / pd.Timedelta(days=365)
 
 
+class BatchCalculateDiagnosisAge:
+
+    REQUIRED_KEYS = CalculateDiagnosisAge.REQUIRED_KEYS
+
+    df: pd.DataFrame
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+
+        if not all(key in self.df.columns for key in self.REQUIRED_KEYS):
+            return self.df
+
+        birth_date = to_datetime_series(str_series(self.df[S.BIRTH_DATE]))
+        clinical_diagnosis_date = to_datetime_series(str_series(self.df[S.CLINICAL_DIAGNOSIS_DATE]))
+        age = (clinical_diagnosis_date - birth_date) / pd.Timedelta(days=365)  # NaN if any date is missing
+        self.df[S.CLINICAL_DIAGNOSIS_AGE] = age.astype(object)
+
+        return self.df
+
+
 class CalculateSurvival(Calculate):
 
     REQUIRED_KEYS = [
@@ -73,6 +209,15 @@ class CalculateSurvival(Calculate):
         S.EXPIRE_DATE,
         S.CAUSE_OF_DEATH,
     ]
+    INPUT_KEYS = REQUIRED_KEYS
+    OUTPUT_KEYS = [
+        S.DISEASE_FREE_SURVIVAL_MONTHS,
+        S.DISEASE_FREE_SURVIVAL_STATUS,
+        S.DISEASE_SPECIFIC_SURVIVAL_MONTHS,
+        S.DISEASE_SPECIFIC_SURVIVAL_STATUS,
+        S.OVERALL_SURVIVAL_MONTHS,
+        S.OVERALL_SURVIVAL_STATUS,
+    ]
 
     t0: Union[str, float]  # np.NAN is float
     alive: bool
@@ -174,18 +319,262 @@ def delta_t(
         end: Union[pd.Timestamp, str, type(np.NAN)]) -> pd.Timedelta:
 
     if type(start) is str:
-        start = pd.to_datetime(start)
+        start = parse_date(start)
     elif pd.isna(start):
         start = pd.NaT
 
     if type(end) is str:
-        end = pd.to_datetime(end)
+        end = parse_date(end)
     elif pd.isna(end):
         end = pd.NaT
 
     return end - start
 
 
+class BatchCalculateSurvival:
+    """
+    Same as CalculateSurvival but for all rows of a data frame at once, with vectorized datetime arithmetic
+    Values are taken as strings in the same way as Model.get_sample(), i.e. NaN -> '' and str(value)
+    """
+
+    REQUIRED_KEYS = CalculateSurvival.REQUIRED_KEYS
+
+    df: pd.DataFrame
+    t0: pd.Series
+    alive: pd.Series
+    cancer_death: pd.Series
+    end: pd.Series  # last follow-up date if alive, otherwise expire date
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+
+        if not all(key in self.df.columns for key in self.REQUIRED_KEYS):
+            return self.df
+
+        self.set_t0()
+        self.set_alive()
+        self.check_cause_of_death()
+        self.set_end()
+        self.disease_free_survival()
+        self.disease_specific_survival()
+        self.overall_survival()
+
+        return self.df
+
+    def set_t0(self):
+        surgical_excision_date = str_series(self.df[S.SURGICAL_EXCISION_DATE])
+        initial_treatment_completion_date = str_series(self.df[S.INITIAL_TREATMENT_COMPLETION_DATE])
+        t0 = surgical_excision_date.where(surgical_excision_date != '', initial_treatment_completion_date)
+        self.t0 = to_datetime_series(t0)
+
+    def set_alive(self):
+        self.alive = str_series(self.df[S.EXPIRE_DATE]) == ''
+
+    def check_cause_of_death(self):
+        cause = str_series(self.df[S.CAUSE_OF_DEATH])
+        invalid = ~self.alive & ~cause.isin(S.COLUMN_ATTRIBUTES[S.CAUSE_OF_DEATH]['options'])
+        assert not invalid.any(), f'"{cause[invalid].iloc[0]}" is not a valid cause of death'
+        self.cancer_death = ~self.alive & (cause.str.upper() == 'CANCER')
+
+    def set_end(self):
+        # Only parse the date that the per-row path would parse, so that an unused invalid date does not raise
+        last_follow_up_date = str_series(self.df[S.LAST_FOLLOW_UP_DATE]).where(self.alive, '')
+        expire_date = str_series(self.df[S.EXPIRE_DATE])
+        self.end = to_datetime_series(last_follow_up_date.where(self.alive, expire_date))
+
+    def disease_free_survival(self):
+        recur_date = str_series(self.df[S.RECUR_DATE_AFTER_INITIAL_TREATMENT])
+        recurred = recur_date != ''
+
+        end = to_datetime_series(recur_date).where(recurred, self.end)
+        status = np.where(
+            recurred | self.cancer_death, '1:Recurred/Progressed', '0:DiseaseFree')
+
+        self.set_duration_and_status(
+            end=end,
+            status=status,
+            duration_key=S.DISEASE_FREE_SURVIVAL_MONTHS,
+            status_key=S.DISEASE_FREE_SURVIVAL_STATUS)
+
+    def disease_specific_survival(self):
+        status = np.where(
+            self.cancer_death, '1:DEAD WITH TUMOR', '0:ALIVE OR DEAD TUMOR FREE')
+
+        self.set_duration_and_status(
+            end=self.end,
+            status=status,
+            duration_key=S.DISEASE_SPECIFIC_SURVIVAL_MONTHS,
+            status_key=S.DISEASE_SPECIFIC_SURVIVAL_STATUS)
+
+    def overall_survival(self):
+        status = np.where(self.alive, '0:LIVING', '1:DECEASED')
+
+        self.set_duration_and_status(
+            end=self.end,
+            status=status,
+            duration_key=S.OVERALL_SURVIVAL_MONTHS,
+            status_key=S.OVERALL_SURVIVAL_STATUS)
+
+    def set_duration_and_status(
+            self,
+            end: pd.Series,
+            status: np.ndarray,
+            duration_key: str,
+            status_key: str):
+
+        duration = (end - self.t0) / pd.Timedelta(days=30)  # timedelta64 -> float64
+        invalid = duration.isna() | (duration < 0.)
+
+        self.df[duration_key] = duration.astype(object).where(~invalid, '')
+        self.df[status_key] = pd.Series(status, index=self.df.index, dtype=object).where(~invalid, '')
+
+
+class BatchCalculate:
+    """
+    Runs a per-row Calculate once for each unique combination of its input values,
+        which is fast as long as the inputs have a few unique combinations (e.g. anatomic site, pTNM)
+    """
+
+    calculate: Type[Calculate]
+    df: pd.DataFrame
+
+    def __init__(self, calculate: Type[Calculate]):
+        self.calculate = calculate
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+
+        input_keys = [k for k in self.calculate.INPUT_KEYS if k in self.df.columns]
+        if len(input_keys) == 0:
+            uniques = [()]
+            codes = np.zeros(len(self.df), dtype=int)
+        else:
+            codes = factorize_rows(df=self.df[input_keys])
+            _, first_rows = np.unique(codes, return_index=True)  # codes are in the order of first appearance
+            uniques = list(self.df[input_keys].iloc[first_rows].itertuples(index=False, name=None))
+
+        results = [
+            self.calculate().main(attributes=dict(zip(input_keys, values))) for values in uniques
+        ]
+
+        for key in self.calculate.OUTPUT_KEYS:
+            written = np.array([key in r for r in results], dtype=bool)
+            if not written.any():
+                continue  # e.g. lacking required keys
+
+            values = np.array([r.get(key) for r in results], dtype=object)[codes]
+            if not written.all():  # keep the original value where it is not written
+                original = self.df[key] if key in self.df.columns else pd.Series('', index=self.df.index)
+                values = np.where(written[codes], values, original.to_numpy(dtype=object))
+            self.df[key] = pd.Series(values, index=self.df.index, dtype=object)
+
+        return self.df
+
+
+def factorize_rows(df: pd.DataFrame) -> np.ndarray:
+    """
+    Codes of unique rows of df, numbered in the order of first appearance
+    Columns are factorized one by one and combined, which is much faster than grouping by many object columns
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    for c in df.columns:
+        column_codes, uniques = pd.factorize(df[c], use_na_sentinel=False)
+        codes, _ = pd.factorize(codes * len(uniques) + column_codes)  # re-factorize to keep codes < len(df)
+    return codes
+
+
+def str_series(series: pd.Series) -> pd.Series:
+    """
+    NaN -> '' and str(value), the same as Model.get_sample()
+    """
+    if pd.api.types.infer_dtype(series, skipna=True) in ['string', 'empty']:
+        return series.fillna('').astype(object)  # already str, no need to call str() on every value
+    return series.astype(object).where(series.notna(), '').astype(str)
+
+
+def get_is_str(values: pd.Series) -> np.ndarray:
+    if pd.api.types.infer_dtype(values, skipna=False) in ['string', 'empty']:
+        return np.ones(len(values), dtype=bool)  # the common case, no per-value type check
+    return values.map(type).eq(str).to_numpy(dtype=bool)
+
+
+def to_datetime_series(series: pd.Series) -> pd.Series:
+    """
+    Each unique str is parsed once, '' -> NaT
+    'YYYY-MM-DD' is parsed in one vectorized call, other str with the same parse_date() as delta_t(),
+        so that the parsed dates are identical to the per-row path
+    """
+    uniques = pd.Series(series.unique(), dtype=object)
+    is_iso = uniques.str.fullmatch(ISO_DATE_PATTERN)
+
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    parsed[is_iso] = pd.to_datetime(uniques[is_iso], format='%Y-%m-%d', errors='coerce')
+    is_iso &= parsed.notna()  # invalid dates, e.g. '2020-02-30', raise the same error as the scalar path below
+    for i in uniques.index[~is_iso]:
+        parsed[i] = parse_date(uniques[i])
+
+    return series.map(dict(zip(uniques, parsed))).astype('datetime64[ns]')
+
+
+class AnatomicSiteIndex:
+    """
+    Same answers as find_best_matching_key_val(dict_, key), built once per dictionary:
+        an exact map, a lower-case map (first key wins, as in the linear pass),
+        and an inverted index of lower-case words -> keys, with the number of words of each key
+
+    Only keys sharing at least one word with the site can update the best match of the fuzzy pass,
+        so they are scanned in the dictionary order with the same rule, instead of every key
+    """
+
+    MEMO_SIZE = 4096
+
+    items: List[Tuple[str, Any]]
+    exact: Dict[str, Any]
+    lower_to_id: Dict[str, int]
+    word_to_ids: Dict[str, List[int]]
+    n_words: List[int]
+
+    def __init__(self, dict_: Dict[str, Any]):
+        self.items = list(dict_.items())
+        self.exact = dict(dict_)
+
+        self.lower_to_id = {}
+        self.word_to_ids = {}
+        self.n_words = []
+        for i, (k, _) in enumerate(self.items):
+            self.lower_to_id.setdefault(k.lower(), i)
+            words = set(w.lower() for w in k.split(' '))
+            for w in words:
+                self.word_to_ids.setdefault(w, []).append(i)
+            self.n_words.append(len(words))
+
+        self.find = lru_cache(maxsize=self.MEMO_SIZE)(self.__find)  # memo of resolved site strings
+
+    def __find(self, key: str) -> Tuple[str, Any]:
+        if key in self.exact:  # need to match case
+            return key, self.exact[key]
+
+        i = self.lower_to_id.get(key.lower())  # no need to match case
+        if i is not None:
+            return self.items[i]
+
+        matched = {}
+        for w in set(w.lower() for w in key.split(' ')):
+            for i in self.word_to_ids.get(w, []):
+                matched[i] = matched.get(i, 0) + 1
+
+        ret = '', ''
+        max_matched, max_fraction = 0, 0.0
+        for i in sorted(matched):  # in the dictionary order
+            fraction = matched[i] / self.n_words[i]
+            if matched[i] >= max_matched:  # the number of matched words can be just as many as before
+                if fraction > max_fraction:  # if it has greater fraction, it is still better
+                    ret = self.items[i]
+                    max_matched, max_fraction = matched[i], fraction
+
+        return ret
+
+
 class CalculateICD(Calculate):
 
     # https://training.seer.cancer.gov/head-neck/abstract-code-stage/codes.html (2023 edition)
@@ -360,17 +749,25 @@ class CalculateICD(Calculate):
         'Right Buccal Mucosa': 'C06.0',
     }
 
+    ICD_O_3_SITE_CODE_INDEX = AnatomicSiteIndex(ANATOMIC_SITE_TO_ICD_O_3_SITE_CODE)
+    ICD_10_CLASSIFICATION_INDEX = AnatomicSiteIndex(ANATOMIC_SITE_TO_ICD_10_CLASSIFICATION)
+
     REQUIRED_KEYS = [
         S.TUMOR_DISEASE_ANATOMIC_SITE,
     ]
+    INPUT_KEYS = REQUIRED_KEYS
+    OUTPUT_KEYS = [
+        S.ICD_O_3_SITE_CODE,
+        S.ICD_10_CLASSIFICATION,
+    ]
 
     def calculate(self):
         site = self.attributes[S.TUMOR_DISEASE_ANATOMIC_SITE]
 
-        _, icd_o_3 = find_best_matching_key_val(dict_=self.ANATOMIC_SITE_TO_ICD_O_3_SITE_CODE, key=site)
+        _, icd_o_3 = self.ICD_O_3_SITE_CODE_INDEX.find(site)
         self.attributes[S.ICD_O_3_SITE_CODE] = icd_o_3
 
-        _, icd_10 = find_best_matching_key_val(dict_=self.ANATOMIC_SITE_TO_ICD_10_CLASSIFICATION, key=site)
+        _, icd_10 = self.ICD_10_CLASSIFICATION_INDEX.find(site)
         self.attributes[S.ICD_10_CLASSIFICATION] = icd_10
 
 
@@ -408,6 +805,10 @@ class CalculateStage(Calculate):
     REQUIRED_KEYS = [
         S.PATHOLOGICAL_TNM,
     ]
+    INPUT_KEYS = REQUIRED_KEYS
+    OUTPUT_KEYS = [
+        S.NEOPLASM_DISEASE_STAGE_AMERICAN_JOINT_COMMITTEE_ON_CANCER_CODE,
+    ]
 
     t: str
     n: str
@@ -429,37 +830,130 @@ class CalculateStage(Calculate):
             self.t, self.n, self.m = '', '', ''
 
     def calculate_stage(self):
-        t, n, m = self.t, self.n, self.m
-        if m == '1':
-            stage = 'Stage IVC'
-        elif t == '4b' and m == '0':
-            stage = 'Stage IVB'
-        elif n in ['3', '3a', '3b'] and m == '0':
-            stage = 'Stage IVB'
-        elif t in ['1', '2', '3', '4a'] and n in ['2', '2a', '2b', '2c'] and m == '0':
-            stage = 'Stage IVA'
-        elif t == '4a' and n in ['0', '1'] and m == '0':
-            stage = 'Stage IVA'
-        elif t in ['1', '2', '3'] and n == '1' and m == '0':
-            stage = 'Stage III'
-        elif t == '3' and n == '0' and m == '0':
-            stage = 'Stage III'
-        elif t == '2' and n == '0' and m == '0':
-            stage = 'Stage II'
-        elif t == '1' and n == '0' and m == '0':
-            stage = 'Stage I'
-        elif t == 'is' and n == '0' and m == '0':
-            stage = 'Stage 0'
-        else:
+        stage = get_ajcc_stage(t=self.t, n=self.n, m=self.m)
+        if stage == '':
             print(f'WARNING! Invalid "{S.PATHOLOGICAL_TNM}": "{self.attributes[S.PATHOLOGICAL_TNM]}" for finding AJCC stage')
-            stage = ''
 
         self.attributes[S.NEOPLASM_DISEASE_STAGE_AMERICAN_JOINT_COMMITTEE_ON_CANCER_CODE] = stage
 
 
+def get_ajcc_stage(t: str, n: str, m: str) -> str:
+    """
+    '' for invalid T, N, M
+    """
+    if m == '1':
+        return 'Stage IVC'
+    elif t == '4b' and m == '0':
+        return 'Stage IVB'
+    elif n in ['3', '3a', '3b'] and m == '0':
+        return 'Stage IVB'
+    elif t in ['1', '2', '3', '4a'] and n in ['2', '2a', '2b', '2c'] and m == '0':
+        return 'Stage IVA'
+    elif t == '4a' and n in ['0', '1'] and m == '0':
+        return 'Stage IVA'
+    elif t in ['1', '2', '3'] and n == '1' and m == '0':
+        return 'Stage III'
+    elif t == '3' and n == '0' and m == '0':
+        return 'Stage III'
+    elif t == '2' and n == '0' and m == '0':
+        return 'Stage II'
+    elif t == '1' and n == '0' and m == '0':
+        return 'Stage I'
+    elif t == 'is' and n == '0' and m == '0':
+        return 'Stage 0'
+    else:
+        return ''
+
+
+def get_ajcc_stage_table(t_values: List[str], n_values: List[str], m_values: List[str]) -> np.ndarray:
+    table = np.empty((len(t_values), len(n_values), len(m_values)), dtype=object)
+    for i, t in enumerate(t_values):
+        for j, n in enumerate(n_values):
+            for k, m in enumerate(m_values):
+                table[i, j, k] = get_ajcc_stage(t=t, n=n, m=m)
+    return table
+
+
+class BatchCalculateStage:
+    """
+    Same as CalculateStage, but the pTNM column is parsed by one regex and the stages are looked up from STAGE_TABLE,
+        rows of invalid non-empty pTNM are collected in self.invalid_rows as (row, pTNM) instead of printed
+    """
+
+    REQUIRED_KEYS = CalculateStage.REQUIRED_KEYS
+
+    # The same as CalculateStage.set_tnm() after 'X' -> '0':
+    #   T is from the first 'T' to the next 'T' or 'N', i.e. tnm.split('T')[1].split('N')[0]
+    #   N is from the first 'N' to the next 'N' or 'M', i.e. tnm.split('N')[1].split('M')[0]
+    #   M is from the first 'M' to the next 'M', i.e. tnm.split('M')[1]
+    # Lookaheads so that each is found independently, no match if any letter is missing (IndexError)
+    TNM_PATTERN = re.compile(r'^(?=[^T]*T(?P<t>[^TN]*))(?=[^N]*N(?P<n>[^NM]*))(?=[^M]*M(?P<m>[^M]*))')
+
+    # get_ajcc_stage() only compares with these values, any other value gives the same stage as OTHER
+    T_VALUES = ['is', '1', '2', '3', '4a', '4b']
+    N_VALUES = ['0', '1', '2', '2a', '2b', '2c', '3', '3a', '3b']
+    M_VALUES = ['0', '1']
+    OTHER = ''
+
+    # STAGE_TABLE[t, n, m], the last index of each axis is OTHER
+    STAGE_TABLE = get_ajcc_stage_table(
+        t_values=T_VALUES + [OTHER],
+        n_values=N_VALUES + [OTHER],
+        m_values=M_VALUES + [OTHER])
+
+    df: pd.DataFrame
+    invalid_rows: List[Tuple[int, str]]
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+        self.invalid_rows = []
+
+        if not all(key in self.df.columns for key in self.REQUIRED_KEYS):
+            return self.df
+
+        codes, uniques = pd.factorize(str_series(self.df[S.PATHOLOGICAL_TNM]))
+        uniques = pd.Series(uniques, dtype=object)
+
+        tnm = uniques.str.replace('[Xx]', '0', regex=True).str.extract(self.TNM_PATTERN).fillna(self.OTHER)
+        stages = self.STAGE_TABLE[
+            self.lookup_codes(tnm['t'], self.T_VALUES),
+            self.lookup_codes(tnm['n'], self.N_VALUES),
+            self.lookup_codes(tnm['m'], self.M_VALUES),
+        ]
+
+        key = S.NEOPLASM_DISEASE_STAGE_AMERICAN_JOINT_COMMITTEE_ON_CANCER_CODE
+        self.df[key] = pd.Series(stages[codes], index=self.df.index, dtype=object)
+
+        invalid = (stages == '') & (uniques != '').to_numpy()
+        for row in np.flatnonzero(invalid[codes]):
+            self.invalid_rows.append((int(row), uniques[codes[row]]))
+
+        return self.df
+
+    def lookup_codes(self, values: pd.Series, known: List[str]) -> np.ndarray:
+        codes = pd.Categorical(values, categories=known).codes  # -1 for other values
+        return np.where(codes == -1, len(known), codes)
+
+
 class CalculateLymphNodes(Calculate):
 
     REQUIRED_KEYS = []  # all lymph node records are optional
+    INPUT_KEYS = [
+        S.LYMPH_NODE_LEVEL_I,
+        S.LYMPH_NODE_LEVEL_IA,
+        S.LYMPH_NODE_LEVEL_IB,
+        S.LYMPH_NODE_LEVEL_II,
+        S.LYMPH_NODE_LEVEL_IIA,
+        S.LYMPH_NODE_LEVEL_IIB,
+        S.TOTAL_LYMPH_NODE,
+        S.LYMPH_NODE_RIGHT,
+        S.LYMPH_NODE_LEFT,
+    ]
+    OUTPUT_KEYS = [
+        S.LYMPH_NODE_LEVEL_I,
+        S.LYMPH_NODE_LEVEL_II,
+        S.TOTAL_LYMPH_NODE,
+    ]
 
     def calculate(self):
         self.add_level_1a_1b()
@@ -537,6 +1031,88 @@ class CalculateLymphNodes(Calculate):
         self.attributes[S.TOTAL_LYMPH_NODE] = f'{total_m}/{total_n}'
 
 
+class BatchCalculateLymphNodes:
+    """
+    Same as CalculateLymphNodes, but the unique 'm/n' values of each column are parsed at once into integer arrays,
+        and the two records of each level are added up with array math
+
+    Values that are not plain 'm/n' (e.g. ' 3 / 10', '+3/10') fall back to split_lymph_node() one by one,
+        which accepts or rejects them the same as CalculateLymphNodes
+    """
+
+    # (summed key, the two keys added up), the summed key is only calculated if it is empty
+    SUM_KEYS = [
+        (S.LYMPH_NODE_LEVEL_I, S.LYMPH_NODE_LEVEL_IA, S.LYMPH_NODE_LEVEL_IB),
+        (S.LYMPH_NODE_LEVEL_II, S.LYMPH_NODE_LEVEL_IIA, S.LYMPH_NODE_LEVEL_IIB),
+        (S.TOTAL_LYMPH_NODE, S.LYMPH_NODE_RIGHT, S.LYMPH_NODE_LEFT),
+    ]
+    FRACTION_PATTERN = re.compile(r'^([0-9]{1,18})/([0-9]{1,18})$')  # 18 digits always fit in int64
+
+    df: pd.DataFrame
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+        for key, key1, key2 in self.SUM_KEYS:
+            self.add_up(key=key, key1=key1, key2=key2)
+        return self.df
+
+    def add_up(self, key: str, key1: str, key2: str):
+        target = self.get_column(key)
+        a = self.get_column(key1)
+        b = self.get_column(key2)
+
+        to_write = target.eq('') & ~(a.eq('') & b.eq(''))
+        if not to_write.any():
+            return
+
+        a_m, a_n = self.parse_fractions(a[to_write])
+        b_m, b_n = self.parse_fractions(b[to_write])
+        sums = pd.DataFrame({'m': a_m + b_m, 'n': a_n + b_n})
+
+        codes = factorize_rows(df=sums)
+        _, first_rows = np.unique(codes, return_index=True)  # only format each unique sum once
+        formatted = np.array([f'{m}/{n}' for m, n in sums.iloc[first_rows].itertuples(index=False)], dtype=object)
+
+        values = target.to_numpy(dtype=object, copy=True)
+        values[to_write.to_numpy()] = formatted[codes]
+        self.df[key] = pd.Series(values, index=self.df.index, dtype=object)
+
+    def get_column(self, key: str) -> pd.Series:
+        if key in self.df.columns:
+            return self.df[key]
+        return pd.Series('', index=self.df.index, dtype=object)  # the same as attributes.get(key, '')
+
+    def parse_fractions(self, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Numerators and denominators of values, '' is 0/0
+        """
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        uniques = pd.Series(uniques, dtype=object)
+
+        parsed = uniques.astype(str).str.extract(self.FRACTION_PATTERN)
+        is_fast = parsed[0].notna() & get_is_str(uniques)
+        m = np.zeros(len(uniques), dtype=np.int64)
+        n = np.zeros(len(uniques), dtype=np.int64)
+        m[is_fast.to_numpy()] = parsed.loc[is_fast, 0].astype(np.int64).to_numpy()
+        n[is_fast.to_numpy()] = parsed.loc[is_fast, 1].astype(np.int64).to_numpy()
+
+        for i in np.flatnonzero(~is_fast & uniques.ne('')):
+            a, b = split_lymph_node(uniques[i])
+            if max(abs(a), abs(b)) >= 10 ** 18:  # Python int of any size, the same as CalculateLymphNodes
+                m, n = m.astype(object), n.astype(object)
+            m[i], n[i] = a, b
+
+        return m[codes], n[codes]
+
+
+def split_lymph_node(value: str) -> Tuple[int, int]:
+    """
+    'm/n' -> (m, n), the same as CalculateLymphNodes
+    """
+    m, n = value.split('/')
+    return int(m), int(n)
+
+
 class CalculateTherapy(Calculate):
 
     REQUIRED_KEYS = [
@@ -547,18 +1123,43 @@ class CalculateTherapy(Calculate):
         S.PALLIATIVE_TARGETED_THERAPY_DRUG,
         S.IMMUNOTHERAPY_DRUG,
     ]
+    THERAPY_AND_DRUG_KEYS = [
+        (S.NEOADJUVANT_INDUCTION_CHEMOTHERAPY, S.NEOADJUVANT_INDUCTION_CHEMOTHERAPY_DRUG),
+        (S.ADJUVANT_CHEMOTHERAPY, S.ADJUVANT_CHEMOTHERAPY_DRUG),
+        (S.PALLIATIVE_CHEMOTHERAPY, S.PALLIATIVE_CHEMOTHERAPY_DRUG),
+        (S.ADJUVANT_TARGETED_THERAPY, S.ADJUVANT_TARGETED_THERAPY_DRUG),
+        (S.PALLIATIVE_TARGETED_THERAPY, S.PALLIATIVE_TARGETED_THERAPY_DRUG),
+        (S.IMMUNOTHERAPY, S.IMMUNOTHERAPY_DRUG),
+    ]
+    INPUT_KEYS = REQUIRED_KEYS
+    OUTPUT_KEYS = [key1 for key1, _ in THERAPY_AND_DRUG_KEYS]
 
     def calculate(self):
-        for key1, key2 in [
-            (S.NEOADJUVANT_INDUCTION_CHEMOTHERAPY, S.NEOADJUVANT_INDUCTION_CHEMOTHERAPY_DRUG),
-            (S.ADJUVANT_CHEMOTHERAPY, S.ADJUVANT_CHEMOTHERAPY_DRUG),
-            (S.PALLIATIVE_CHEMOTHERAPY, S.PALLIATIVE_CHEMOTHERAPY_DRUG),
-            (S.ADJUVANT_TARGETED_THERAPY, S.ADJUVANT_TARGETED_THERAPY_DRUG),
-            (S.PALLIATIVE_TARGETED_THERAPY, S.PALLIATIVE_TARGETED_THERAPY_DRUG),
-            (S.IMMUNOTHERAPY, S.IMMUNOTHERAPY_DRUG),
-        ]:
+        for key1, key2 in self.THERAPY_AND_DRUG_KEYS:
             drug = self.attributes[key2]
             if drug in ['', 'None']:
                 self.attributes[key1] = 'False'
             else:
                 self.attributes[key1] = 'True'
+
+
+class BatchCalculateTherapy:
+    """
+    Same as CalculateTherapy, each therapy only depends on its own drug column, so there is no need to find unique inputs
+    """
+
+    REQUIRED_KEYS = CalculateTherapy.REQUIRED_KEYS
+
+    df: pd.DataFrame
+
+    def main(self, df: pd.DataFrame) -> pd.DataFrame:
+        self.df = df.copy()
+
+        if not all(key in self.df.columns for key in self.REQUIRED_KEYS):
+            return self.df
+
+        for key1, key2 in CalculateTherapy.THERAPY_AND_DRUG_KEYS:
+            no_drug = self.df[key2].isin(['', 'None'])
+            self.df[key1] = pd.Series(np.where(no_drug, 'False', 'True'), index=self.df.index, dtype=object)
+
+        return self.df
@@ -1,71 +1,120 @@
 import pandas as pd
 from os.path import dirname
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon, QKeySequence
-from PyQt5.QtWidgets import QVBoxLayout, QWidget, QTableWidget, QTableWidgetItem, QPushButton, QFileDialog, \
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QIcon, QKeySequence, QCloseEvent
+from PyQt5.QtWidgets import QVBoxLayout, QWidget, QTableView, QHeaderView, QPushButton, QFileDialog, \
     QMessageBox, QGridLayout, QDialog, QFormLayout, QDialogButtonBox, QComboBox, QScrollArea, QLineEdit, \
-    QShortcut
+    QShortcut, QLabel, QProgressBar
 from typing import List, Optional, Any, Dict, Tuple
 from .model import Model
 
 
-class Table(QTableWidget):
+class DataFrameTableModel(QAbstractTableModel):
+    """
+    Reads cells lazily from Model.dataframe, so only the rows in view are ever converted to str
+
+    The data frame is taken from the model only on reset(), i.e. in the GUI thread,
+        so a background action replacing Model.dataframe never changes the shape under the view
+    """
 
     model: Model
+    dataframe: pd.DataFrame
 
     def __init__(self, model: Model):
         super().__init__()
         self.model = model
-        self.refresh_table()
+        self.dataframe = model.dataframe
 
-    def refresh_table(self):
-        df = self.model.get_dataframe()
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.dataframe.index)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.dataframe.columns)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole) -> Any:
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        return str_(self.dataframe.iat[index.row(), index.column()])
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.DisplayRole) -> Any:
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self.dataframe.columns[section])
+        return str(section + 1)  # 1-based row numbers, same as QTableWidget
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled  # not Qt.ItemIsEditable, i.e. user cannot edit the cell
+
+    def reset(self):
+        """
+        For changes of shape or many rows, e.g. import, sort, undo
+        """
+        self.beginResetModel()
+        self.dataframe = self.model.dataframe
+        self.endResetModel()
+
+    def row_changed(self, row: int):
+        last_col = self.columnCount() - 1
+        self.dataChanged.emit(self.index(row, 0), self.index(row, last_col), [Qt.DisplayRole])
 
-        self.setRowCount(len(df.index))
-        self.setColumnCount(len(df.columns))
 
-        self.setHorizontalHeaderLabels(df.columns)
+class Table(QTableView):
 
-        for i in range(len(df.index)):
-            for j in range(len(df.columns)):
-                value = df.iloc[i, j]
-                item = QTableWidgetItem(str_(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)  # makes the item immutable, i.e. user cannot edit it
-                self.setItem(i, j, item)
+    RESIZE_SAMPLE_ROWS = 100
 
+    model: Model
+    table_model: DataFrameTableModel
+
+    def __init__(self, model: Model):
+        super().__init__()
+        self.model = model
+        self.table_model = DataFrameTableModel(model)
+        self.setModel(self.table_model)
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)  # no per-row height measuring
+        self.horizontalHeader().setResizeContentsPrecision(self.RESIZE_SAMPLE_ROWS)  # Qt default measures 1000 rows
+        self.refresh_table()
+
+    def refresh_table(self):
+        self.table_model.reset()
         self.resizeColumnsToContents()
 
+    def refresh_row(self, row: int):
+        self.table_model.row_changed(row=row)
+
+    def __column_name(self, ith_col: int) -> str:
+        return self.table_model.headerData(ith_col, Qt.Horizontal)
+
     def get_selected_rows(self) -> List[int]:
         ret = []
-        for item in self.selectedItems():
-            ith_row = item.row()
+        for index in self.selectedIndexes():
+            ith_row = index.row()
             if ith_row not in ret:
                 ret.append(ith_row)
         return ret
 
     def get_selected_columns(self) -> List[str]:
         ret = []
-        for item in self.selectedItems():
-            ith_col = item.column()
-            column = self.horizontalHeaderItem(ith_col).text()
+        for index in self.selectedIndexes():
+            column = self.__column_name(index.column())
             if column not in ret:
                 ret.append(column)
         return ret
 
     def get_selected_cells(self) -> List[Tuple[int, str]]:
         ret = []
-        for item in self.selectedItems():
-            ith_row = item.row()
-            ith_col = item.column()
-            column = self.horizontalHeaderItem(ith_col).text()
-            ret.append((ith_row, column))
+        for index in self.selectedIndexes():
+            column = self.__column_name(index.column())
+            ret.append((index.row(), column))
         return ret
 
     def select_cell(self, index: int, column: str):
         ith_row = index
-        columns = [self.horizontalHeaderItem(i).text() for i in range(self.columnCount())]
+        columns = [self.__column_name(i) for i in range(self.table_model.columnCount())]
         ith_col = columns.index(column)
-        self.setCurrentCell(ith_row, ith_col)
+        model_index = self.table_model.index(ith_row, ith_col)
+        self.setCurrentIndex(model_index)
+        self.scrollTo(model_index)
 
 
 class View(QWidget):
@@ -170,6 +219,7 @@ class View(QWidget):
         self.message_box_error = MessageBoxError(self)
         self.message_box_yes_no = MessageBoxYesNo(self)
         self.message_box_unsaved_file = MessageBoxUnsavedFile(self)
+        self.progress_dialog = ProgressDialog(self)
         self.dialog_edit_sample = DialogEditSample(self)
         self.dialog_project_info = DialogStudyInfo(self)
         self.dialog_find = DialogFind(self)
@@ -177,10 +227,18 @@ class View(QWidget):
 
     def refresh_table(self):
         self.table.refresh_table()
+        self.__refresh_title()
 
+    def refresh_row(self, row: int):
+        """
+        Repaints only the cells of one row, for edits that do not change the table shape
+        """
+        self.table.refresh_row(row=row)
+        self.__refresh_title()
+
+    def __refresh_title(self):
         suffix = ''
-        df = self.model.get_dataframe()
-        if len(df) > 0:  # only show suffix if there is data
+        if len(self.model.dataframe) > 0:  # only show suffix if there is data
             file = f' - {self.model.clinical_data_file}' if self.model.clinical_data_file is not None else ''
             state = ' (saved)' if self.model.is_file_saved() else ' (unsaved)'
             suffix = file + state
@@ -340,6 +398,91 @@ class MessageBoxUnsavedFile(MessageBox):
 #
 
 
+class ProgressDialog:
+
+    view: View
+
+    def __init__(self, view: View):
+        self.view = view
+
+    def __call__(self, label: str, cancellable: bool = True) -> 'WorkProgressDialog':
+        """
+        Returns a new modal dialog, i.e. the user cannot start another action in the meantime,
+            it shows a busy indicator until the first setMaximum() and setValue()
+        """
+        d = WorkProgressDialog(parent=self.view, label=label, cancellable=cancellable)
+        d.show()
+        return d
+
+
+class WorkProgressDialog(QDialog):
+    """
+    Stays open until finish() is called by the caller when the work is really done,
+        Esc and closing the window are ignored, so the model cannot be touched while the work is running
+
+    The cancel button only emits canceled, the dialog keeps waiting until the work stops
+    """
+
+    WIDTH = 400
+
+    canceled = pyqtSignal()
+
+    label: QLabel
+    bar: QProgressBar
+    button: Optional[QPushButton]
+    is_done: bool
+
+    def __init__(self, parent: QWidget, label: str, cancellable: bool):
+        super().__init__(parent)
+        self.is_done = False
+        self.setWindowTitle('ClinUI')
+        self.setWindowModality(Qt.WindowModal)
+        self.setWindowFlag(Qt.WindowCloseButtonHint, False)
+        self.setWindowFlag(Qt.WindowContextHelpButtonHint, False)
+        self.setMinimumWidth(self.WIDTH)
+
+        self.label = QLabel(label)
+        self.bar = QProgressBar()
+        self.bar.setRange(0, 0)  # busy indicator
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addWidget(self.bar)
+
+        self.button = None
+        if cancellable:
+            self.button = QPushButton('Cancel')
+            self.button.clicked.connect(self.cancel)
+            layout.addWidget(self.button, alignment=Qt.AlignRight)
+
+    def setMaximum(self, maximum: int):
+        self.bar.setMaximum(maximum)
+
+    def setValue(self, value: int):
+        self.bar.setValue(value)
+
+    def cancel(self):
+        self.button.setEnabled(False)
+        self.label.setText('Cancelling...')
+        self.canceled.emit()
+
+    def finish(self):
+        self.is_done = True
+        self.close()
+
+    def reject(self):
+        pass  # Esc
+
+    def closeEvent(self, event: QCloseEvent):
+        if self.is_done:
+            event.accept()
+        else:
+            event.ignore()
+
+
+#
+
+
 class DialogComboBoxes:
 
     WIDTH: int
@@ -4,6 +4,7 @@ import unittest
 import pandas as pd
 from typing import Tuple
 from src.schema import NycuOsccSchema
+from src.cbio_write_mutation_data import ReadAndProcessMaf
 
 
 def get_dirs(py_path: str) -> Tuple[str, str]:
@@ -13,6 +14,15 @@ def get_dirs(py_path: str) -> Tuple[str, str]:
     return indir, outdir
 
 
+def write_maf(file: str, n_variants: int):
+    df = pd.DataFrame({c: ['.'] * n_variants for c in ReadAndProcessMaf.COLUMNS})
+    df['Start_Position'] = range(n_variants)
+    df['Tumor_Sample_Barcode'] = 'TUMOR'
+    with open(file, 'w') as fh:
+        fh.write('#version 2.4\n')
+        df.to_csv(fh, sep='\t', index=False, lineterminator='\n')
+
+
 class TestCase(unittest.TestCase):
 
     def set_up(self, py_path: str):
@@ -0,0 +1,67 @@
+from concurrent.futures import ThreadPoolExecutor
+from src.schema import DATA_SCHEMA_DICT
+from src.cbio_compiled_schema import compile_schema
+from .setup import TestCase
+
+
+def formatted(c: str) -> str:
+    for x in [' ', '-', ',', '/']:
+        c = c.upper().replace(x, '_')
+    for x in ['(', ')']:
+        c = c.replace(x, '')
+    return c
+
+
+class TestCompiledSchema(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_same_as_column_attributes(self):
+        for schema in DATA_SCHEMA_DICT.values():
+            compiled = compile_schema(schema)
+            self.assertIs(compiled, compile_schema(schema))  # built once per schema
+
+            columns = list(schema.COLUMN_ATTRIBUTES.keys()) + ['Study ID', 'Not In Schema']
+            table = compiled.lookup(columns=columns)
+            self.assertListEqual(columns, table.index.to_list())
+
+            for c, row in table.iterrows():
+                with self.subTest(schema=schema.NAME, column=c):
+                    ty = schema.COLUMN_ATTRIBUTES.get(c, {}).get('type', 'str')
+                    expected = {'bool': 'BOOLEAN', 'int': 'NUMBER', 'float': 'NUMBER'}.get(ty, 'STRING')
+                    self.assertEqual(expected, row['datatype'])
+                    self.assertEqual(ty == 'bool', row['is_bool'])
+                    self.assertEqual(ty in ['int', 'float'], row['is_number'])
+                    self.assertEqual(c in schema.CBIO_PATIENT_LEVEL_COLUMNS, row['is_patient_level'])
+                    name = formatted(c)
+                    self.assertEqual(compiled.RENAME_COLUMN_DICT.get(name, name), row['cbio_column'])
+
+    def test_survival_column_names(self):
+        table = compile_schema(self.schema).lookup(columns=['Overall Survival (Months)', 'Overall Survival Status'])
+        self.assertListEqual(['OS_MONTHS', 'OS_STATUS'], table['cbio_column'].to_list())
+
+    def test_lookup_does_not_grow_shared_table(self):
+        compiled = compile_schema(self.schema)
+        n_rows = len(compiled.table)
+        table = compiled.lookup(columns=['Study ID', 'Not In Schema'])
+        self.assertListEqual(['STUDY_ID', 'NOT_IN_SCHEMA'], table['cbio_column'].to_list())
+        self.assertEqual(n_rows, len(compiled.table))
+
+    def test_lookup_across_threads(self):
+        compiled = compile_schema(self.schema)
+        base_columns = list(self.schema.COLUMN_ATTRIBUTES.keys())[:5]
+
+        def lookup(i: int):
+            columns = base_columns + [f'Extra {i}', f'Extra {i % 3}']
+            return columns, compiled.lookup(columns=columns)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookup, range(200)))
+
+        for columns, table in results:
+            self.assertListEqual(columns, table.index.to_list())
+            self.assertListEqual([formatted(c) for c in columns[-2:]], table['cbio_column'].to_list()[-2:])
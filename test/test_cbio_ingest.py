@@ -1,7 +1,8 @@
+import os
 import pandas as pd
 from os.path import exists
 from src.cbio_ingest import cBioIngest, WriteStudyInfo
-from .setup import TestCase
+from .setup import TestCase, write_maf
 
 
 class TestcBioIngest(TestCase):
@@ -78,6 +79,144 @@ class TestcBioIngest(TestCase):
                 self.assertTrue(not exists(f'{self.outdir}/{file}'))
 
 
+    def test_incremental(self):
+        study_info_dict = {
+            'type_of_cancer': 'hnsc',
+            'cancer_study_identifier': 'hnsc_nycu_2022',
+            'name': 'Head and Neck Squamous Cell Carcinomas (NYCU, 2022)',
+            'description': 'Whole exome sequencing of 11 precancer and OSCC tumor/normal pairs',
+            'groups': 'PUBLIC',
+            'reference_genome': 'hg38',
+        }
+        sample_ids = ['S1', 'S2', 'S3']
+        clinical_data_df = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS)
+        clinical_data_df[self.schema.SAMPLE_ID] = sample_ids
+        clinical_data_df[self.schema.SEX] = 'Male'
+
+        maf_dir = f'{self.outdir}/maf_dir'
+        os.makedirs(maf_dir)
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{maf_dir}/{sample_id}.maf', n_variants=i + 1)
+
+        def export(outdir: str, incremental: bool):
+            cBioIngest(self.schema).main(
+                study_info_dict=study_info_dict,
+                clinical_data_df=clinical_data_df,
+                maf_dir=maf_dir,
+                tags_dict=None,
+                outdir=outdir,
+                incremental=incremental
+            )
+
+        incremental_dir = f'{self.outdir}/incremental'
+        os.makedirs(incremental_dir)
+        export(outdir=incremental_dir, incremental=True)
+        clinical_mtime = os.stat(f'{incremental_dir}/data_clinical_sample.txt').st_mtime_ns
+        case_list_mtime = os.stat(f'{incremental_dir}/case_lists/cases_all.txt').st_mtime_ns
+
+        write_maf(file=f'{maf_dir}/S2.maf', n_variants=5)  # only S2 has changed
+        export(outdir=incremental_dir, incremental=True)
+
+        full_dir = f'{self.outdir}/full'
+        os.makedirs(full_dir)
+        export(outdir=full_dir, incremental=False)
+
+        self.assertFileEqual(
+            f'{full_dir}/data_mutations_extended.txt',
+            f'{incremental_dir}/data_mutations_extended.txt')
+        self.assertEqual(clinical_mtime, os.stat(f'{incremental_dir}/data_clinical_sample.txt').st_mtime_ns)
+        self.assertEqual(case_list_mtime, os.stat(f'{incremental_dir}/case_lists/cases_all.txt').st_mtime_ns)
+        self.assertFalse(exists(f'{full_dir}/.cbio_ingest_manifest.json'))
+
+        clinical_data_df.loc[0, self.schema.SEX] = 'Female'  # clinical data has changed
+        export(outdir=incremental_dir, incremental=True)
+        self.assertNotEqual(clinical_mtime, os.stat(f'{incremental_dir}/data_clinical_sample.txt').st_mtime_ns)
+
+    def test_incremental_missing_output_file(self):
+        sample_ids = ['S1', 'S2']
+        clinical_data_df = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS)
+        clinical_data_df[self.schema.SAMPLE_ID] = sample_ids
+        clinical_data_df[self.schema.SEX] = 'Male'
+
+        maf_dir = f'{self.outdir}/maf_dir'
+        os.makedirs(maf_dir)
+        for sample_id in sample_ids:
+            write_maf(file=f'{maf_dir}/{sample_id}.maf', n_variants=2)
+
+        outdir = f'{self.outdir}/study'
+        os.makedirs(outdir)
+        for file in [
+            'data_clinical_sample.txt',
+            'meta_clinical_sample.txt',
+            'meta_mutations_extended.txt',
+            'case_lists/cases_sequenced.txt',
+        ]:
+            with self.subTest(file=file):
+                cBioIngest(self.schema).main(
+                    study_info_dict={'cancer_study_identifier': 'x', 'description': 'x'},
+                    clinical_data_df=clinical_data_df,
+                    maf_dir=maf_dir,
+                    tags_dict=None,
+                    outdir=outdir,
+                    incremental=True
+                )
+                os.remove(f'{outdir}/{file}')
+                cBioIngest(self.schema).main(
+                    study_info_dict={'cancer_study_identifier': 'x', 'description': 'x'},
+                    clinical_data_df=clinical_data_df,
+                    maf_dir=maf_dir,
+                    tags_dict=None,
+                    outdir=outdir,
+                    incremental=True
+                )  # nothing has changed, but the missing file is written again
+                self.assertTrue(exists(f'{outdir}/{file}'))
+
+    def test_incremental_rows_missing_from_data_file(self):
+        sample_ids = ['S1', 'S2']
+        clinical_data_df = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS)
+        clinical_data_df[self.schema.SAMPLE_ID] = sample_ids
+        clinical_data_df[self.schema.SEX] = 'Male'
+
+        maf_dir = f'{self.outdir}/maf_dir'
+        os.makedirs(maf_dir)
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{maf_dir}/{sample_id}.maf', n_variants=i + 2)
+
+        def export(outdir: str, incremental: bool, progress=None):
+            cBioIngest(self.schema).main(
+                study_info_dict={'cancer_study_identifier': 'x', 'description': 'x'},
+                clinical_data_df=clinical_data_df,
+                maf_dir=maf_dir,
+                tags_dict=None,
+                outdir=outdir,
+                incremental=incremental,
+                progress=progress
+            )
+
+        full_dir = f'{self.outdir}/full'
+        os.makedirs(full_dir)
+        export(outdir=full_dir, incremental=False)
+
+        incremental_dir = f'{self.outdir}/incremental'
+        os.makedirs(incremental_dir)
+        export(outdir=incremental_dir, incremental=True)
+
+        # rows of S1 removed, e.g. by hand or by an interrupted write
+        data_file = f'{incremental_dir}/data_mutations_extended.txt'
+        df = pd.read_csv(data_file, sep='\t', dtype=str, keep_default_na=False)
+        df[df['Tumor_Sample_Barcode'] != 'S1'].to_csv(data_file, sep='\t', index=False)
+
+        export(outdir=incremental_dir, incremental=True)
+        self.assertFileEqual(f'{full_dir}/data_mutations_extended.txt', data_file)
+
+        def interrupt(done: int, total: int):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            export(outdir=incremental_dir, incremental=True, progress=interrupt)
+        self.assertFalse(exists(f'{incremental_dir}/.cbio_ingest_manifest.json'))
+
+
 class TestWriteStudyInfo(TestCase):
 
     def setUp(self):
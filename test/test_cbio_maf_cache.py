@@ -0,0 +1,61 @@
+import os
+import time
+import pandas as pd
+from src.cbio_maf_cache import MafCache
+from src.cbio_write_mutation_data import ReadAndProcessMaf
+from .setup import TestCase, write_maf
+
+
+class TestMafCache(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        self.cache_dir = f'{self.outdir}/cache'
+        self.maf = f'{self.outdir}/S1.maf'
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_get_put(self):
+        write_maf(file=self.maf, n_variants=3)
+        cache = MafCache(cache_dir=self.cache_dir)
+        self.assertIsNone(cache.get(maf=self.maf))
+
+        expected = ReadAndProcessMaf().main(maf=self.maf, maf_cache=cache)  # cache miss, put
+        actual = ReadAndProcessMaf().main(maf=self.maf, maf_cache=cache)  # cache hit
+        self.assertIsNotNone(cache.get(maf=self.maf))
+        pd.testing.assert_frame_equal(expected, actual)
+
+    def test_invalidate_changed_maf(self):
+        write_maf(file=self.maf, n_variants=3)
+        cache = MafCache(cache_dir=self.cache_dir)
+        ReadAndProcessMaf().main(maf=self.maf, maf_cache=cache)
+
+        write_maf(file=self.maf, n_variants=5)
+        self.assertIsNone(cache.get(maf=self.maf))
+
+        df = ReadAndProcessMaf().main(maf=self.maf, maf_cache=cache)
+        self.assertEqual(5, len(df))
+
+        entries = [f for f in os.listdir(self.cache_dir) if not f.endswith('.json')]
+        self.assertEqual(1, len(entries))  # the entry of the old MAF has been removed
+
+    def test_evict_least_recently_used(self):
+        cache = MafCache(cache_dir=self.cache_dir)
+        mafs = [f'{self.outdir}/S{i}.maf' for i in range(3)]
+        for maf in mafs:
+            write_maf(file=maf, n_variants=10)
+            cache.put(maf=maf, df=ReadAndProcessMaf().main(maf=maf))
+
+        for maf in [mafs[1], mafs[2], mafs[0]]:  # mafs[1] is the least recently used
+            time.sleep(0.01)
+            cache.get(maf=maf)
+
+        entries = [f for f in os.listdir(self.cache_dir) if not f.endswith('.json')]
+        total = sum(os.path.getsize(f'{self.cache_dir}/{f}') for f in entries)
+        cache.max_bytes = total - 1  # one entry has to go
+        cache.evict()
+
+        self.assertIsNone(cache.get(maf=mafs[1]))
+        self.assertIsNotNone(cache.get(maf=mafs[0]))
+        self.assertIsNotNone(cache.get(maf=mafs[2]))
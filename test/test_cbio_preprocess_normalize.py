@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from src.schema import DATA_SCHEMA_DICT
 from src.cbio_preprocess_normalize import PreprocessNormalize, delta_t
 from test.setup import TestCase
 
@@ -27,6 +28,36 @@ class TestPreprocessNormalize(TestCase):
             sample_df
         )
 
+    def test_column_order(self):
+        for schema in DATA_SCHEMA_DICT.values():
+            columns = schema.DISPLAY_COLUMNS
+            df = pd.DataFrame([[f'{c} {i}' for c in columns] for i in range(3)], columns=columns)
+            df.iloc[1, 2] = np.nan
+            before = df.copy()
+
+            patient_df, sample_df = PreprocessNormalize(schema).main(clinical_data_df=df, study_id='study')
+
+            sample_id = df[columns[0]].tolist()
+            kept = [c for c in columns[1:] if c not in schema.CBIO_DROP_COLUMNS]
+            expected = pd.DataFrame({'Patient ID': sample_id})
+            for c in schema.CBIO_PATIENT_LEVEL_COLUMNS:
+                expected[c] = df[c]
+            self.assertDataFrameEqual(expected, patient_df)
+
+            expected = pd.DataFrame({'Study ID': 'study', 'Patient ID': sample_id, 'Sample ID': sample_id})
+            for c in kept:
+                if c not in schema.CBIO_PATIENT_LEVEL_COLUMNS:
+                    expected[c] = df[c]
+            self.assertDataFrameEqual(expected, sample_df)
+
+            sample_df.iloc[0, 3] = 'Modified'
+            self.assertDataFrameEqual(before, df)  # the clinical data table is not modified
+
+    def test_missing_drop_column(self):
+        df = pd.DataFrame({'Sample ID': ['S1']})
+        with self.assertRaises(KeyError):
+            PreprocessNormalize(self.schema).main(clinical_data_df=df, study_id='study')
+
     def test_delta_t(self):
         actual = delta_t(start='2020/01/01', end='01/01/2021')
         expected = pd.Timedelta(days=366)
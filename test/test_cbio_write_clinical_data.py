@@ -1,5 +1,9 @@
+import os
+import warnings
+import numpy as np
 import pandas as pd
-from src.cbio_write_clinical_data import WriteClinicalData
+from src.cbio_write_clinical_data import WriteClinicalData, WriteSampleData, RemoveEmptyColumns, FillInMissingBooleanValues, \
+    open_atomic
 from .setup import TestCase
 
 
@@ -44,3 +48,85 @@ class TestWriteClinicalData(TestCase):
             sample_df=pd.read_csv(f'{self.indir}/sample_df.csv'),
             outdir=self.outdir
         )
+
+    def test_data_file_layout(self):
+        WriteSampleData(self.schema).main(
+            sample_df=pd.DataFrame({
+                'Patient ID': ['P1', 'P2'],
+                'Sample ID': ['S1', 'S2'],
+                'Age': [60, None],
+            }),
+            study_info_dict={'cancer_study_identifier': 'hnsc_nycu_2022'},
+            outdir=self.outdir
+        )
+        expected = os.linesep.join([
+            '#Patient ID\tSample ID\tAge',
+            '#Patient ID\tSample ID\tAge',
+            '#STRING\tSTRING\tSTRING',
+            '#1\t1\t1',
+            'PATIENT_ID\tSAMPLE_ID\tAGE',
+            'P1\tS1\t60.0',
+            'P2\tS2\t',
+        ]) + os.linesep
+        with open(f'{self.outdir}/data_clinical_sample.txt', 'rb') as fh:
+            self.assertEqual(expected.encode('UTF-8'), fh.read())
+        self.assertListEqual(
+            ['data_clinical_sample.txt', 'meta_clinical_sample.txt'],
+            sorted(os.listdir(self.outdir)))
+
+    def test_open_atomic_keeps_previous_file_on_failure(self):
+        file = f'{self.outdir}/data_clinical_sample.txt'
+        with open_atomic(file) as fh:
+            fh.write('previous')
+
+        with self.assertRaises(ValueError):
+            with open_atomic(file) as fh:
+                fh.write('half written')
+                raise ValueError
+
+        with open(file) as fh:
+            self.assertEqual('previous', fh.read())
+        self.assertListEqual(['data_clinical_sample.txt'], os.listdir(self.outdir))
+
+
+class TestRemoveEmptyColumns(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_main(self):
+        df = pd.DataFrame({
+            'Patient ID': ['P1', 'P2'],
+            'A': [np.nan, np.nan],
+            'B': [np.nan, 'x'],
+            'C': [None, pd.NA],
+            'D': [0, np.nan],
+            'E': ['', np.nan],
+        })
+        remover = RemoveEmptyColumns(self.schema)
+        actual = remover.main(df)
+        self.assertListEqual(['Patient ID', 'B', 'D', 'E'], actual.columns.to_list())
+        self.assertListEqual(['A', 'C'], remover.removed_columns)
+        self.assertListEqual(['Patient ID', 'A', 'B', 'C', 'D', 'E'], df.columns.to_list())  # not modified
+
+    def test_fill_in_boolean_values_after_removal(self):
+        df = pd.DataFrame({
+            'Patient ID': ['P1', 'P2'],
+            'A': [np.nan, np.nan],
+            'Adjuvant Chemotherapy': [True, np.nan],
+        })
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # e.g. SettingWithCopyWarning when the result is a view of df
+            actual = RemoveEmptyColumns(self.schema).main(df)
+            actual = FillInMissingBooleanValues(self.schema).main(actual)
+        self.assertListEqual([True, False], actual['Adjuvant Chemotherapy'].to_list())
+        self.assertTrue(pd.isna(df.loc[1, 'Adjuvant Chemotherapy']))  # not modified
+
+    def test_no_rows(self):
+        remover = RemoveEmptyColumns(self.schema)
+        actual = remover.main(pd.DataFrame(columns=['Patient ID', 'A']))
+        self.assertListEqual([], actual.columns.to_list())
+        self.assertListEqual(['Patient ID', 'A'], remover.removed_columns)
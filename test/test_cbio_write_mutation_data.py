@@ -1,6 +1,15 @@
+import io
+import numpy as np
 import pandas as pd
-from src.cbio_write_mutation_data import WriteMutationData
-from .setup import TestCase
+from contextlib import redirect_stdout
+from src.cbio_write_mutation_data import WriteMutationData, ReadAndProcessMaf, get_rss_mb
+from .setup import TestCase, write_maf
+
+
+STUDY_INFO_DICT = {
+    'cancer_study_identifier': 'hnsc_nycu_2022',
+    'description': 'Whole exome sequencing of 11 precancer and OSCC tumor/normal pairs',
+}
 
 
 class TestWriteClinicalData(TestCase):
@@ -26,3 +35,244 @@ class TestWriteClinicalData(TestCase):
             sample_df=pd.read_csv(f'{self.indir}/sample_df.csv'),
             outdir=self.outdir
         )
+
+    def test_sample_order_and_barcode(self):
+        sample_ids = ['S3', 'S1', 'S2']
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{self.outdir}/{sample_id}.maf', n_variants=i + 1)
+
+        WriteMutationData().main(
+            maf_dir=self.outdir,
+            study_info_dict=STUDY_INFO_DICT,
+            sample_df=pd.DataFrame({
+                'Study ID': 'hnsc_nycu_2022',
+                'Patient ID': sample_ids,
+                'Sample ID': sample_ids,
+            }),
+            outdir=self.outdir
+        )
+
+        df = pd.read_csv(f'{self.outdir}/data_mutations_extended.txt', sep='\t')
+        self.assertListEqual(['S3', 'S1', 'S1', 'S2', 'S2', 'S2'], df['Tumor_Sample_Barcode'].tolist())
+        self.assertListEqual([0, 0, 1, 0, 1, 2], df['Start_Position'].tolist())
+
+    def test_streaming_mode(self):
+        sample_ids = ['S1', 'S2', 'S3']
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{self.outdir}/{sample_id}.maf', n_variants=5 * i + 1)
+        sample_df = pd.DataFrame({
+            'Study ID': 'hnsc_nycu_2022',
+            'Patient ID': sample_ids,
+            'Sample ID': sample_ids,
+        })
+
+        WriteMutationData().main(
+            maf_dir=self.outdir,
+            study_info_dict=STUDY_INFO_DICT,
+            sample_df=sample_df,
+            outdir=self.outdir
+        )
+        with open(f'{self.outdir}/data_mutations_extended.txt') as fh:
+            expected = fh.read()
+
+        WriteMutationData().main(
+            maf_dir=self.outdir,
+            study_info_dict=STUDY_INFO_DICT,
+            sample_df=sample_df,
+            outdir=self.outdir,
+            chunksize=2
+        )
+        with open(f'{self.outdir}/data_mutations_extended.txt') as fh:
+            actual = fh.read()
+
+        self.assertEqual(expected, actual)
+
+    def test_max_rss_mb(self):
+        if get_rss_mb() is None:
+            self.skipTest('RSS cannot be measured on this platform')
+
+        write_maf(file=f'{self.outdir}/S1.maf', n_variants=1)
+        with self.assertRaises(MemoryError):
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=pd.DataFrame({'Study ID': 'x', 'Patient ID': ['S1'], 'Sample ID': ['S1']}),
+                outdir=self.outdir,
+                chunksize=1,
+                max_rss_mb=1.0
+            )
+
+    def test_max_rss_mb_ignores_memory_freed_before(self):
+        if get_rss_mb() is None:
+            self.skipTest('RSS cannot be measured on this platform')
+
+        x = np.ones(512 * 1024 ** 2 // 8)  # a peak of the process well above the ceiling, freed before the export
+        del x
+
+        write_maf(file=f'{self.outdir}/S1.maf', n_variants=1)
+        writer = WriteMutationData()
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            writer.main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=pd.DataFrame({'Study ID': 'x', 'Patient ID': ['S1'], 'Sample ID': ['S1']}),
+                outdir=self.outdir,
+                chunksize=1,
+                max_rss_mb=get_rss_mb() + 256
+            )
+
+        self.assertIsNotNone(writer.peak_rss_mb)
+        self.assertIn('Peak RSS', stdout.getvalue())
+
+    def test_no_rss_report_without_chunksize_or_max_rss_mb(self):
+        write_maf(file=f'{self.outdir}/S1.maf', n_variants=1)
+        writer = WriteMutationData()
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            writer.main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=pd.DataFrame({'Study ID': 'x', 'Patient ID': ['S1'], 'Sample ID': ['S1']}),
+                outdir=self.outdir
+            )
+
+        self.assertIsNone(writer.peak_rss_mb)
+        self.assertNotIn('RSS', stdout.getvalue())
+
+    def test_workers(self):
+        sample_ids = ['S3', 'S1', 'S2', 'S4']
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{self.outdir}/{sample_id}.maf', n_variants=i + 1)
+
+        WriteMutationData().main(
+            maf_dir=self.outdir,
+            study_info_dict=STUDY_INFO_DICT,
+            sample_df=pd.DataFrame({
+                'Study ID': 'hnsc_nycu_2022',
+                'Patient ID': sample_ids,
+                'Sample ID': sample_ids,
+            }),
+            outdir=self.outdir,
+            workers=2
+        )
+
+        df = pd.read_csv(f'{self.outdir}/data_mutations_extended.txt', sep='\t')
+        self.assertListEqual(
+            ['S3', 'S1', 'S1', 'S2', 'S2', 'S2', 'S4', 'S4', 'S4', 'S4'],
+            df['Tumor_Sample_Barcode'].tolist())
+
+    def test_report_every_failed_maf(self):
+        sample_ids = ['S1', 'S2', 'S3']
+        write_maf(file=f'{self.outdir}/S2.maf', n_variants=1)
+        with open(f'{self.outdir}/S3.maf', 'w') as fh:
+            fh.write('#version 2.4\ncorrupted\n')
+
+        with self.assertRaises(AssertionError) as context:
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=pd.DataFrame({
+                    'Study ID': 'hnsc_nycu_2022',
+                    'Patient ID': sample_ids,
+                    'Sample ID': sample_ids,
+                }),
+                outdir=self.outdir,
+                workers=2
+            )
+
+        msg = str(context.exception)
+        self.assertIn('Failed to read 2 of 3 MAF files', msg)
+        self.assertIn('S1.maf', msg)
+        self.assertIn('S3.maf', msg)
+        self.assertNotIn('S2.maf', msg)
+
+    def test_pyarrow_engine(self):
+        try:
+            import pyarrow
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+
+        write_maf(file=f'{self.outdir}/S1.maf', n_variants=3)
+        sample_df = pd.DataFrame({'Study ID': 'x', 'Patient ID': ['S1'], 'Sample ID': ['S1']})
+
+        expected, actual = [
+            ReadAndProcessMaf().main(maf=f'{self.outdir}/S1.maf', engine=engine)
+            for engine in ['c', 'pyarrow']
+        ]
+        self.assertEqual('Int64', str(expected['Start_Position'].dtype))
+        self.assertEqual('category', str(expected['Chromosome'].dtype))
+        self.assertListEqual(['.'] * 3, expected['Entrez_Gene_Id'].tolist())  # '.' is kept as it is
+        pd.testing.assert_frame_equal(expected, actual)
+
+        outputs = []
+        for engine in ['c', 'pyarrow']:
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=sample_df,
+                outdir=self.outdir,
+                maf_engine=engine
+            )
+            with open(f'{self.outdir}/data_mutations_extended.txt') as fh:
+                outputs.append(fh.read())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_non_integer_values_in_integer_columns(self):
+        write_maf(file=f'{self.outdir}/S1.maf', n_variants=3)  # '.' in every integer column except Start_Position
+        df = pd.read_csv(f'{self.outdir}/S1.maf', sep='\t', skiprows=1, dtype=str)
+        df.loc[1, 'Entrez_Gene_Id'] = 'Unknown'
+        df.loc[2, 't_alt_count'] = '12'
+        with open(f'{self.outdir}/S1.maf', 'w') as fh:
+            fh.write('#version 2.4\n')
+            df.to_csv(fh, sep='\t', index=False, lineterminator='\n')
+        sample_df = pd.DataFrame({'Study ID': 'x', 'Patient ID': ['S1'], 'Sample ID': ['S1']})
+
+        actual = ReadAndProcessMaf().main(maf=f'{self.outdir}/S1.maf')
+        self.assertEqual('Int64', str(actual['Start_Position'].dtype))
+        self.assertListEqual(['.', 'Unknown', '.'], actual['Entrez_Gene_Id'].tolist())
+
+        for kwargs in [{}, {'chunksize': 2}]:
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=sample_df,
+                outdir=self.outdir,
+                **kwargs
+            )
+            written = pd.read_csv(f'{self.outdir}/data_mutations_extended.txt', sep='\t', dtype=str, keep_default_na=False)
+            self.assertListEqual(['.', 'Unknown', '.'], written['Entrez_Gene_Id'].tolist())
+            self.assertListEqual(['.', '.', '12'], written['t_alt_count'].tolist())
+            self.assertListEqual(['0', '1', '2'], written['Start_Position'].tolist())
+
+    def test_progress_and_cancel(self):
+        sample_ids = ['S1', 'S2', 'S3']
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{self.outdir}/{sample_id}.maf', n_variants=i + 1)
+        sample_df = pd.DataFrame({'Study ID': 'x', 'Patient ID': sample_ids, 'Sample ID': sample_ids})
+
+        for chunksize in [None, 2]:
+            reported = []
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=sample_df,
+                outdir=self.outdir,
+                chunksize=chunksize,
+                progress=lambda done, total: reported.append((done, total))
+            )
+            self.assertListEqual([(0, 3), (1, 3), (2, 3), (3, 3)], reported)
+
+        def cancel(done: int, total: int):
+            if done == 1:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            WriteMutationData().main(
+                maf_dir=self.outdir,
+                study_info_dict=STUDY_INFO_DICT,
+                sample_df=sample_df,
+                outdir=self.outdir,
+                workers=2,
+                progress=cancel
+            )
@@ -0,0 +1,80 @@
+import io
+import json
+import pandas as pd
+from contextlib import redirect_stdout
+from os.path import exists
+from src.cli import BatchExport
+from .setup import TestCase, write_maf
+
+
+class TestBatchExport(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def write_study(self, name: str, sample_ids: list) -> dict:
+        df = pd.DataFrame(columns=self.schema.DISPLAY_COLUMNS, index=range(len(sample_ids)))
+        df['ID'] = range(1, len(sample_ids) + 1)
+        df['Patient ID'] = sample_ids
+        df['Sample ID'] = sample_ids
+        df.to_csv(f'{self.outdir}/{name}.csv', index=False)
+        for i, sample_id in enumerate(sample_ids):
+            write_maf(file=f'{self.outdir}/{sample_id}.maf', n_variants=i + 1)
+        return {
+            'schema': self.schema.NAME,
+            'clinical_data_table': f'{name}.csv',
+            'maf_dir': '.',
+            'outdir': name,
+            'study_info': {
+                'type_of_cancer': 'hnsc',
+                'cancer_study_identifier': name,
+                'name': name,
+                'description': name,
+                'groups': 'PUBLIC',
+                'reference_genome': 'hg38',
+            },
+        }
+
+    def test_main(self):
+        studies = [
+            self.write_study(name='study_a', sample_ids=['A1', 'A2']),
+            self.write_study(name='study_b', sample_ids=['B1', 'B2', 'B3']),
+        ]
+        broken = self.write_study(name='study_c', sample_ids=['C1'])
+        broken['maf_dir'] = 'does_not_exist'
+        studies.append(broken)
+        with open(f'{self.outdir}/manifest.json', 'w') as fh:
+            json.dump({'studies': studies}, fh)
+
+        results = BatchExport().main(manifest=f'{self.outdir}/manifest.json', jobs=2)
+
+        self.assertListEqual(['study_a', 'study_b', 'study_c'], [r['study'] for r in results])
+        self.assertListEqual([2, 3], [r['samples'] for r in results[:2]])
+        self.assertIsNone(results[0]['error'])
+        self.assertIsNone(results[1]['error'])
+        self.assertIn('C1.maf', results[2]['error'])
+
+        df = pd.read_csv(f'{self.outdir}/study_b/data_mutations_extended.txt', sep='\t')
+        self.assertListEqual(['B1', 'B2', 'B2', 'B3', 'B3', 'B3'], df['Tumor_Sample_Barcode'].tolist())
+        self.assertTrue(exists(f'{self.outdir}/study_a/case_lists/cases_all.txt'))
+
+    def test_study_without_study_info(self):
+        study = self.write_study(name='study_a', sample_ids=['A1'])
+        broken = self.write_study(name='study_b', sample_ids=['B1'])
+        del broken['study_info']
+        del broken['outdir']
+        with open(f'{self.outdir}/manifest.json', 'w') as fh:
+            json.dump({'studies': [study, broken]}, fh)
+
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            results = BatchExport().main(manifest=f'{self.outdir}/manifest.json')
+
+        self.assertIsNone(results[0]['error'])
+        self.assertIsNone(results[1]['study'])
+        self.assertIn('KeyError', results[1]['error'])
+        self.assertIn('studies[1]', stdout.getvalue())
+        self.assertIn('FAILED', stdout.getvalue())
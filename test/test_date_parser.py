@@ -0,0 +1,57 @@
+import pandas as pd
+from src.date_parser import parse_date, format_date, date_cache_info, clear_date_cache
+from .setup import TestCase
+
+
+def to_datetime(value: str):
+    try:
+        ret = pd.to_datetime(value)
+        return repr(ret), getattr(ret, 'unit', None)
+    except Exception as e:
+        return repr(e)
+
+
+def parse(value: str):
+    try:
+        ret = parse_date(value)
+        return repr(ret), getattr(ret, 'unit', None)
+    except Exception as e:
+        return repr(e)
+
+
+class TestParseDate(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+        clear_date_cache()
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_same_as_to_datetime(self):
+        values = [
+            '2020-01-01', '1999-12-31', '2020-02-29', '2021-02-29', '2020-02-30', '2020-13-01', '2020-00-10',
+            '1677-09-22', '1677-09-21', '1500-01-01', '2262-04-11', '2262-04-12', '0000-01-01', '9999-12-31',
+            '2020', '2020-03', '2020/03/01', '03/01/2020', '2020-3-1', '20200301', '', 'NaT', 'abc', ' 2020-01-01',
+        ]
+        for value in values:
+            expected = to_datetime(value)
+            self.assertEqual(expected, parse(value), msg=value)
+            self.assertEqual(expected, parse(value), msg=value)  # the cached one
+
+    def test_format_date(self):
+        self.assertEqual('2020-03-01', format_date('2020/03/01'))
+        self.assertEqual('2020-01-01', format_date('2020'))
+
+    def test_cache_info(self):
+        for _ in range(3):
+            parse_date('2020-01-01')
+        parse_date('2021-01-01')
+        with self.assertRaises(ValueError):
+            parse_date('abc')
+
+        info = date_cache_info()
+        self.assertEqual(2, info['hits'])
+        self.assertEqual(3, info['misses'])
+        self.assertAlmostEqual(0.4, info['hit_rate'])
+        self.assertEqual(2, info['size'])
@@ -1,8 +1,49 @@
-from src.model import Model
-from src.schema import NycuOsccSchema
+import numpy as np
+import pandas as pd
+from src.model import Model, ProcessSampleAttributes, ReprocessTable, CastDatatypes, BatchCastDatatypes
+from src.model_nycu import get_derivation_plan
+from src.schema import Schema, NycuOsccSchema
 from .setup import TestCase
 
 
+def random_clinical_df(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    S = NycuOsccSchema
+    rng = np.random.default_rng(seed)
+
+    def choice(values: list) -> np.ndarray:
+        return rng.choice(np.array(values, dtype=object), size=n_rows)
+
+    pools = {
+        'date': [np.nan, '2003', '2003-01-01', '2003-02-01', '2003-12-27', '2004-01-26', '2000-01-01', '2003/06/15'],
+        'float': [np.nan, '0', '1.5', '12.0'],
+        'bool': [np.nan, 'True', 'FALSE', 'true'],
+    }
+    data = {}
+    for column in S.DISPLAY_COLUMNS:
+        attr = S.COLUMN_ATTRIBUTES[column]
+        if attr['type'] in pools:
+            data[column] = choice(pools[attr['type']])
+        elif 'options' in attr:
+            data[column] = choice([np.nan] + [str(o) for o in attr['options'] if o != ''])
+        else:
+            data[column] = choice([np.nan, 'A', 'B'])
+
+    data[S.CAUSE_OF_DEATH] = np.where(pd.isna(data[S.EXPIRE_DATE]), np.nan, choice(['Cancer', 'Other Disease']))
+    data[S.PATHOLOGICAL_TNM] = choice([np.nan, 'T1N0M0', 'T2N1M0', 'T4aN2bM0', 'T2N0M1', 'TisN0M0', 'T3NxMx', 'XXX'])
+    for column in [
+        S.LYMPH_NODE_LEVEL_I, S.LYMPH_NODE_LEVEL_IA, S.LYMPH_NODE_LEVEL_IB,
+        S.LYMPH_NODE_LEVEL_II, S.LYMPH_NODE_LEVEL_IIA, S.LYMPH_NODE_LEVEL_IIB,
+        S.TOTAL_LYMPH_NODE, S.LYMPH_NODE_RIGHT, S.LYMPH_NODE_LEFT,
+    ]:
+        data[column] = choice([np.nan, np.nan, '0/1', '1/3'])
+
+    return pd.DataFrame(data, columns=S.DISPLAY_COLUMNS).astype(object)
+
+
+class AllTypesSchema(Schema):
+    COLUMN_ATTRIBUTES = {t: {'type': t} for t in ['int', 'float', 'date', 'date_list', 'bool', 'str']}
+
+
 class TestModel(TestCase):
 
     def setUp(self):
@@ -62,6 +103,34 @@ class TestModel(TestCase):
         self.assertEqual(12, len(model.dataframe))
         self.assertEqual(2, len(model.undo_cache))
 
+    def test_import_first_wins_and_keeps_order(self):
+        model = Model(NycuOsccSchema)
+        columns = NycuOsccSchema.DISPLAY_COLUMNS
+        id_column = columns[0]
+
+        pd.DataFrame({id_column: ['A', 'B']}, columns=columns).to_csv(f'{self.outdir}/existing.csv', index=False)
+        model.import_clinical_data_table(file=f'{self.outdir}/existing.csv')
+
+        df = pd.DataFrame({id_column: ['C', 'A', '', 'D', 'C', '']}, columns=columns)
+        df['Medical Record ID'] = ['1', '2', '3', '4', '5', '6']
+        df.to_csv(f'{self.outdir}/clinical_data.csv', index=False)
+        model.import_clinical_data_table(file=f'{self.outdir}/clinical_data.csv')
+
+        # 'A' already exists, the second 'C' is a duplicate, empty ids (NaN) are always appended
+        self.assertListEqual(['A', 'B', 'C', 'NaN', 'D', 'NaN'], model.dataframe[id_column].fillna('NaN').tolist())
+        self.assertListEqual(['1', '3', '4', '6'], model.dataframe['Medical Record ID'].iloc[2:].tolist())
+        self.assertListEqual(list(range(6)), model.dataframe.index.tolist())
+
+        pd.DataFrame({
+            'ID': ['B', 'E', 'E', 'F'],
+            'Lab': ['L1', 'L2', 'L3', 'L4'],
+            'Lab Sample ID': ['S1', 'S2', 'S3', 'S4'],
+        }).to_csv(f'{self.outdir}/sequencing.csv', index=False)
+        model.import_sequencing_table(file=f'{self.outdir}/sequencing.csv')
+
+        self.assertListEqual(['E', 'F'], model.dataframe[NycuOsccSchema.SAMPLE_ID].iloc[6:].tolist())
+        self.assertListEqual(['L2', 'L4'], model.dataframe[NycuOsccSchema.LAB_ID].iloc[6:].tolist())
+
     def test_wrong_sequencing_table(self):
         model = Model(NycuOsccSchema)
         model.import_clinical_data_table(file=f'{self.indir}/clinical_data.csv')
@@ -81,6 +150,51 @@ class TestModel(TestCase):
         actual = model.find(text='Lin', start=(1, 'Surgical Excision Date'))
         self.assertTupleEqual((2, 'Lab Sample ID'), actual)
 
+    def test_find_same_as_scanning_cells(self):
+        model = Model(NycuOsccSchema)
+        model.dataframe = random_clinical_df(n_rows=30)
+        model.dataframe.iloc[3, 5] = 1.5
+        model.dataframe.iloc[4, 6] = pd.NA
+
+        def scan(text, start):
+            df = model.dataframe
+            start_irow, start_icol = (0, 0) if start is None else (start[0], df.columns.to_list().index(start[1]))
+            for r in range(df.shape[0]):
+                for c in range(df.shape[1]):
+                    if r <= start_irow and c <= start_icol:
+                        continue
+                    if text.lower() in str(df.iloc[r, c]).lower():
+                        return r, df.columns[c]
+
+        rng = np.random.default_rng(0)
+        columns = list(model.dataframe.columns)
+        for i in range(200):
+            text = rng.choice(['', 'a', 'nan', '<NA>', '2003', 'CANCER', '1.5', 'true', 'edited', 'no such text'])
+            start = None if i % 5 == 0 else (int(rng.integers(30)), columns[int(rng.integers(len(columns)))])
+            self.assertEqual(scan(text, start), model.find(text=text, start=start), msg=f'{text!r} from {start}')
+            if i % 40 == 0:
+                model.update_cell(row=int(rng.integers(30)), column='Medical Record ID', value=f'Edited {i}')
+            if i % 40 == 20:
+                model.undo()
+
+    def test_find_after_undo_of_append_and_edit(self):
+        S = NycuOsccSchema
+        model = Model(NycuOsccSchema)
+        empty = {c: '' for c in S.DISPLAY_COLUMNS}
+        model.append_sample(attributes={**empty, S.MEDICAL_RECORD_ID: 'zz-first'})
+        self.assertEqual((0, S.MEDICAL_RECORD_ID), model.find(text='zz-first', start=None))
+
+        model.append_sample(attributes={**empty, S.MEDICAL_RECORD_ID: 'zz-second'})
+        model.update_cell(row=1, column=S.MEDICAL_RECORD_ID, value='zz-edited')  # edits a data frame the index is not bound to
+        model.undo()
+        model.undo()  # back to the data frame with only row 0
+        self.assertIsNone(model.find(text='zz-edited', start=None))
+        self.assertEqual((0, S.MEDICAL_RECORD_ID), model.find(text='zz-first', start=None))
+
+        model.redo()
+        model.redo()
+        self.assertEqual((1, S.MEDICAL_RECORD_ID), model.find(text='zz-edited', start=None))
+
     def test_sort_dataframe(self):
         model = Model(NycuOsccSchema)
         model.import_clinical_data_table(file=f'{self.indir}/clinical_data.csv')
@@ -116,6 +230,157 @@ class TestModel(TestCase):
         self.assertEqual(11, len(model.dataframe))
         self.assertEqual(2, len(model.undo_cache))
 
+    def test_reprocess_table_same_as_per_row(self):
+        model = Model(NycuOsccSchema)
+        model.dataframe = random_clinical_df(n_rows=200)
+
+        expected = model.dataframe.copy()
+        for row in range(len(expected)):
+            attributes = model.get_sample(row=row)
+            expected.loc[row] = ProcessSampleAttributes(NycuOsccSchema).main(attributes=attributes)
+
+        actual = ReprocessTable(NycuOsccSchema).main(df=model.dataframe)
+
+        self.assertListEqual(list(expected.columns), list(actual.columns))
+        for c in expected.columns:
+            for i in expected.index:
+                a, b = expected.loc[i, c], actual.loc[i, c]
+                if pd.isna(a) and pd.isna(b):
+                    continue
+                self.assertEqual((type(a), a), (type(b), b), msg=f'row {i}, column "{c}"')
+
+    def test_update_cell_same_as_reprocess_table(self):
+        S = NycuOsccSchema
+        model = Model(NycuOsccSchema)
+        model.dataframe = ReprocessTable(NycuOsccSchema).main(df=random_clinical_df(n_rows=20))
+
+        edits = [
+            (0, S.BIRTH_DATE, '1950-01-01'),
+            (1, S.PATHOLOGICAL_TNM, 'T4bN3M1'),
+            (2, S.SURGICAL_EXCISION_DATE, ''),
+            (3, S.EXPIRE_DATE, '2005-01-01'),
+            (3, S.CAUSE_OF_DEATH, 'Cancer'),
+            (4, S.LYMPH_NODE_LEVEL_I, ''),
+            (5, S.IMMUNOTHERAPY_DRUG, 'None'),
+            (6, S.CLINICAL_DIAGNOSIS_AGE, '99'),  # calculated again
+            (7, S.MEDICAL_RECORD_ID, 'Edited'),
+        ]
+        for row, column, value in edits:
+            expected = model.dataframe.copy()
+            expected.loc[row, column] = value
+            expected = ReprocessTable(NycuOsccSchema).main(df=expected)
+
+            model.update_cell(row=row, column=column, value=value)
+
+            for c in expected.columns:
+                for i in expected.index:
+                    a, b = expected.loc[i, c], model.dataframe.loc[i, c]
+                    if pd.isna(a) and pd.isna(b):
+                        continue
+                    self.assertEqual((type(a), a), (type(b), b), msg=f'edit "{column}", row {i}, column "{c}"')
+
+    def test_update_cell_only_writes_affected_cells(self):
+        S = NycuOsccSchema
+        model = Model(NycuOsccSchema)
+        model.dataframe = random_clinical_df(n_rows=5)  # not reprocessed, i.e. all str
+        before = model.dataframe.copy()
+
+        model.update_cell(row=2, column=S.BIRTH_DATE, value='1950-01-01')
+
+        changed = [c for c in before.columns if not before.loc[[2], c].equals(model.dataframe.loc[[2], c])]
+        self.assertListEqual([S.BIRTH_DATE, S.CLINICAL_DIAGNOSIS_AGE], changed)
+        self.assertListEqual([S.BIRTH_DATE, S.CLINICAL_DIAGNOSIS_AGE], list(model.undo_cache[-1].values.keys()))
+
+        model.undo()
+        pd.testing.assert_frame_equal(before, model.dataframe)
+
+    def test_autogenerated_columns_are_calculated(self):
+        plan = get_derivation_plan()
+        calculated = set()
+        for calculate in plan.calculates:
+            calculated.update(calculate.OUTPUT_KEYS)
+        self.assertTrue(set(NycuOsccSchema.AUTOGENERATED_COLUMNS).issubset(calculated))
+
+    def test_undo_update_cell_restores_na(self):
+        S = NycuOsccSchema
+        model = Model(NycuOsccSchema)
+        df = pd.DataFrame({S.SAMPLE_ID: ['A', 'B'], S.PALLIATIVE_TARGETED_THERAPY_DRUG: ['', 'None']}, columns=S.DISPLAY_COLUMNS)
+        model.dataframe = ReprocessTable(NycuOsccSchema).main(df=df)
+        self.assertIs(pd.NA, model.dataframe.at[0, S.MEDICAL_RECORD_ID])
+
+        before = model.dataframe.copy()
+        found = [model.find(text=t, start=None) for t in ['none', 'a', 'b']]
+
+        for edit in [
+            lambda: model.update_cell(row=0, column=S.MEDICAL_RECORD_ID, value='12345'),
+            lambda: model.update_sample(row=0, attributes={**model.get_sample(row=0), S.MEDICAL_RECORD_ID: '12345'}),
+        ]:
+            edit()
+            model.undo()
+            for c in before.columns:
+                self.assertIs(type(before.at[0, c]), type(model.dataframe.at[0, c]), msg=c)
+            pd.testing.assert_frame_equal(before, model.dataframe)
+            self.assertListEqual(found, [model.find(text=t, start=None) for t in ['none', 'a', 'b']])
+
+        self.assertEqual((1, S.PALLIATIVE_TARGETED_THERAPY_DRUG), found[0])
+
+    def test_undo_redo_update_cell_in_place(self):
+        model = Model(NycuOsccSchema)
+        columns = NycuOsccSchema.DISPLAY_COLUMNS
+        pd.DataFrame({columns[0]: ['A', 'B'], 'Medical Record ID': ['1', '2']}, columns=columns).to_csv(
+            f'{self.outdir}/clinical_data.csv', index=False)
+        model.import_clinical_data_table(file=f'{self.outdir}/clinical_data.csv')
+        model.save_clinical_data_table(file=f'{self.outdir}/saved.csv')
+
+        dataframe = model.dataframe
+        model.update_cell(row=1, column='Medical Record ID', value='3')
+        self.assertIs(dataframe, model.dataframe)  # no copy of the whole data frame
+        self.assertEqual('3', model.dataframe.loc[1, 'Medical Record ID'])
+        self.assertFalse(model.is_file_saved())
+
+        model.undo()
+        self.assertEqual('2', model.dataframe.loc[1, 'Medical Record ID'])
+        self.assertTrue(model.is_file_saved())
+
+        model.redo()
+        self.assertEqual('3', model.dataframe.loc[1, 'Medical Record ID'])
+        self.assertFalse(model.is_file_saved())
+
+        model.undo()
+        model.undo()
+        self.assertEqual(0, len(model.dataframe))
+
+    def test_undo_memory_budget(self):
+        model = Model(NycuOsccSchema)
+        model.MAX_UNDO_BYTES = 1
+        for _ in range(3):
+            model.reset_dataframe()
+        self.assertEqual(1, len(model.undo_cache))  # the latest entry is always kept
+
+    def test_undo_memory_budget_counts_str(self):
+        columns = NycuOsccSchema.DISPLAY_COLUMNS
+        model = Model(NycuOsccSchema)
+        model.MAX_UNDO_BYTES = 15 * 1024 ** 2
+
+        def fresh_df(i: int) -> pd.DataFrame:  # about 10 MB of str objects held by no other data frame
+            return pd.DataFrame({columns[1]: [f'{i}-{r}-' + 'x' * 100_000 for r in range(100)]}, columns=columns)
+
+        model.dataframe = fresh_df(0)
+        model.sort_dataframe(by=columns[1], ascending=False)
+        self.assertLess(model.undo_cache[-1].nbytes, 1024 ** 2)  # the sorted data frame holds the same str objects
+
+        for i in range(3):
+            model.dataframe = fresh_df(i)
+            model.reset_dataframe()
+            self.assertGreater(model.undo_cache[-1].nbytes, 10_000_000)
+
+        self.assertEqual(1, len(model.undo_cache))
+        model.undo()
+        self.assertTrue(model.dataframe[columns[1]].str.startswith('2-').all())
+
+        model.update_cell(row=0, column=columns[1], value='edited')
+        self.assertGreater(model.undo_cache[-1].nbytes, 100_000)  # the row patch holds the replaced str
+
     def test_track_file_saved(self):
         model = Model(NycuOsccSchema)
 
@@ -145,3 +410,51 @@ class TestModel(TestCase):
         # save the table, saved
         model.save_clinical_data_table(file=f'{self.outdir}/clinical_data.csv')
         self.assertTrue(model.is_file_saved())
+
+    def test_batch_cast_same_as_per_cell(self):
+        pool = [
+            '', '1', '-3', ' 5 ', '3.0', '1e3', '.5', 'nan', 'abc', '12345678901234567890',
+            '2020', '2020-02', '2020-03-01', '2020/03/01', '2020-13-01',
+            '2020;2020-02;2020-03-01', ' ; ', '2020;bad', 'TRUE', 'true', 'False', True, 3, 2.5, np.nan,
+        ]
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            c: rng.choice(np.array(pool, dtype=object), size=500) for c in AllTypesSchema.COLUMN_ATTRIBUTES
+        })
+
+        batch = BatchCastDatatypes(AllTypesSchema)
+        with self.assertRaises(AssertionError) as context:
+            batch.main(df=df)
+        self.assertIn(f'Failed to cast {len(batch.errors)} cells', str(context.exception))
+        errors = {(row, column): error for row, column, _, error in batch.errors}
+
+        caster = CastDatatypes(AllTypesSchema)
+        for c in df.columns:
+            for i in df.index:
+                try:
+                    expected, expected_error = caster.cast(key=c, val=df.loc[i, c]), None
+                except Exception as e:
+                    expected, expected_error = None, repr(e)
+                self.assertEqual(expected_error, errors.get((i, c)), msg=f'row {i}, column "{c}"')
+                if expected_error is None:
+                    actual = batch.df.loc[i, c]
+                    if pd.isna(expected) and pd.isna(actual):
+                        continue
+                    self.assertEqual((type(expected), expected), (type(actual), actual), msg=f'row {i}, column "{c}"')
+
+    def test_reprocess_table_lists_all_errors(self):
+        model = Model(NycuOsccSchema)
+        model.dataframe = random_clinical_df(n_rows=5)
+        model.dataframe['Patient Weight (Kg)'] = ['60', 'heavy', '70', 'light', '']
+        model.dataframe['Pathological Diagnosis Date'] = ['2000-01-01', '2000-01-01', '2000-02-30', '', '']
+        dataframe = model.dataframe
+
+        with self.assertRaises(AssertionError) as context:
+            model.reprocess_table()
+
+        msg = str(context.exception)
+        self.assertIn('Failed to cast 3 cells', msg)
+        self.assertIn('Row 2, "Patient Weight (Kg)": \'heavy\'', msg)
+        self.assertIn('Row 3, "Pathological Diagnosis Date": \'2000-02-30\'', msg)
+        self.assertIn('Row 4, "Patient Weight (Kg)": \'light\'', msg)
+        self.assertIs(dataframe, model.dataframe)  # unchanged
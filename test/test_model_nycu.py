@@ -1,8 +1,94 @@
+import numpy as np
+import pandas as pd
 from src.model_nycu import CalculateDiagnosisAge, CalculateSurvival, CalculateICD, \
-    CalculateStage, CalculateLymphNodes, CalculateTherapy, find_best_matching_key_val
+    CalculateStage, CalculateLymphNodes, CalculateTherapy, find_best_matching_key_val, BatchCalculateSurvival, \
+    AnatomicSiteIndex, BatchCalculateStage, BatchCalculateLymphNodes, CalculateNycuOscc, get_derivation_plan
+from src.schema import NycuOsccSchema as S
 from .setup import TestCase
 
 
+class TestCalculateNycuOscc(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def calculate_all(self, attributes):
+        for calculate in [
+            CalculateDiagnosisAge,
+            CalculateSurvival,
+            CalculateICD,
+            CalculateLymphNodes,
+            CalculateStage,
+            CalculateTherapy,
+        ]:
+            attributes = calculate().main(attributes=attributes)
+        return attributes
+
+    def get_attributes(self):
+        attributes = {
+            S.SAMPLE_ID: 'S001',
+            S.BIRTH_DATE: '1960-05-01',
+            S.CLINICAL_DIAGNOSIS_DATE: '2010-01-01',
+            S.SURGICAL_EXCISION_DATE: '2010-02-01',
+            S.INITIAL_TREATMENT_COMPLETION_DATE: '2010-05-01',
+            S.LAST_FOLLOW_UP_DATE: '2013-01-01',
+            S.RECUR_DATE_AFTER_INITIAL_TREATMENT: '2011-06-01',
+            S.EXPIRE_DATE: '2012-12-01',
+            S.CAUSE_OF_DEATH: 'Cancer',
+            S.CLINICAL_TNM: 'T2N0M0',
+            S.PATHOLOGICAL_TNM: 'T2N1M0',
+            S.LYMPH_NODE_LEVEL_IA: '1/3',
+            S.LYMPH_NODE_LEVEL_IB: '0/4',
+            S.LYMPH_NODE_RIGHT: '1/10',
+            S.LYMPH_NODE_LEFT: '0/8',
+        }
+        for key in CalculateICD.REQUIRED_KEYS:
+            attributes[key] = 'Tongue'
+        for key in CalculateTherapy.REQUIRED_KEYS:
+            attributes[key] = 'Drug A'
+        return self.calculate_all(attributes)
+
+    def test_main(self):
+        attributes = self.get_attributes()
+        self.assertDictEqual(self.calculate_all(attributes), CalculateNycuOscc().main(attributes=attributes))
+
+    def test_changed_keys_same_as_calculate_all(self):
+        edits = {
+            S.SAMPLE_ID: 'S002',
+            S.BIRTH_DATE: '1970-01-01',
+            S.SURGICAL_EXCISION_DATE: '2010-03-01',
+            S.EXPIRE_DATE: '2013-01-01',
+            S.PATHOLOGICAL_TNM: 'T4bN3M1',
+            S.LYMPH_NODE_LEVEL_IA: '2/3',
+            S.LYMPH_NODE_LEVEL_I: '',  # a calculated value is calculated again
+            S.TOTAL_LYMPH_NODE: '',
+            S.NEOPLASM_DISEASE_STAGE_AMERICAN_JOINT_COMMITTEE_ON_CANCER_CODE: 'Stage 0',
+            S.IMMUNOTHERAPY_DRUG: 'None',
+        }
+        for key, value in edits.items():
+            attributes = self.get_attributes()
+            attributes[key] = value
+            actual = CalculateNycuOscc().main(attributes=attributes, changed_keys=[key])
+            self.assertDictEqual(self.calculate_all(attributes), actual, msg=key)
+
+    def test_main_does_not_modify_attributes(self):
+        attributes = {S.PATHOLOGICAL_TNM: 'T1N0M0'}
+        CalculateNycuOscc().main(attributes=attributes, changed_keys=[S.PATHOLOGICAL_TNM])
+        self.assertDictEqual({S.PATHOLOGICAL_TNM: 'T1N0M0'}, attributes)
+
+    def test_derivation_plan(self):
+        plan = get_derivation_plan()
+        self.assertTupleEqual((CalculateDiagnosisAge,), plan.get_calculates(frozenset([S.BIRTH_DATE])))
+        self.assertTupleEqual((CalculateStage,), plan.get_calculates(frozenset([S.PATHOLOGICAL_TNM])))
+        self.assertTupleEqual((), plan.get_calculates(frozenset([S.SAMPLE_ID])))
+        self.assertSetEqual(
+            {S.LYMPH_NODE_LEVEL_I, S.LYMPH_NODE_LEVEL_II, S.TOTAL_LYMPH_NODE},
+            plan.get_affected_keys([S.LYMPH_NODE_RIGHT]))
+
+
 class TestCalculateDiagnosisAge(TestCase):
 
     def setUp(self):
@@ -225,6 +311,42 @@ class TestCalculateSurvival(TestCase):
         self.assertDictEqual(expected, actual)
 
 
+class TestBatchCalculateSurvival(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_parity_with_per_row(self):
+        rng = np.random.default_rng(0)
+        dates = ['', '2003', '2003-01-01', '2003-02-01', '2003-12-27', '2004-01-26', '2000-01-01', '2003/06/15']
+        df = pd.DataFrame({
+            key: rng.choice(dates, size=500) for key in CalculateSurvival.REQUIRED_KEYS
+        })
+        df['Cause of Death'] = rng.choice(['', 'Cancer', 'Other Disease', 'Uncertain'], size=500)
+        df['Cause of Death'] = df['Cause of Death'].where(df['Expire Date'] != '', '')
+        df.loc[0, 'Surgical Excision Date'] = np.nan  # NaN is the same as ''
+
+        actual = BatchCalculateSurvival().main(df=df)
+
+        for i, row in df.fillna('').iterrows():
+            expected = CalculateSurvival().main(attributes=row.to_dict())
+            self.assertDictEqual(expected, actual.loc[i].fillna('').to_dict())
+
+    def test_invalid_cause_of_death(self):
+        df = pd.DataFrame({key: ['2003-01-01'] for key in CalculateSurvival.REQUIRED_KEYS})
+        df['Cause of Death'] = 'Car accident'
+        with self.assertRaises(AssertionError):
+            BatchCalculateSurvival().main(df=df)
+
+    def test_lack_required_keys(self):
+        df = pd.DataFrame({'Surgical Excision Date': ['2003-01-01']})
+        actual = BatchCalculateSurvival().main(df=df)
+        self.assertListEqual(['Surgical Excision Date'], list(actual.columns))
+
+
 class TestCalculateICD(TestCase):
 
     def setUp(self):
@@ -292,6 +414,25 @@ class TestCalculateICD(TestCase):
         expected = ('C', 3)
         self.assertTupleEqual(expected, actual)
 
+    def test_anatomic_site_index_same_as_linear_search(self):
+        rng = np.random.default_rng(0)
+        for dict_ in [
+            CalculateICD.ANATOMIC_SITE_TO_ICD_O_3_SITE_CODE,
+            CalculateICD.ANATOMIC_SITE_TO_ICD_10_CLASSIFICATION,
+        ]:
+            index = AnatomicSiteIndex(dict_)
+            words = sorted(set(w for k in dict_ for w in k.split(' '))) + ['cat', 'leg', '']
+
+            sites = ['', 'Cat leg', 'Mouth floor']
+            for k in dict_:
+                sites += [k, k.lower(), k.upper(), ' '.join(reversed(k.split(' ')))]
+            for _ in range(2000):
+                n = rng.integers(1, 5)
+                sites.append(' '.join(rng.choice(words, size=n)))
+
+            for site in sites:
+                self.assertTupleEqual(find_best_matching_key_val(dict_=dict_, key=site), index.find(site), msg=site)
+
 
 class TestCalculateStage(TestCase):
 
@@ -401,6 +542,46 @@ class TestCalculateStage(TestCase):
         self.assertDictEqual(expected, actual)
 
 
+class TestBatchCalculateStage(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_parity_with_per_row(self):
+        rng = np.random.default_rng(0)
+        parts = ['T', 'N', 'M', 'X', 'x', 'is', '0', '1', '2', '3', '4', 'a', 'b', 'c', 'p', 'y', ' ', '(', ')']
+        tnms = ['', 'T4bN3M1', 'T2NxMx', 'XXX', 'N0M0T1', 'M0N2cT3', 'TisN0M0', 'T1N0', 'T1T2N0M0', 'pT4aN2bM0']
+        for _ in range(3000):
+            tnms.append(''.join(rng.choice(parts, size=rng.integers(1, 12))))
+        df = pd.DataFrame({'Pathological TNM (pTNM)': tnms})
+        df.loc[len(df)] = np.nan  # NaN is the same as ''
+
+        actual = BatchCalculateStage().main(df=df)
+
+        for i, row in df.fillna('').iterrows():
+            expected = CalculateStage().main(attributes=row.to_dict())
+            self.assertDictEqual(expected, actual.loc[i].fillna('').to_dict())
+
+    def test_invalid_rows(self):
+        df = pd.DataFrame({'Pathological TNM (pTNM)': ['T1N0M0', 'XXX', '', 'T5N0M0', 'XXX']})
+        stager = BatchCalculateStage()
+        actual = stager.main(df=df)
+        self.assertListEqual(
+            ['Stage I', '', '', '', ''],
+            actual['Neoplasm Disease Stage American Joint Committee on Cancer Code'].tolist())
+        self.assertListEqual([(1, 'XXX'), (3, 'T5N0M0'), (4, 'XXX')], stager.invalid_rows)
+
+    def test_lack_required_keys(self):
+        df = pd.DataFrame({'ID': ['1']})
+        stager = BatchCalculateStage()
+        actual = stager.main(df=df)
+        self.assertListEqual(['ID'], list(actual.columns))
+        self.assertListEqual([], stager.invalid_rows)
+
+
 class TestCalculateLymphNodes(TestCase):
 
     def setUp(self):
@@ -509,6 +690,47 @@ class TestCalculateLymphNodes(TestCase):
         self.assertDictEqual(expected, actual)
 
 
+class TestBatchCalculateLymphNodes(TestCase):
+
+    def setUp(self):
+        self.set_up(py_path=__file__)
+
+    def tearDown(self):
+        self.tear_down()
+
+    def test_parity_with_per_row(self):
+        rng = np.random.default_rng(0)
+        values = ['', '', '0/0', '1/3', '12/40', '007/10', ' 3 / 10', '+3/10', '-1/5', '1_0/20', '99999999999999999999/1']
+        df = pd.DataFrame({
+            key: rng.choice(values, size=1000) for key in CalculateLymphNodes.INPUT_KEYS
+        })
+
+        actual = BatchCalculateLymphNodes().main(df=df)
+
+        for i, row in df.iterrows():
+            expected = CalculateLymphNodes().main(attributes=row.to_dict())
+            self.assertDictEqual(expected, actual.loc[i].to_dict())
+
+    def test_same_errors_as_per_row(self):
+        for value in ['1', '1/2/3', 'a/3', '1.0/3', np.nan]:
+            df = pd.DataFrame({'Lymph Node Level Ia': ['1/3', value], 'Lymph Node Level Ib': ['0/1', '']})
+            with self.assertRaises(Exception) as expected:
+                CalculateLymphNodes().main(attributes=df.loc[1].to_dict())
+            with self.assertRaises(type(expected.exception)):
+                BatchCalculateLymphNodes().main(df=df)
+
+    def test_lack_keys(self):
+        df = pd.DataFrame({
+            'Lymph Node Level Ia': ['1/3', '', ''],
+            'Lymph Node Level Ib': ['0/1', '2/5', ''],
+            'Lymph Node Right': ['', '', ''],
+        })
+        actual = BatchCalculateLymphNodes().main(df=df)
+        self.assertListEqual(['1/4', '2/5', ''], actual['Lymph Node Level I'].tolist())
+        self.assertNotIn('Lymph Node Level II', actual.columns)
+        self.assertNotIn('Total Lymph Node', actual.columns)
+
+
 class TestCalculateTherapy(TestCase):
 
     def setUp(self):